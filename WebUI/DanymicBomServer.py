@@ -1,23 +1,177 @@
+import html
 import json
-from flask import Flask, request, jsonify, Response
-from bs4 import BeautifulSoup
+import logging
+import os
+import sys
+import threading
+import time
+from flask import Blueprint, request, jsonify, Response, g, redirect, stream_with_context
 import re
+from urllib.parse import quote
+
+from component_index import normalize_footprint, normalize_query
+from library import shared_library
+from lookup_cache import LookupCache
+from component_store import STORAGE_BACKEND
+from page_cache import PageCache
+from bom_projects import BomProjects
+from bom_table import CONSOLE_LOG_BLOCK, CONSOLE_LOG_PATCHED, build_lookup_table, extract_rows
+from pick_planner import BoxGrid, PickListStore, plan_picks
+from value_parser import format_value, parse_value
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from event_hub import EventHub, EventServer
 
 # --- 配置 ---
-COMPONENTS_FILE = 'components.json'
 BOM_FILE_NAME = 'InteractiveBOM.html'
+# 多个项目: 目录中的每个 InteractiveBOM 导出文件 (<name>.html) 由 /bom/<name> 提供，/boms 列出全部
+BOM_DIR = os.environ.get('BOM_DIR', 'boms')
+BOM_CACHE_MB = float(os.environ.get('BOM_CACHE_MB', '256'))  # 缓存的 BOM 页面 (含压缩版本) 总大小上限
+BOM_WARM_INTERVAL = float(os.environ.get('BOM_WARM_INTERVAL', '2.0'))  # 扫描 BOM 目录并预热的间隔 (秒, 0 = 不预热)
+LOOKUP_CACHE_SIZE = 4096  # 模糊搜索结果缓存条数
+# 日志级别: 每次点击的详细过程 (搜索条件、候选、前3个备选) 只在 DEBUG 级别输出
+LOG_LEVEL = os.environ.get('BOM_LOG_LEVEL', 'INFO').upper()
+# 服务器端串口桥: 设置主控 ESP32 的串口 (例如 /dev/ttyUSB0, COM3) 后由服务器发送点灯命令；
+# 不设置时仍由网页中的 Web Serial 发送
+SERIAL_PORT = os.environ.get('BOM_SERIAL_PORT', '')
+SERIAL_BAUDRATE = int(os.environ.get('BOM_SERIAL_BAUDRATE', '115200'))
+SERIAL_ACK_WAIT = float(os.environ.get('BOM_SERIAL_ACK_WAIT', '0.3'))  # /lightup 等待主控回显的秒数 (0 = 不等待)
+# 事件推送 (SSE): 点灯结果和元件库变化广播给所有打开的页面 / 看板；0 = 不启动
+EVENTS_PORT = int(os.environ.get('BOM_EVENTS_PORT', '5001'))
+EVENTS_WATCH_INTERVAL = 2.0  # 有订阅者时检查元件库是否被修改的间隔 (秒)
+# 拣选路径规划: 料盒每行的格数，以及灯带走线方式 ('serpentine' 蛇形 / 'rows' 逐行同向)
+PICK_GRID_COLUMNS = int(os.environ.get('BOM_PICK_COLUMNS', '9'))
+PICK_GRID_WIRING = os.environ.get('BOM_PICK_WIRING', 'serpentine')
+# /search 返回的候选个数上限 (JSON 一次性返回 / NDJSON 流式返回)
+SEARCH_MAX_K = 100
+SEARCH_MAX_K_STREAM = int(os.environ.get('BOM_SEARCH_MAX_K', '10000'))
 # --- ---
 
-app = Flask(__name__)
-components_db = {}
+log = logging.getLogger('bom_server')
+log.setLevel(LOG_LEVEL)
+
+# 查询路由 (由 bom_app.create_app 与元件管理器一起注册到同一个应用上)
+lookup = Blueprint('lookup', __name__)
+
+# --- 元件库 (与元件管理器共用，见 library.Library)、倒排索引 与 搜索结果缓存 ---
+# 启动时倒排索引在后台建立: 精确匹配立即可用，模糊搜索等待 library.ready
+library = shared_library()
+component_index = library.index
+lookup_cache = LookupCache(LOOKUP_CACHE_SIZE)
+serial_bridge = None
+if SERIAL_PORT:
+    from serial_bridge import SerialBridge  # pyserial 只在配置了串口桥时才导入
+    serial_bridge = SerialBridge(SERIAL_PORT, SERIAL_BAUDRATE)
+event_hub = EventHub()
+pick_grid = BoxGrid(columns=PICK_GRID_COLUMNS, wiring=PICK_GRID_WIRING)
+picklists = PickListStore()
+event_server = None  # 在 bom_app.main 中启动 (见 start_event_server)
+bom_warmer = None  # 在 bom_app.create_app 中启动 (见 start_bom_warmer)
+
+# --- 指标 (GET /metrics, Prometheus 文本格式) ---
+metrics = Registry()
+stage_seconds = metrics.histogram(
+    'bom_lookup_stage_seconds', '查找各阶段耗时 (normalize / exact / fuzzy / search / json_encode)', ('stage',))
+request_seconds = metrics.histogram('bom_request_seconds', '请求总耗时', ('endpoint',))
+lookup_results = metrics.counter('bom_lookup_results_total', '查找结果 (exact / fuzzy / not_found / table)', ('result',))
+metrics.callback('bom_lookup_cache_events_total', '模糊搜索缓存事件', 'counter',
+                 lambda: {event: count for event, count in lookup_cache.stats().items()
+                          if event in ('hits', 'misses', 'evictions', 'invalidations')}, ('event',))
+metrics.callback('bom_lookup_cache_entries', '模糊搜索缓存当前条数', 'gauge', lambda: lookup_cache.stats()['size'])
+metrics.callback('bom_components', '已加载的元件数量', 'gauge', lambda: len(library.components))
+metrics.callback('bom_index_revision', '倒排索引 revision (每次重建/增删 +1)', 'gauge',
+                 lambda: component_index.revision)
+metrics.callback('bom_index_ready', '倒排索引是否已建立 (启动时在后台建立)', 'gauge',
+                 lambda: int(library.ready.is_set()))
+metrics.callback('bom_index_values', '数值索引中的元件数量', 'gauge', lambda: len(component_index.values))
+metrics.callback('bom_page_builds_total', 'BOM 页面 (重新) 构建次数', 'counter', lambda: bom_page_cache.builds)
+metrics.callback('bom_page_bytes', '缓存的 BOM 页面大小', 'gauge', lambda: bom_page_cache.bytes)
+metrics.callback('bom_lookup_builds_total', 'BOM 查找表 (重新) 构建次数', 'counter',
+                 lambda: bom_lookup_cache.builds)
+metrics.callback('bom_page_evictions_total', '因超出 BOM_CACHE_MB 被淘汰的 BOM 页面数', 'counter',
+                 lambda: bom_page_cache.evictions)
+metrics.callback('bom_pages_warmed_total', '后台预热构建的 BOM 页面数', 'counter', lambda: bom_projects.warmed)
+metrics.callback('bom_components_loads_total', '元件库 (重新) 加载次数', 'counter', lambda: library.loads)
+if serial_bridge is not None:
+    metrics.callback('bom_serial_commands_total', '串口桥命令结果', 'counter',
+                     lambda: {status: count for status, count in serial_bridge.stats().items()
+                              if status not in ('sent', 'queued', 'connected', 'reconnects')}, ('result',))
+    metrics.callback('bom_serial_writes_total', '写入串口的命令数 (含重试)', 'counter',
+                     lambda: serial_bridge.stats()['sent'])
+    metrics.callback('bom_serial_reconnects_total', '串口 (重新) 打开次数', 'counter',
+                     lambda: serial_bridge.stats()['reconnects'])
+    metrics.callback('bom_serial_queue_depth', '等待发送的点灯命令数', 'gauge', serial_bridge.queue_depth)
+    metrics.callback('bom_serial_connected', '串口是否已打开', 'gauge', lambda: int(serial_bridge.connected))
+metrics.callback('bom_events_subscribers', '当前的事件订阅者 (/events)', 'gauge',
+                 lambda: event_hub.stats()['subscribers'])
+metrics.callback('bom_events_published_total', '已广播的事件数', 'counter', lambda: event_hub.published)
+metrics.callback('bom_events_dropped_total', '因客户端积压被丢弃的事件数 (当前订阅者)', 'counter',
+                 lambda: event_hub.stats()['dropped'])
+
+
+# --- 元件库事件 ---
+def _publish_library_event(event):
+    """元件库变化 (本进程写入 / 其他进程写入 / 整体重新加载) 广播为 library 事件"""
+    event_hub.publish('library', event)
+
+
+library.add_listener(_publish_library_event)
+
+
+def watch_library(interval=EVENTS_WATCH_INTERVAL):
+    """后台线程: 有订阅者时定期读取其他进程对元件库的修改 (并广播 library 事件)"""
+    while True:
+        time.sleep(interval)
+        if event_hub.stats()['subscribers']:
+            try:
+                library.sync()
+            except Exception as e:
+                log.warning("检查元件库变化失败: %s", e)
 
-# --- 数据库加载 ---
-try:
-    with open(COMPONENTS_FILE, 'r', encoding='utf-8') as f:
-        components_db = json.load(f)
-    print(f"成功加载 {len(components_db)} 条元件数据。")
-except Exception as e:
-    print(f"警告: 加载 {COMPONENTS_FILE} 失败: {e}")
+
+def warm_boms(interval=BOM_WARM_INTERVAL):
+    """后台线程: 定期读取元件库的变化，并预热新出现 / 被修改 / 已过期的 BOM 页面"""
+    while True:
+        try:
+            library.sync()
+            bom_projects.warm()
+        except Exception as e:
+            log.warning("预热 BOM 页面失败: %s", e)
+        time.sleep(interval)
+
+
+def start_bom_warmer(interval=BOM_WARM_INTERVAL):
+    """启动预热线程 (每个进程一个，重复调用时返回已启动的线程)"""
+    global bom_warmer
+    if bom_warmer is None:
+        bom_warmer = threading.Thread(target=warm_boms, args=(interval,), name='bom-warmer', daemon=True)
+        bom_warmer.start()
+    return bom_warmer
+
+
+def start_event_server(port=EVENTS_PORT, host='127.0.0.1'):
+    """host: 与 Flask 应用相同的监听地址 (由 bom_app.main 传入)"""
+    global event_server
+    event_server = EventServer(event_hub, host=host, port=port)
+    event_server.start()
+    threading.Thread(target=watch_library, name='library-watcher', daemon=True).start()
+    return event_server
+
+
+def _fuzzy_lookup(query, memo=None):
+    """
+    带缓存的模糊搜索。query 为 normalize_query 的结果。
+    返回 (匹配总数, 前4个匹配)。
+    """
+    if not library.ready.is_set():
+        library.ready.wait()
+    revision = component_index.revision
+    cached = lookup_cache.get(query, revision)
+    if cached is not None:
+        return cached
+    with library.lock:  # 不与写入时的增量更新交错
+        result = component_index.fuzzy_top(*query, limit=4, memo=memo)
+    lookup_cache.put(query, result, revision)
+    return result
 
 
 #
@@ -36,164 +190,64 @@ def search_component(part_number, parameter=None, footprint=None):
         c. [新] 传入的 'part_number' vs 数据库的 'parameter' (用于匹配 'SPX3819M5-3.3' 和 'SPX3819')
     """
     # 1. 首先尝试精确匹配 part_number (匹配 "C29DF" 这样的ID)
-    if part_number in components_db:
-        return part_number, components_db[part_number]
+    # (热路径上直接用 perf_counter，比 with stage_seconds.time() 少一次生成器开销)
+    # 不持 library.lock: 元件管理器同时写入时按 key 读取也是安全的 (见 library 模块说明)
+    start = time.perf_counter()
+    item_data = library.components.get(part_number)
+    stage_seconds.observe(time.perf_counter() - start, 'exact')
+    if item_data is not None:
+        lookup_results.inc('exact')
+        return part_number, item_data
 
     # 2. 【修改点】
     #    因为我们现在要用 part_number 进行模糊搜索，所以只要提供了任意一个信息，都应该启动模糊搜索
     if part_number or parameter or footprint:
-        print(f"  未找到精确匹配，开始模糊搜索...")
-        print(f"  搜索条件 - 型号: {part_number}, 参数: {parameter}, 封装: {footprint}")
-        
-        # --- 
-        # --- 1. 封装 (Footprint) 归一化 (R0402 -> 0402) ---
-        # --- 
-        normalized_input_footprint = None
-        if footprint:
-            fp_upper = footprint.upper()
-            if (len(fp_upper) == 5 and 
-                fp_upper[0] in ('R', 'C') and 
-                fp_upper[1:].isdigit()):
-                normalized_input_footprint = fp_upper[1:]
-                print(f"  (封装归一化: {footprint} -> {normalized_input_footprint})")
-            else:
-                # 保留 SOT-23-5... 这样的长封装名称
-                normalized_input_footprint = fp_upper
-        
-        # --- 
-        # --- 2. 参数 (Parameter) 归一化 (kΩ -> K, Ω -> R) ---
-        # --- 
-        normalized_input_parameter_str = None
-        if parameter:
-            # 拷贝一份，准备开始替换
-            normalized_param = parameter
-            
-            # --- 
-            # 规则1: 替换 Kilo-Ohms (kΩ/KΩ/kΩ/KΩ) 为 K
-            # ---
-            normalized_param = normalized_param.replace('kΩ', 'K')
-            normalized_param = normalized_param.replace('KΩ', 'K')
-            normalized_param = normalized_param.replace('kΩ', 'K') 
-            normalized_param = normalized_param.replace('KΩ', 'K') 
-            
-            # --- 
-            # 规则2: 替换 Ohms (Ω/Ω) 为 R
-            # ---
-            normalized_param = normalized_param.replace('Ω', 'R')
-            normalized_param = normalized_param.replace('Ω', 'R')
-            
-            # (可选) 规则3: 替换 Mega-Ohms (MΩ/MΩ) 为 M
-            normalized_param = normalized_param.replace('MΩ', 'M')
-            normalized_param = normalized_param.replace('mΩ', 'M') # 兼容小写 m
-            normalized_param = normalized_param.replace('MΩ', 'M')
-            normalized_param = normalized_param.replace('mΩ', 'M')
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("  未找到精确匹配，开始模糊搜索...")
+            log.debug("  搜索条件 - 型号: %s, 参数: %s, 封装: %s", part_number, parameter, footprint)
 
-            normalized_input_parameter_str = normalized_param
-            
-            if normalized_input_parameter_str != parameter:
-                print(f"  (参数归一化: {parameter} -> {normalized_input_parameter_str})")
         # --- 
-        # --- 归一化结束 ---
+        # --- 1. 归一化 (R0402 -> 0402, kΩ -> K, Ω -> R) ---
         # --- 
+        start = time.perf_counter()
+        query = normalize_query(part_number, parameter, footprint)
+        stage_seconds.observe(time.perf_counter() - start, 'normalize')
+        if debug:
+            normalized_input_footprint = query[2]
+            if normalized_input_footprint and normalized_input_footprint != footprint.upper():
+                log.debug("  (封装归一化: %s -> %s)", footprint, normalized_input_footprint)
+            if query[1] and query[1] != parameter.upper():
+                log.debug("  (参数归一化: %s -> %s)", parameter, query[1])
 
-        matches = []
-        for pn, data in components_db.items():
-            score = 0
-            reasons = []
-
-            # --- 
-            # --- 3a. 参数匹配 (传入的 'parameter' vs 数据库的 'parameter') ---
-            # --- 
-            if normalized_input_parameter_str and 'parameter' in data and data['parameter']:
-                db_parameter_upper = data['parameter'].upper() 
-                
-                input_parameter_upper = normalized_input_parameter_str.upper()
-                
-                if input_parameter_upper == db_parameter_upper:
-                    score += 10
-                    reasons.append(f"参数完全匹配({data['parameter']})")
-                elif input_parameter_upper in db_parameter_upper or db_parameter_upper in input_parameter_upper:
-                    score += 5
-                    reasons.append(f"参数部分匹配({data['parameter']})")
-
-            # --- 
-            # --- 3b. 【新功能】型号-参数 交叉匹配 ---
-            #     (比较 传入的 'part_number' 和 数据库的 'parameter')
-            # --- 
-            if part_number and 'parameter' in data and data['parameter']:
-                db_param_short_upper = data['parameter'].upper()
-                incoming_pn_long_upper = part_number.upper()
-                
-                if db_param_short_upper == incoming_pn_long_upper:
-                    # 例如: 传入 'SPX3819', 数据库 'SPX3819'
-                    score += 20 # 这是一个高分匹配
-                    reasons.append(f"型号-参数完全匹配({data['parameter']})")
-                elif db_param_short_upper in incoming_pn_long_upper:
-                    # 例如: 传入 'SPX3819M5-3.3', 数据库 'SPX3819'
-                    # "SPX3819" in "SPX3819M5-3.3" -> True
-                    score += 20 # 这也是一个高分匹配 (您的情况)
-                    reasons.append(f"型号-参数包含匹配({data['parameter']})")
-                elif incoming_pn_long_upper in db_param_short_upper:
-                    # 例如: 传入 'SPX3819', 数据库 'SPX3819-L' (不太可能)
-                    score += 5 # 这是一个低分匹配
-                    reasons.append(f"参数-型号包含匹配({data['parameter']})")
-
-
-            # --- 
-            # --- 4. 封装匹配 (使用归一化后的 'normalized_input_footprint') ---
-            # --- 
-            if normalized_input_footprint and 'footprint' in data and data['footprint']:
-                db_footprint_upper = data['footprint'].upper() 
-                
-                if normalized_input_footprint == db_footprint_upper:
-                    score += 10
-                    reasons.append(f"封装完全匹配({data['footprint']})")
-                elif (normalized_input_footprint in db_footprint_upper or 
-                      db_footprint_upper in normalized_input_footprint): # 【修正点】修正了原代码中的一个拼写错误
-                    score += 5
-                    reasons.append(f"封装部分匹配({data['footprint']})")
-            # --- 
-            # --- 匹配结束 ---
-            # --- 
-
-            # 【修改点】
-            # 您的案例 (SPX3819) 中, 封装库是 ""，封装参数是 "SOT-23-5..."
-            # 匹配 3a (参数) 不会运行 (传入参数为空)
-            # 匹配 3b (型号-参数) 会运行，得到 20 分
-            # 匹配 4 (封装) 会运行，但 db_footprint_upper 是 "", 
-            #   ( 'SOT...' in '' or '' in 'SOT...' ) -> 第二个为True，得到 5 分
-            # 总分 25 分。
-            
-            # 如果我们将阈值保持在 19，25 分 > 19 分，匹配成功。
-            # 如果是 0402 匹配 0402 (10分) + 10K 匹配 10K (10分)，总分 20 分。
-            # 如果是 'RES-10K' vs '10K' (20分) + '0402' vs '0402' (10分) = 30分。
-            # 阈值 19 看起来是合理的。
-            
-            if score > 19:
-                matches.append({
-                    'part_number': pn,
-                    'data': data,
-                    'score': score,
-                    'reasons': reasons
-                })
-
-        # 按匹配分数排序
-        matches.sort(key=lambda x: x['score'], reverse=True)
+        # --- 
+        # --- 2. 只对倒排索引给出的候选集打分 (规则见 component_index.score_component) ---
+        # ---
+        # 例: 'SPX3819M5-3.3' vs 数据库 'SPX3819' -> 型号-参数包含匹配 20 分
+        #     0402 匹配 0402 (10分) + 10K 匹配 10K (10分)，总分 20 分。
+        #     阈值 19 看起来是合理的。
+        start = time.perf_counter()
+        match_count, matches = _fuzzy_lookup(query)
+        stage_seconds.observe(time.perf_counter() - start, 'fuzzy')
 
         if matches:
             best_match = matches[0]
-            print(f"  找到 {len(matches)} 个匹配项，最佳匹配:")
-            print(f"    型号: {best_match['part_number']}")
-            print(f"    匹配度: {best_match['score']} 分")
-            print(f"    原因: {', '.join(best_match['reasons'])}")
+            if debug:
+                log.debug("  找到 %d 个匹配项，最佳匹配:", match_count)
+                log.debug("    型号: %s", best_match['part_number'])
+                log.debug("    匹配度: %s 分", best_match['score'])
+                log.debug("    原因: %s", ', '.join(best_match['reasons']))
 
-            if len(matches) > 1:
-                print(f"  其他可能匹配:")
-                for match in matches[1:4]:  # 最多显示3个
-                    print(f"    - {match['part_number']} (分数:{match['score']}) - {', '.join(match['reasons'])}")
+                if match_count > 1:
+                    log.debug("  其他可能匹配:")
+                    for match in matches[1:4]:  # 最多显示3个
+                        log.debug("    - %s (分数:%s) - %s",
+                                  match['part_number'], match['score'], ', '.join(match['reasons']))
 
+            lookup_results.inc('fuzzy')
             return best_match['part_number'], best_match['data']
 
+    lookup_results.inc('not_found')
     return None, None
 #
 #
@@ -204,8 +258,63 @@ def search_component(part_number, parameter=None, footprint=None):
 #
 
 
+def resolve_part(part_number, parameter=None, footprint=None, memo=None, query=None):
+    """
+    与 search_component 相同的查找逻辑，但不打印日志，并返回打分信息。
+    返回 (matched_pn, data, score, reasons)；精确匹配时 score 为 None。
+    memo: 批量查询时共享的倒排表查询缓存 (见 ComponentIndex.candidates)。
+    query: 已经算好的 normalize_query 结果 (可选，避免重复归一化)。
+    """
+    item_data = library.components.get(part_number)
+    if item_data is not None:
+        return part_number, item_data, None, ["型号精确匹配"]
+    if part_number or parameter or footprint:
+        if query is None:
+            query = normalize_query(part_number, parameter, footprint)
+        _, matches = _fuzzy_lookup(query, memo)
+        if matches:
+            best_match = matches[0]
+            return best_match['part_number'], best_match['data'], best_match['score'], best_match['reasons']
+    return None, None, None, []
+
+
+# --- 请求耗时 与 指标导出 ---
+@lookup.before_app_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@lookup.after_app_request
+def _record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        # 标签不带蓝图前缀 ('lookup.light_up' -> 'light_up')，与单独运行时的指标保持一致
+        endpoint = (request.endpoint or 'unknown').rpartition('.')[2]
+        request_seconds.observe(time.perf_counter() - start, endpoint)
+    return response
+
+
+@lookup.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@lookup.route('/events')
+def events():
+    """
+    事件流 (text/event-stream)。长连接由独立端口上的 asyncio SSE 服务器处理 (event_hub.EventServer)，
+    这里只做重定向，不让空闲的看板占用 Flask 的工作线程。
+    事件: lightup (每次 /lightup 的结果)、library (元件库重新加载)、lagged (客户端积压过多，丢弃了旧事件)
+    """
+    if event_server is None:
+        return jsonify({"status": "error", "message": "事件推送未启动 (BOM_EVENTS_PORT=0)"}), 503
+    host = request.host.rsplit(':', 1)[0] if not request.host.endswith(']') else request.host
+    query = request.query_string.decode('latin-1')
+    return redirect(f"{request.scheme}://{host}:{event_server.port}/events" + (f"?{query}" if query else ''), 307)
+
+
 # 1. 【核心】点灯 API (支持多参数搜索)
-@app.route('/lightup')
+@lookup.route('/lightup')
 def light_up():
     part_number = request.args.get('part_number', '')
     parameter = request.args.get('parameter', '')
@@ -214,21 +323,21 @@ def light_up():
     if not part_number and not parameter and not footprint:
         return jsonify({"status": "error", "message": "需要提供至少一个搜索条件"}), 400
 
-    print(f"=========================================")
-    print(f"  BOM 点击事件")
-    print(f"  器件型号: {part_number}")
-    if parameter:
-        print(f"  参数: {parameter}")
-    if footprint:
-        print(f"  封装: {footprint}")
-    print(f"=========================================")
+    library.sync()
+
+    log.debug("=========================================")
+    log.debug("  BOM 点击事件")
+    log.debug("  器件型号: %s, 参数: %s, 封装: %s", part_number, parameter, footprint)
+    log.debug("=========================================")
 
     # 使用智能搜索 (现在这个函数更智能了)
     matched_pn, item_data = search_component(part_number, parameter, footprint)
 
+    searched = {"part_number": part_number, "parameter": parameter, "footprint": footprint}
     if not item_data:
-        print(f"  (搜索结果: 未找到匹配的元件)")
-        return jsonify({
+        log.debug("  (搜索结果: 未找到匹配的元件) 型号=%s 参数=%s 封装=%s", part_number, parameter, footprint)
+        event_hub.publish('lightup', {"status": "not_found", "searched": searched, "time": time.time()})
+        payload = {
             "status": "not_found",
             "message": "未找到匹配的元件",
             "searched": {
@@ -236,14 +345,14 @@ def light_up():
                 "parameter": parameter,
                 "footprint": footprint
             }
-        })
+        }
     else:
         box_id = item_data.get('box_id')
         led_id = item_data.get('led_id')
-        print(f"  ✓ 找到元件: {matched_pn}")
-        print(f"  ✓ 位置 -> 盒子: {box_id}, LED: {led_id}")
+        log.debug("  ✓ 找到元件: %s", matched_pn)
+        log.debug("  ✓ 位置 -> 盒子: %s, LED: %s", box_id, led_id)
 
-        return jsonify({
+        payload = {
             "status": "success",
             "message": "找到元件",
             "matched_part_number": matched_pn,
@@ -252,38 +361,429 @@ def light_up():
                 "led_id": led_id
             },
             "details": item_data
+        }
+        if serial_bridge is not None:
+            # 由服务器串口桥发送；网页看到 delivery 字段后不再通过 Web Serial 重复发送
+            delivery = serial_bridge.send(box_id, led_id)
+            if SERIAL_ACK_WAIT > 0:
+                delivery.wait(SERIAL_ACK_WAIT)
+            payload["delivery"] = delivery.to_dict()
+            log.debug("  串口桥: %s", delivery.status)
+        event_hub.publish('lightup', {
+            "status": "success",
+            "searched": searched,
+            "matched_part_number": matched_pn,
+            "parameter": item_data.get('parameter'),
+            "footprint": item_data.get('footprint'),
+            "location": payload["location"],
+            "time": time.time()
+        })
+
+    with stage_seconds.time('json_encode'):
+        return jsonify(payload)
+
+
+# 1a. 网页通过预解析查找表直接点灯后的通知 (navigator.sendBeacon)
+@lookup.route('/lightup/report', methods=['POST'])
+def light_up_report():
+    """只广播 lightup 事件 (来源 table)，不查找也不发送串口命令"""
+    payload = request.get_json(silent=True, force=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "error", "message": "请求体必须是 JSON 对象"}), 400
+    matched_pn = str(payload.get('matched_part_number') or '')
+    item_data = library.components.get(matched_pn)
+    if item_data is None:
+        return jsonify({"status": "not_found", "message": "未找到匹配的元件"}), 404
+    searched = payload.get('searched') if isinstance(payload.get('searched'), dict) else {}
+    lookup_results.inc('table')
+    event_hub.publish('lightup', {
+        "status": "success",
+        "source": "table",
+        "searched": {name: str(searched.get(name) or '') for name in ('part_number', 'parameter', 'footprint')},
+        "matched_part_number": matched_pn,
+        "parameter": item_data.get('parameter'),
+        "footprint": item_data.get('footprint'),
+        "location": {"box_id": item_data.get('box_id'), "led_id": item_data.get('led_id')},
+        "time": time.time()
+    })
+    return jsonify({"status": "success"})
+
+
+# 1b. 批量点灯查询 API (一次请求解析整张 BOM)
+@lookup.route('/lightup/batch', methods=['POST'])
+def light_up_batch():
+    """
+    请求体: [{"part_number": ..., "parameter": ..., "footprint": ...}, ...]
+            或 {"items": [...]}
+    返回与输入顺序一致的结果列表。相同的查询 (归一化后) 只解析一次，
+    同一批次内的倒排表查询结果共享。
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return jsonify({"status": "error", "message": "请求体必须是查询列表或 {\"items\": [...]}"}), 400
+
+    library.sync()
+    memo = {}
+    resolved = {}
+    results = []
+    found = 0
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            item = {}
+        part_number = str(item.get('part_number') or '')
+        parameter = str(item.get('parameter') or '')
+        footprint = str(item.get('footprint') or '')
+        searched = {
+            "part_number": part_number,
+            "parameter": parameter,
+            "footprint": footprint
+        }
+
+        if not part_number and not parameter and not footprint:
+            results.append({"index": index, "status": "error",
+                            "message": "需要提供至少一个搜索条件", "searched": searched})
+            continue
+
+        # 精确匹配的 key 和归一化后的模糊查询分别去重
+        if part_number in library.components:
+            query = None
+            dedupe_key = ('exact', part_number)
+        else:
+            query = dedupe_key = normalize_query(part_number, parameter, footprint)
+        result = resolved.get(dedupe_key)
+        if result is None:
+            result = resolved[dedupe_key] = resolve_part(part_number, parameter, footprint, memo, query)
+        matched_pn, item_data, score, reasons = result
+
+        if not item_data:
+            results.append({"index": index, "status": "not_found",
+                            "message": "未找到匹配的元件", "searched": searched})
+            continue
+
+        found += 1
+        results.append({
+            "index": index,
+            "status": "success",
+            "searched": searched,
+            "matched_part_number": matched_pn,
+            "location": {
+                "box_id": item_data.get('box_id'),
+                "led_id": item_data.get('led_id')
+            },
+            "score": score,
+            "reasons": reasons
+        })
+
+    log.debug("  批量查询: %d 行, 去重后 %d 条, 找到 %d 行", len(items), len(resolved), found)
+    with stage_seconds.time('json_encode'):
+        return jsonify({
+            "status": "success",
+            "total": len(items),
+            "found": found,
+            "results": results
+        })
+
+
+# 1c. 拣选路径规划 (按料盒分组、盒内按格子位置排序)
+@lookup.route('/picklist', methods=['POST'])
+def create_picklist():
+    """
+    请求体: BOM 行列表 [{"part_number", "parameter", "footprint", "designator"?, "quantity"?}]
+            或 {"items": [...]}；为空时使用当前 InteractiveBOM 中的全部行。
+    ?bom=<name>: 使用 BOM 目录中的该 BOM (见 /boms)。
+    返回拣选单 id、拣选序列、未找到的行和路径统计 (换盒次数 / 盒内移动格数，BOM 顺序 vs 规划后)。
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if items is None:
+        bom = request.args.get('bom')
+        path = bom_projects.path(bom) if bom else BOM_FILE_NAME
+        try:
+            if path is None:
+                raise FileNotFoundError(bom)
+            with open(path, 'r', encoding='utf-8') as f:
+                items = [row._asdict() for row in extract_rows(f.read())]
+        except FileNotFoundError:
+            return jsonify({"status": "error", "message": f"找不到 {bom or BOM_FILE_NAME}，请在请求体中提供 BOM 行"}), 404
+    if not isinstance(items, list):
+        return jsonify({"status": "error", "message": "请求体必须是 BOM 行列表或 {\"items\": [...]}"}), 400
+
+    library.sync()
+    memo = {}
+    plan = plan_picks([item if isinstance(item, dict) else {} for item in items],
+                      lambda part_number, parameter, footprint:
+                          resolve_part(part_number, parameter, footprint, memo), pick_grid)
+    picklist = picklists.create(plan)
+    log.info("拣选单 %s: %d 行 -> %d 次拣选 (%d 个料盒)，%d 行未找到",
+             picklist.id, len(items), len(plan["picks"]), plan["stats"]["boxes"], len(plan["unresolved"]))
+    return jsonify({"status": "success", "progress": picklist.progress(), **plan})
+
+
+@lookup.route('/picklist')
+def get_picklist():
+    """?id=... (默认最近的一张) -> 拣选单和当前进度"""
+    picklist = picklists.get(request.args.get('id'))
+    if picklist is None:
+        return jsonify({"status": "not_found", "message": "没有这张拣选单"}), 404
+    return jsonify({"status": "success", "progress": picklist.progress(), **picklist.plan})
+
+
+@lookup.route('/picklist/next', methods=['POST'])
+def picklist_next():
+    """
+    ?id=... (默认最近的一张)，?back=1 回退一步。
+    前进到下一个拣选并点灯 (服务器串口桥 / 网页 Web Serial)，同时广播 lightup 事件。
+    """
+    picklist = picklists.get(request.args.get('id'))
+    if picklist is None:
+        return jsonify({"status": "not_found", "message": "没有这张拣选单"}), 404
+    pick = picklist.back() if request.args.get('back') else picklist.next()
+    if pick is None:
+        return jsonify({"status": "finished", "message": "拣选完成", "progress": picklist.progress()})
+
+    payload = {
+        "status": "success",
+        "pick": pick,
+        "location": {"box_id": pick["box_id"], "led_id": pick["led_id"]},
+        "progress": picklist.progress()
+    }
+    if serial_bridge is not None:
+        delivery = serial_bridge.send(pick["box_id"], pick["led_id"])
+        if SERIAL_ACK_WAIT > 0:
+            delivery.wait(SERIAL_ACK_WAIT)
+        payload["delivery"] = delivery.to_dict()
+    event_hub.publish('lightup', {
+        "status": "success",
+        "source": "picklist",
+        "picklist": payload["progress"],
+        "matched_part_number": pick["matched_part_number"],
+        "parameter": pick["parameter"],
+        "footprint": pick["footprint"],
+        "location": payload["location"],
+        "time": time.time()
+    })
+    return jsonify(payload)
+
+
+# 1d. 最接近数值查询 (例如: 0402 封装中最接近 4.99K 的电阻)
+@lookup.route('/nearest')
+def nearest_value():
+    """?value=4.99K&footprint=0402&k=3 -> 按数值 (比例) 最接近的 k 个库存元件"""
+    value_text = request.args.get('value', '')
+    value = parse_value(value_text)
+    if value is None:
+        return jsonify({"status": "error", "message": f"无法解析数值参数: {value_text}"}), 400
+    footprint = normalize_footprint(request.args.get('footprint', ''))
+    k = min(max(request.args.get('k', 1, type=int), 1), 50)
+
+    library.sync()
+    if not library.ready.is_set():
+        library.ready.wait()
+    with library.lock:
+        nearest = [(pn, library.components[pn], error)
+                   for pn, magnitude, error in component_index.values.nearest(value, footprint, k)]
+    results = []
+    for pn, item_data, error in nearest:
+        results.append({
+            "part_number": pn,
+            "parameter": item_data.get('parameter'),
+            "footprint": item_data.get('footprint'),
+            "location": {
+                "box_id": item_data.get('box_id'),
+                "led_id": item_data.get('led_id')
+            },
+            "relative_error": error
         })
+    return jsonify({
+        "status": "success" if results else "not_found",
+        "searched": {"value": format_value(value), "footprint": footprint},
+        "results": results
+    })
+
+
+# 1e. 前 k 个候选 ("您是不是要找": BOM 页面据此给出备选，不必再逐个查询)
+@lookup.route('/search')
+def search_candidates():
+    """
+    ?part_number=&parameter=&footprint=&k=10 -> 按分数降序的前 k 个模糊匹配 (带分数和原因)。
+    型号精确匹配到元件 key 时另外在 exact 中返回。
+    已选出 k 个达到最高可能得分的匹配时提前结束 (complete=false，之后的元件不可能排得更靠前)。
+    format=ndjson (或 Accept: application/x-ndjson): 每行一个候选，最后一行是汇总，k 上限更大。
+    """
+    part_number = request.args.get('part_number', '')
+    parameter = request.args.get('parameter', '')
+    footprint = request.args.get('footprint', '')
+    if not part_number and not parameter and not footprint:
+        return jsonify({"status": "error", "message": "需要提供至少一个搜索条件"}), 400
+    stream = (request.args.get('format') == 'ndjson' or
+              request.accept_mimetypes.best == 'application/x-ndjson')
+    k = min(max(request.args.get('k', 10, type=int), 1), SEARCH_MAX_K_STREAM if stream else SEARCH_MAX_K)
+
+    library.sync()
+    exact = library.components.get(part_number)
+    query = normalize_query(part_number, parameter, footprint)
+    if not library.ready.is_set():
+        library.ready.wait()
+    start = time.perf_counter()
+    with library.lock:  # 不与写入时的增量更新交错
+        matches, complete = component_index.search_top(*query, k=k)
+    stage_seconds.observe(time.perf_counter() - start, 'search')
+
+    searched = {"part_number": part_number, "parameter": parameter, "footprint": footprint}
+    summary = {"searched": searched, "returned": len(matches), "complete": complete,
+               "revision": component_index.revision,
+               "exact": _candidate(part_number, exact, None, ["型号精确匹配"]) if exact is not None else None}
+    if stream:
+        def lines():
+            for match in matches:
+                line = _candidate(match['part_number'], library.components.get(match['part_number']),
+                                  match['score'], match['reasons'])
+                if line is not None:  # 期间已被删除
+                    yield json.dumps(line, ensure_ascii=False) + '\n'
+            yield json.dumps(dict(summary, done=True), ensure_ascii=False) + '\n'
+        return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+    results = [_candidate(match['part_number'], library.components.get(match['part_number']),
+                          match['score'], match['reasons']) for match in matches]
+    results = [result for result in results if result is not None]
+    return jsonify(dict(summary, status="success" if results or exact is not None else "not_found",
+                        returned=len(results), results=results))
+
+
+def _candidate(part_number, item_data, score, reasons):
+    if item_data is None:
+        return None
+    return {
+        "part_number": part_number,
+        "parameter": item_data.get('parameter'),
+        "footprint": item_data.get('footprint'),
+        "location": {
+            "box_id": item_data.get('box_id'),
+            "led_id": item_data.get('led_id')
+        },
+        "score": score,
+        "reasons": reasons
+    }
 
 
 # 2. 【核心】主页路由 (注入增强版脚本)
-@app.route('/')
+@lookup.route('/')
+@lookup.route('/bom')
 def serve_bom():
     try:
-        with open(BOM_FILE_NAME, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+        page = bom_page_cache.get(BOM_FILE_NAME)
     except FileNotFoundError:
         return f"错误: 找不到 {BOM_FILE_NAME}。请确保它和 app.py 在同一文件夹中。", 404
+    return cached_page_response(page)
+
+
+@lookup.route('/lookup.js')
+def serve_bom_lookup():
+    """主页的预解析查找表 (页面通过 <script src> 加载)，元件库变化后重新构建"""
+    library.sync()
+    try:
+        page = bom_lookup_cache.get(BOM_FILE_NAME)
+    except FileNotFoundError:
+        return f"错误: 找不到 {BOM_FILE_NAME}。", 404
+    return cached_page_response(page, 'text/javascript')
+
+
+# 2a. BOM 目录中的项目 (每块板子一个 InteractiveBOM 导出文件)
+@lookup.route('/bom/<name>')
+def serve_project_bom(name):
+    page = bom_projects.page(name)
+    if page is None:
+        return f"错误: {BOM_DIR} 中没有 {name}.html。可用的 BOM 见 /boms。", 404
+    return cached_page_response(page)
 
-    # --- 自动修改BOM的 console.log ---
-    find_string_block = r"Se=H.dataId[1],X=H.dataEle[1],ze=H.value;console.log(`\u5668\u4EF6\u7F16\u53F7:${Se}, \u5668\u4EF6\u578B\u53F7:${X}, \u503C:${ze}`)"
-    replace_string_block = r"Se=H.dataId[1],X=H.dataEle[1],ze=H.value,Oe=H.package[1];console.log(`\u5668\u4EF6\u7F16\u53F7:${Se}, \u5668\u4EF6\u578B\u53F7:${X}, \u503C:${ze}, \u5C01\u88C5:${Oe}`)"
-
-    if find_string_block in html_content:
-        html_content = html_content.replace(find_string_block, replace_string_block)
-        if not hasattr(serve_bom, 'patch_applied'):
-            print("=========================================")
-            print("  ✓ 自动BOM脚本修改成功！")
-            print("  ✓ 已添加 '封装' (Oe) 并更新 console.log。")
-            print("=========================================")
-            serve_bom.patch_applied = True
+
+@lookup.route('/bom/<name>/lookup.js')
+def serve_project_lookup(name):
+    library.sync()
+    page = bom_projects.lookup(name)
+    if page is None:
+        return f"错误: {BOM_DIR} 中没有 {name}.html。", 404
+    return cached_page_response(page, 'text/javascript')
+
+
+@lookup.route('/boms')
+def list_boms():
+    """BOM 目录中的全部项目: 大小、是否已缓存、预解析覆盖率 (已定位的行数 / 有内容的行数)"""
+    library.sync()
+    boms = bom_projects.summary()
+    return jsonify({
+        "directory": os.path.abspath(BOM_DIR),
+        "revision": component_index.revision,
+        "boms": boms,
+        "cache": {"bytes": bom_page_cache.bytes, "max_bytes": bom_page_cache.max_bytes,
+                  "pages": len(bom_page_cache.pages()), "builds": bom_page_cache.builds,
+                  "evictions": bom_page_cache.evictions},
+        "lookups": {"bytes": bom_lookup_cache.bytes, "tables": len(bom_lookup_cache.pages()),
+                    "builds": bom_lookup_cache.builds}
+    })
+
+
+def cached_page_response(page, mimetype='text/html'):
+    """返回缓存页面 (或查找表脚本): 支持 ETag / 304 以及预压缩的 gzip / brotli 版本"""
+    if request.if_none_match.contains(page.etag):
+        response = Response(status=304)
     else:
-        if not hasattr(serve_bom, 'patch_failed'):
-            print("=========================================")
-            print("  ⚠️ 警告: 未能自动修改BOM脚本。")
-            print("    (未找到的完整代码块):")
-            print(f"    {find_string_block}")
-            print("=========================================")
-            serve_bom.patch_failed = True
+        encoding, body = page.choose(request.accept_encodings)
+        response = Response(body, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(page.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def lookup_url(path):
+    """BOM 文件的查找表脚本地址: 主页 (BOM_FILE_NAME) 为 /lookup.js，BOM 目录中的项目为 /bom/<name>/lookup.js"""
+    if os.path.abspath(path) == os.path.abspath(BOM_FILE_NAME):
+        return '/lookup.js'
+    name = os.path.basename(path)
+    if name.endswith('.html'):
+        name = name[:-len('.html')]
+    return f"/bom/{quote(name)}/lookup.js"
+
+
+def build_lookup_js(path):
+    """
+    预先解析 BOM 中的全部行 (见 bom_table)，返回 (查找表脚本, 预解析统计)。
+    点击时命中这张表就直接点灯，不再请求 /lightup。
+    查找表与页面分开缓存 (bom_lookup_cache)：元件库变化时只重新预解析并压缩这一小段脚本，
+    几 MB 的页面本身 (修改、注入、gzip-9 / brotli) 只在 BOM 文件变化时重新构建。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    memo = {}
+    table, stats = build_lookup_table(
+        extract_rows(html_content),
+        lambda part_number, parameter, footprint: resolve_part(part_number, parameter, footprint, memo))
+    log.info("BOM 预解析: %d 行, %d 个元件已定位, %d 个未找到 (元件库 revision %d)",
+             stats['rows'], stats['resolved'], stats['not_found'], component_index.revision)
+    data = json.dumps(table, ensure_ascii=False, separators=(',', ':'))
+    return f"window.BOM_LOOKUP = {data};\n", stats
+
+
+def build_bom_page(path):
+    """
+    读取 BOM 文件，修改 console.log 并注入串口脚本 (以及加载查找表的 <script src>)，返回最终 HTML。
+    由 bom_page_cache 缓存，只在 BOM 文件变化时重新构建；查找表见 build_lookup_js。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    lookup_script = f'<script id="bom-lookup" src="{html.escape(lookup_url(path))}"></script>'
+
+    # --- 自动修改BOM的 console.log (代码块见 bom_table.CONSOLE_LOG_BLOCK) ---
+    # 页面只在文件变化时重新构建 (见 bom_page_cache)，这里的日志不会每次请求都输出
+    if CONSOLE_LOG_BLOCK in html_content:
+        html_content = html_content.replace(CONSOLE_LOG_BLOCK, CONSOLE_LOG_PATCHED)
+        log.info("✓ 自动BOM脚本修改成功！已添加 '封装' (Oe) 并更新 console.log。")
+    else:
+        log.warning("⚠️ 未能自动修改BOM脚本。未找到的完整代码块: %s", CONSOLE_LOG_BLOCK)
     # --- 自动修改结束 ---
 
 
@@ -324,12 +824,19 @@ def serve_bom():
             font-weight: bold;
             font-size: 0.9rem;
         }
+        #pick-feed {
+            margin: 0.25rem 0 0;
+            font-size: 0.8rem;
+            color: #555;
+        }
     </style>
 
     <div id="serial-control">
         <h4>Web 串口控制</h4>
         <button id="connectButton">连接串口</button>
         <p id="serial-status">状态：未连接</p>
+        <p id="pick-feed"></p>
+        <button id="pickButton">按料盒顺序拣选</button>
     </div>
 
     
@@ -476,6 +983,21 @@ def serve_bom():
                     // 如果至少提取到一个信息，就发送请求
                     if (extracted.part_number || extracted.parameter || extracted.footprint) {
                         originalConsoleLog('📦 捕获到元件信息:', extracted);
+
+                        // 页面构建时预解析的查找表：命中且 Web Serial 已连接时直接点灯，不等服务器
+                        const lookupKey = [extracted.part_number, extracted.parameter, extracted.footprint].join('|');
+                        const hit = window.BOM_LOOKUP ? window.BOM_LOOKUP[lookupKey] : undefined;
+                        if (hit && serial_writer) {
+                            const [boxId, ledId, score, matchedPn] = hit;
+                            originalConsoleLog('⚡ 查找表命中:', matchedPn, '位置:', {box_id: boxId, led_id: ledId},
+                                               score === null ? '(精确匹配)' : `(分数:${score})`);
+                            sendSerialData(boxId, ledId);
+                            // 只用于通知其他工作站 (/events)，不影响点灯
+                            navigator.sendBeacon('/lightup/report', new Blob([JSON.stringify({
+                                searched: extracted, matched_part_number: matchedPn, box_id: boxId, led_id: ledId
+                            })], {type: 'application/json'}));
+                            return;
+                        }
                        
                         const params = new URLSearchParams();
                         if (extracted.part_number) params.append('part_number', extracted.part_number);
@@ -495,7 +1017,13 @@ def serve_bom():
                                     //  不再只是打印，而是调用串口发送函数
                                     // *************************************
                                     //
-                                    sendSerialData(data.location.box_id, data.location.led_id);
+                                    if (data.delivery) {
+                                        // 服务器串口桥已经发送 (BOM_SERIAL_PORT)
+                                        originalConsoleLog('📡 服务器串口桥:', data.delivery);
+                                        statusDisplay.textContent = `状态：服务器已发送 (B:${data.location.box_id}, L:${data.location.led_id}) ${data.delivery.status}`;
+                                    } else {
+                                        sendSerialData(data.location.box_id, data.location.led_id);
+                                    }
                                     
                                 } else {
                                     originalConsoleLog('❌ 未找到匹配:', data.message);
@@ -510,23 +1038,89 @@ def serve_bom():
                 }
             }
         };
+
+        // --- 5. 拣选模式: 整张 BOM 按料盒 / 格子顺序逐个点灯 (/picklist) ---
+        const pickButton = document.getElementById('pickButton');
+        let picklistId = null;
+        pickButton.addEventListener('click', async () => {
+            try {
+                if (!picklistId) {
+                    const plan = await (await fetch('/picklist', {method: 'POST'})).json();
+                    if (plan.status !== 'success') {
+                        statusDisplay.textContent = `状态：${plan.message}`;
+                        return;
+                    }
+                    picklistId = plan.progress.id;
+                    originalConsoleLog('🧺 拣选单:', plan.stats, '未找到:', plan.unresolved);
+                }
+                const data = await (await fetch(`/picklist/next?id=${picklistId}`, {method: 'POST'})).json();
+                if (data.status !== 'success') {
+                    statusDisplay.textContent = `状态：拣选完成 (${data.progress ? data.progress.total : 0} 个位置)`;
+                    pickButton.textContent = '按料盒顺序拣选';
+                    picklistId = null;
+                    return;
+                }
+                if (!data.delivery) {
+                    sendSerialData(data.location.box_id, data.location.led_id);
+                }
+                pickButton.textContent = `下一个 (${data.progress.done}/${data.progress.total})`;
+                statusDisplay.textContent = `状态：拣选 ${data.pick.designators.join(',') || data.pick.matched_part_number} ×${data.pick.quantity} (B:${data.location.box_id}, L:${data.location.led_id})`;
+            } catch (err) {
+                originalConsoleLog('⚠️ 拣选请求错误:', err);
+                statusDisplay.textContent = `状态：后端请求失败`;
+            }
+        });
+
+        // --- 6. 事件推送: 显示所有工作站 (包括其他浏览器) 的点灯结果 ---
+        const pickFeed = document.getElementById('pick-feed');
+        if ('EventSource' in window) {
+            const events = new EventSource('/events');
+            events.addEventListener('lightup', (e) => {
+                const data = JSON.parse(e.data);
+                if (data.status === 'success') {
+                    const label = [data.parameter, data.footprint].filter(Boolean).join(' ') || data.matched_part_number;
+                    pickFeed.textContent = `正在拣选: ${label} → 盒子 ${data.location.box_id} LED ${data.location.led_id}`;
+                }
+            });
+            let lookupReload = null;
+            events.addEventListener('library', (e) => {
+                const data = JSON.parse(e.data);
+                // 查找表已过期：在新表加载完之前点击走 /lightup；连续的修改合并成一次重新加载
+                window.BOM_LOOKUP = null;
+                pickFeed.textContent = `元件库已更新 (${data.components} 条)`;
+                clearTimeout(lookupReload);
+                lookupReload = setTimeout(() => {
+                    const old = document.getElementById('bom-lookup');
+                    if (!old) return;
+                    const script = document.createElement('script');
+                    script.id = 'bom-lookup';
+                    script.src = old.src;
+                    old.replaceWith(script);
+                }, 1000);
+            });
+        }
     </script>
     """
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    if soup.body:
-        soup.body.append(BeautifulSoup(injected_script, 'html.parser'))
-    else:
-        html_content += injected_script
-        return Response(html_content, mimetype='text/html')
+    # 直接拼接到最后一个 </body> 之前，不再对几 MB 的页面做完整的 DOM 解析
+    injected_script = lookup_script + injected_script
+    body_end = html_content.lower().rfind('</body>')
+    if body_end == -1:
+        return html_content + injected_script
+    return html_content[:body_end] + injected_script + html_content[body_end:]
 
-    return Response(str(soup), mimetype='text/html')
 
+# 页面只依赖 BOM 文件；查找表还依赖元件库 (每块板子一份，只有几 KB 到几十 KB，不限制总大小)
+bom_page_cache = PageCache(build_bom_page, max_bytes=int(BOM_CACHE_MB * 1024 * 1024))
+bom_lookup_cache = PageCache(build_lookup_js, version=lambda: component_index.revision)
+bom_projects = BomProjects(BOM_DIR, bom_page_cache, bom_lookup_cache)
 
-if __name__ == '__main__':
+
+def print_banner():
     print(f"🚀 启动BOM智能搜索服务器...")
     print(f"📄 BOM文件: {BOM_FILE_NAME}")
-    print(f"📊 数据库: {COMPONENTS_FILE}")
+    print(f"📁 BOM 目录: {BOM_DIR} (http://127.0.0.1:5000/boms 列出全部项目，/bom/<name> 打开)")
+    print(f"📊 数据库: {STORAGE_BACKEND} 存储后端")
     print(f"🌐 访问地址: http://127.0.0.1:5000")
     print(f"\n搜索策略:")
     print(f"  1. 优先精确匹配器件型号")
@@ -535,4 +1129,14 @@ if __name__ == '__main__':
     print(f"  4. 显示匹配度最高的结果\n")
     print(f"⚡ 新功能: 已集成 Web Serial API (网页串口)！")
     print(f"  请在打开的网页中点击 '连接串口' 按钮。")
-    app.run(debug=True, port=5000, host='127.0.0.1')
\ No newline at end of file
+    if serial_bridge is not None:
+        print(f"🔌 服务器串口桥: {SERIAL_PORT} @ {SERIAL_BAUDRATE} (网页中的 Web Serial 不再需要连接)")
+    print(f"📈 指标: http://127.0.0.1:5000/metrics (日志级别 {LOG_LEVEL}，BOM_LOG_LEVEL=DEBUG 可查看每次点击的详细过程)")
+
+
+if __name__ == '__main__':
+    # 查询路由和元件管理器由 bom_app 组成同一个应用 (共用一个元件库)；
+    # 让 bom_app 导入的 DanymicBomServer 就是本模块，而不是再执行一遍
+    sys.modules['DanymicBomServer'] = sys.modules['__main__']
+    import bom_app
+    bom_app.main()
@@ -6,39 +6,157 @@ LastEditTime: 2025-11-10 00:35:58
 FilePath: \WebUI\Input.py
 Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查看配置 进行设置: https://github.com/OBKoro1/koro1FileHeader/wiki/%E9%85%8D%E7%BD%AE
 '''
-import os
-import json
-from flask import Flask, request, jsonify, send_from_directory
+import re
+import sys
 
-app = Flask(__name__)
-JSON_FILE = 'components.json'
+from flask import Blueprint, Response, current_app, request, jsonify, send_from_directory, stream_with_context
+
+import component_io
+from component_store import entry_version
+from library import shared_library
+from slot_index import slot_of
+
+# 元件管理路由 (由 bom_app.create_app 与查询服务器一起注册到同一个应用上)
+manager = Blueprint('manager', __name__)
+
+# 与查询服务器共用的元件库 (见 library.Library)。存储后端 (见 component_store.STORAGE_BACKEND):
+#   json   - 列式元件表 + components.json.journal 追加日志，定期压缩回 components.json
+#   sqlite - components.db (WAL 模式)，多个进程可以并发读写
+# 写入通过 library 完成，倒排索引 / 位置索引随之增量更新，查询路由立即可见
+library = shared_library()
+
+
+def current_slots():
+    """(box_id, led_id) 占用索引；先读取其他进程的写入"""
+    library.sync()
+    library.ready.wait()
+    return library.slots
 
-def load_data():
-    """从JSON文件加载数据"""
-    if not os.path.exists(JSON_FILE):
-        return {}
-    try:
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {} # 如果文件是空的或损坏的，返回空字典
 
-def save_data(data):
-    """将数据保存回JSON文件"""
-    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+def _slot_taken_error(box_id, led_id, owner):
+    return jsonify({"success": False, "error": f"位置 (Box {box_id}, LED {led_id}) 已被 {owner} 占用",
+                    "occupied_by": owner}), 409
+
+
+def _version_conflict(key, current):
+    """
+    If-Match: "<version>" 与元件当前的版本号不一致 (或元件已被删除) 时返回 409，一致时返回 None。
+    版本号在 details['version'] 中，每次写入 +1。
+    """
+    version = entry_version(current) if current is not None else None
+    if version is not None and request.if_match.contains(str(version)):
+        return None
+    return jsonify({"success": False, "error": f"版本冲突: {key} 已被修改或删除，请刷新后重试",
+                    "current_version": version}), 409
 
 # --- API 路由 ---
 
-@app.route('/api/components', methods=['GET'])
+LIST_PARAMS = ('limit', 'cursor', 'box_id', 'footprint', 'parameter', 'sort', 'order')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def _natural_key(text):
+    """'10K' < '100K'，与前端 localeCompare(numeric: true) 的排序方式一致"""
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part.lower())
+            for part in re.split(r'(\d+)', str(text or '')) if part]
+
+
+def _location_key(value):
+    return value if isinstance(value, int) else -1
+
+
+# 排序方式与 InputWebUI.html 中的 currentSortCriteria 对应
+SORT_KEYS = {
+    'parameter': lambda item: (_natural_key(item[1].get('parameter')),
+                               _natural_key(item[1].get('footprint')),
+                               _location_key(item[1].get('box_id'))),
+    'box': lambda item: (_location_key(item[1].get('box_id')), _location_key(item[1].get('led_id'))),
+    'led': lambda item: (_location_key(item[1].get('led_id')), _location_key(item[1].get('box_id'))),
+    'key': lambda item: item[0],
+}
+
+
+def _filter_components(items, args):
+    """按 box_id (精确)、footprint (精确, 不区分大小写)、parameter (前缀, 不区分大小写) 过滤 (key, details)"""
+    box_id = args.get('box_id', type=int)
+    footprint = args.get('footprint', '').strip().upper()
+    parameter = args.get('parameter', '').strip().upper()
+    for key, details in items:
+        if box_id is not None and details.get('box_id') != box_id:
+            continue
+        if footprint and (details.get('footprint') or '').upper() != footprint:
+            continue
+        if parameter and not (details.get('parameter') or '').upper().startswith(parameter):
+            continue
+        yield key, details
+
+
+def _not_modified(token):
+    if request.if_none_match.contains(token):
+        response = current_app.response_class(status=304)
+        response.set_etag(token)
+        return response
+    return None
+
+
+@manager.route('/api/components', methods=['GET'])
 def get_components():
-    """获取所有元件的列表"""
-    data = load_data()
-    return jsonify(data)
+    """
+    获取元件列表。
+      无参数:               返回完整字典 {key: details} (与旧版本兼容)
+      since=<revision>:     增量模式，只返回该版本之后变化的元件 (null 表示已删除)；
+                            版本过旧或无效时返回 full=true 和完整字典
+      limit/cursor/box_id/footprint/parameter/sort/order:
+                            服务端过滤、排序、分页
+    所有响应都带 ETag (= 当前 revision)，支持 If-None-Match -> 304。
+    """
+    library.sync()
+    store = library.store
+    token = store.revision_token()
+
+    if 'since' in request.args:
+        changes = store.changes_since(request.args['since'])
+        if changes is None:
+            return _with_etag(jsonify({"revision": token, "full": True, "components": dict(store.iter_items())}), token)
+        return _with_etag(jsonify({"revision": token, "full": False, "changes": changes}), token)
+
+    not_modified = _not_modified(token)
+    if not_modified is not None:
+        return not_modified
+
+    if not any(name in request.args for name in LIST_PARAMS):
+        return _with_etag(jsonify(dict(store.iter_items())), token)
 
-@app.route('/api/add', methods=['POST'])
+    sort = request.args.get('sort', 'key')
+    if sort not in SORT_KEYS:
+        return jsonify({"success": False, "error": f"不支持的排序方式: {sort}"}), 400
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    offset = request.args.get('cursor', 0, type=int)
+
+    # iter_items 先取 key 列表的快照，其他线程同时写入时也可以安全遍历
+    items = sorted(_filter_components(store.iter_items(), request.args), key=SORT_KEYS[sort],
+                   reverse=request.args.get('order', 'asc') == 'desc')
+    page = items[offset:offset + limit]
+    next_offset = offset + len(page)
+    return _with_etag(jsonify({
+        "revision": token,
+        "total": len(items),
+        "items": [{"key": key, "details": details} for key, details in page],
+        "next_cursor": str(next_offset) if next_offset < len(items) else None
+    }), token)
+
+
+def _with_etag(response, token):
+    response.set_etag(token)
+    return response
+
+@manager.route('/api/add', methods=['POST'])
 def add_component():
-    """添加一个新元件"""
+    """
+    添加一个新元件。
+    带 If-Match: "<version>" 时改为更新已有元件，版本号不一致返回 409 (乐观并发控制)。
+    """
     new_comp_data = request.json
     
     # "component_name" 是我们从前端JS发送的顶层key
@@ -49,46 +167,139 @@ def add_component():
     if not component_name or not details:
         return jsonify({"success": False, "error": "数据不完整"}), 400
 
-    data = load_data()
-    
-    if component_name in data:
-        return jsonify({"success": False, "error": "该元件名称已存在"}), 400
-    
-    data[component_name] = details
-    save_data(data)
-    
-    return jsonify({"success": True, "component_name": component_name})
+    slot = slot_of(details)
+    if slot is None:
+        return jsonify({"success": False, "error":
+                        f"box_id 必须是 >= 1 的整数，led_id 必须是 1 到 {component_io.LEDS_PER_BOX} 之间的整数"}), 400
+
+    # 检查 + 写入在同一个批次 (写锁，包括其他进程) 内完成，并发添加同一位置时只有一个能成功
+    with library.batch():
+        current = library.store.get(component_name)
+        if request.if_match:
+            conflict = _version_conflict(component_name, current)
+            if conflict is not None:
+                return conflict
+        elif current is not None:
+            return jsonify({"success": False, "error": "该元件名称已存在"}), 400
+        owner = library.slots.owner(*slot)
+        if owner is not None and owner != component_name:
+            return _slot_taken_error(*slot, owner)
+        details = library.add(component_name, details)
+
+    version = details['version']
+    return _with_etag(jsonify({"success": True, "component_name": component_name, "version": version}), str(version))
 
-@app.route('/api/delete', methods=['POST'])
+@manager.route('/api/delete', methods=['POST'])
 def delete_component():
-    """删除一个元件"""
+    """删除一个元件 (带 If-Match 时只删除该版本，版本号不一致返回 409)"""
     data_to_delete = request.json
     component_name = data_to_delete.get('component_name')
 
     if not component_name:
         return jsonify({"success": False, "error": "未提供元件名称"}), 400
 
-    data = load_data()
-    
-    if component_name in data:
-        del data[component_name]
-        save_data(data)
+    with library.batch():
+        current = library.store.get(component_name)
+        if current is not None and request.if_match:
+            conflict = _version_conflict(component_name, current)
+            if conflict is not None:
+                return conflict
+        deleted = library.delete(component_name)
+
+    if deleted:
         return jsonify({"success": True, "component_name": component_name})
     else:
         return jsonify({"success": False, "error": "元件未找到"}), 404
 
+@manager.route('/api/import', methods=['POST'])
+def import_components():
+    """
+    批量导入 (CSV 或 JSON Lines，请求体直接是文件内容)。
+    格式由 ?format=csv|jsonl 或 Content-Type 决定。
+    所有行都校验通过才会提交 (原子)，否则一条也不写入；返回逐行报告。
+    """
+    fmt = component_io.detect_format(request.content_type, request.args.get('format'))
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"success": False, "error": "请用 ?format=csv|jsonl 或 Content-Type 指明导入格式"}), 400
+
+    # 先流式解析上传内容，再在写锁内校验 + 提交，避免慢速上传长时间占用写锁
+    try:
+        rows = list(component_io.iter_rows(request.stream, fmt))
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({"success": False, "error": f"无法解析上传内容: {e}"}), 400
+
+    with library.batch():
+        accepted, report, valid = component_io.validate_import(rows, library.store, library.slots.owner)
+        if valid:
+            library.add_many(accepted)
+
+    status = 200 if valid else 400
+    return jsonify({
+        "success": valid,
+        "imported": len(accepted) if valid else 0,
+        "errors": sum(1 for row in report if row['status'] == 'error'),
+        "rows": report
+    }), status
+
+
+@manager.route('/api/export', methods=['GET'])
+def export_components():
+    """流式导出整个元件库: ?format=jsonl (默认) | csv | json (components.json 格式)"""
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in component_io.EXPORT_MIMETYPES:
+        return jsonify({"success": False, "error": f"不支持的导出格式: {fmt}"}), 400
+    extension = 'json' if fmt == 'json' else fmt
+    library.sync()
+    chunks = component_io.export_chunks(library.store.iter_items(), fmt)
+    return Response(stream_with_context(chunks), mimetype=component_io.EXPORT_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=components.{extension}"})
+
+@manager.route('/api/next_free_slot', methods=['GET'])
+def next_free_slot():
+    """
+    ?box_id=N: 该料盒中编号最小的空位；料盒已满时 led_id 为 null，并给出之后第一个有空位的料盒。
+    不带 box_id 时返回从 1 号料盒开始的第一个空位。
+    """
+    index = current_slots()
+    box_id = request.args.get('box_id', type=int)
+    if box_id is None:
+        box_id, led_id = index.first_free()
+        return jsonify({"success": True, "box_id": box_id, "led_id": led_id})
+    if box_id < 1:
+        return jsonify({"success": False, "error": "box_id 必须 >= 1"}), 400
+    led_id = index.next_free(box_id)
+    result = {"success": True, "box_id": box_id, "led_id": led_id,
+              "occupied": index.occupied(box_id), "capacity": component_io.LEDS_PER_BOX}
+    if led_id is None:
+        result["box_full"] = True
+        result["next_box_id"], result["next_led_id"] = index.first_free(box_id + 1)
+    return jsonify(result)
+
+
+@manager.route('/api/locate', methods=['GET'])
+def locate_slot():
+    """?box_id=&led_id=: 反向查询该位置上的元件"""
+    box_id = request.args.get('box_id', type=int)
+    led_id = request.args.get('led_id', type=int)
+    if box_id is None or led_id is None:
+        return jsonify({"success": False, "error": "需要提供 box_id 和 led_id"}), 400
+    keys = current_slots().locate(box_id, led_id)
+    components = [{"key": key, "details": library.store.get(key)} for key in keys]
+    return jsonify({"success": True, "box_id": box_id, "led_id": led_id,
+                    "occupied": bool(components), "components": components})
+
+
 # --- UI 路由 ---
 
-@app.route('/')
+@manager.route('/manager')
 def serve_index():
     """提供 index.html UI 界面"""
     return send_from_directory('.', 'InputWebUI.html')
 
 # --- 启动服务器 ---
 if __name__ == '__main__':
-    print("=========================================")
-    print(" 🚀 元件管理器已启动！")
-    print(" 🌍 请在浏览器中打开: http://127.0.0.1:5000")
-    print("=========================================")
-    # 使用 host='0.0.0.0' 可以让局域网内的其他设备也访问
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # 元件管理器和查询服务器由 bom_app 组成同一个应用 (共用一个元件库，元件管理器在 /manager)
+    # 与原来一样: / 打开元件管理器，监听 0.0.0.0 让局域网内的其他设备也能访问 (BOM_HOST 可以覆盖)
+    sys.modules['InputDataset'] = sys.modules['__main__']
+    import bom_app
+    bom_app.main(host='0.0.0.0', home='manager')
@@ -0,0 +1,373 @@
+'''
+Description: WebUI 性能基准。
+    生成 1k / 10k / 100k / 1M 条的合成元件库 (components.json 格式) 和合成 InteractiveBOM，
+    通过 Flask test client 驱动 search_component、/lightup、GET / (serve_bom)、/api/add + /api/delete，
+    输出每项的 p50/p95/p99 延迟、吞吐量以及峰值内存 (RSS)，结果为 JSON，方便在分支之间对比。
+
+    用法:
+        python benchmark.py --sizes 1000 10000 --output base.json
+        python benchmark.py --compare base.json head.json
+    每个库规模在独立的子进程中运行，峰值 RSS 互不影响。
+'''
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil  # 可选依赖: pip install psutil (Windows 上测量内存)
+except ImportError:
+    psutil = None
+
+from bom_table import CONSOLE_LOG_BLOCK, CONSOLE_LOG_PATCHED
+
+WEBUI_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (1000, 10000, 100000)
+ALL_SIZES = (1000, 10000, 100000, 1000000)
+LEDS_PER_BOX = 81
+
+# --- 合成数据 ---
+E24 = (1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+       3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1)
+PASSIVE_FOOTPRINTS = ('0402', '0603', '0805', '1206')
+IC_FOOTPRINTS = ('SOT-23', 'SOT-23-5', 'SOT-223', 'SOP-8', 'QFN-16', '')
+IC_MODELS = ('AMS1117', 'SPX3819', 'LM358', 'NE555', 'CH340', 'TP4056', 'ME6211', 'SS34',
+             '1N4148', '1N5819', 'AO3400', 'STM32F103', 'ESP32', 'HS8836', 'XL1509')
+VOLTAGES = ('', '', '', '6.3V', '10V', '16V', '25V', '50V')
+
+
+def _resistor(rng):
+    value = rng.choice(E24) * 10 ** rng.randint(0, 6)
+    for suffix, factor in (('M', 1e6), ('K', 1e3), ('R', 1.0)):
+        if value >= factor:
+            return f"{value / factor:g}{suffix}"
+    return f"{value:g}R"
+
+
+def _capacitor(rng):
+    return rng.choice((f"{rng.choice(E24):g}{rng.choice(('p', 'n', 'u'))}F",
+                       f"{rng.choice((1, 10, 100, 22, 47)):g}{rng.choice(('n', 'u'))}F"))
+
+
+def generate_library(size, seed=0):
+    """合成元件库 {key: details}，字段与 components.json 相同"""
+    rng = random.Random(seed)
+    keys = rng.sample(range(16 ** 6), size)
+    db = {}
+    for i, key in enumerate(keys):
+        kind = rng.random()
+        if kind < 0.45:
+            parameter, footprint, voltage = _resistor(rng), rng.choice(PASSIVE_FOOTPRINTS), ''
+        elif kind < 0.8:
+            parameter, footprint, voltage = _capacitor(rng), rng.choice(PASSIVE_FOOTPRINTS), rng.choice(VOLTAGES)
+        else:
+            parameter, footprint, voltage = f"{rng.choice(IC_MODELS)}{rng.choice(('', '', 'A', 'B'))}", \
+                rng.choice(IC_FOOTPRINTS), ''
+        db[f"{key:06X}"] = {
+            "box_id": i // LEDS_PER_BOX + 1,
+            "led_id": i % LEDS_PER_BOX + 1,
+            "parameter": parameter,
+            "voltage": voltage,
+            "footprint": footprint
+        }
+    return db
+
+
+def _ohm_style(parameter):
+    """把库中的 10K / 4.7R 写成 BOM 里常见的 10kΩ / 4.7Ω"""
+    if parameter.endswith('K'):
+        return parameter[:-1] + 'kΩ'
+    if parameter.endswith('R'):
+        return parameter[:-1] + 'Ω'
+    if parameter.endswith('M'):
+        return parameter[:-1] + 'MΩ'
+    return parameter
+
+
+def generate_queries(db, count, seed=1):
+    """
+    合成 BOM 查询 [(part_number, parameter, footprint)]，混合:
+      精确 key / R0402 风格封装 + Ω 后缀的阻值 / 长型号 (SPX3819M5-3.3) / 查不到的行
+    """
+    rng = random.Random(seed)
+    items = list(db.items())
+    queries = []
+    for _ in range(count):
+        key, data = rng.choice(items)
+        kind = rng.random()
+        footprint = data['footprint']
+        if kind < 0.25:
+            queries.append((key, '', ''))
+        elif kind < 0.65:
+            prefix = 'R' if data['parameter'][-1:] in 'KRM' else 'C'
+            bom_footprint = prefix + footprint if len(footprint) == 4 else footprint
+            queries.append((f"{prefix}C{footprint}", _ohm_style(data['parameter']), bom_footprint))
+        elif kind < 0.9:
+            queries.append((f"{data['parameter']}M5-3.3", '', footprint or 'SOT-23-5'))
+        else:
+            queries.append((f"NOPE{rng.randint(0, 10 ** 6)}", f"{rng.randint(1, 999)}X", 'DIP-40'))
+    return queries
+
+
+def generate_bom_html(queries, filler_bytes=2_000_000):
+    """
+    合成 InteractiveBOM 页面 (约 filler_bytes 大小): 与立创 EDA 导出一样，BOM 行是内嵌数据，
+    并带有 build_bom_page 要修改的 console.log 代码块
+    """
+    rows = [{"dataId": [f"R{i}", f"R{i}"], "dataEle": [f"R{i}", pn], "value": parameter,
+             "package": [f"R{i}", footprint]} for i, (pn, parameter, footprint) in enumerate(queries)]
+    data = json.dumps({"bom": {"both": rows}}, ensure_ascii=False)
+    filler = 'var filler = "' + 'x' * max(filler_bytes - len(data), 0) + '";'
+    return (f"<!DOCTYPE html><html><head><script>{filler}</script></head><body>"
+            f"<script>var pcbdata = {data};function f(H){{{CONSOLE_LOG_BLOCK}}}</script></body></html>")
+
+
+# --- 计时 ---
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "mean_ms": sum(latencies) / len(latencies) * 1e3,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else None
+    }
+
+
+def measure(func, args_list):
+    """依次调用 func(*args)，返回 summarize 结果"""
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def peak_rss_kb():
+    """本进程的峰值 RSS (KB)；既没有 resource 也没有 psutil 时返回 None"""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage // 1024 if sys.platform == 'darwin' else usage
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) // 1024  # Windows: 峰值工作集
+    return None
+
+
+def current_rss_kb():
+    """本进程当前的 RSS (KB)；无法测量时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):  # 没有 /proc (macOS / Windows)，Windows 上也没有 os.sysconf
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss // 1024
+    return None
+
+
+@contextlib.contextmanager
+def quiet():
+    """服务器里的 print 输出到 /dev/null，不让终端 I/O 干扰计时"""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# --- 单个库规模的基准 (在子进程中运行) ---
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册一个基准: func(ctx) -> summarize 结果"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@benchmark('search_component')
+def bench_search_component(ctx):
+    server = ctx['server']
+    return measure(server.search_component, ctx['queries'])
+
+
+@benchmark('lightup')
+def bench_lightup(ctx):
+    client = ctx['app'].test_client()
+    urls = [('/lightup?' + _urlencode(pn, parameter, footprint),) for pn, parameter, footprint in ctx['queries']]
+    return measure(client.get, urls)
+
+
+@benchmark('serve_bom')
+def bench_serve_bom(ctx):
+    client = ctx['app'].test_client()
+    # 确认测的是修改 + 注入的路径，而不是 "未找到代码块" 的路径
+    page = client.get('/').get_data(as_text=True)
+    assert CONSOLE_LOG_PATCHED in page and 'id="bom-lookup"' in page, "合成 BOM 页面没有被修改"
+    table = client.get('/lookup.js').get_data(as_text=True)
+    assert table.startswith('window.BOM_LOOKUP = {"'), "合成 BOM 的查找表为空"
+    return measure(client.get, [('/',)] * ctx['page_requests'])
+
+
+@benchmark('dataset_add_delete')
+def bench_dataset_add_delete(ctx):
+    client = ctx['app'].test_client()
+    box_id = len(ctx['db']) // LEDS_PER_BOX + 2
+
+    def add_then_delete(i):
+        key = f"BENCH{i:06d}"
+        client.post('/api/add', json={"component_name": key, "details": {
+            "box_id": box_id + i // LEDS_PER_BOX, "led_id": i % LEDS_PER_BOX + 1,
+            "parameter": "10K", "voltage": "", "footprint": "0402"}})
+        client.post('/api/delete', json={"component_name": key})
+
+    return measure(add_then_delete, [(i,) for i in range(ctx['write_requests'])])
+
+
+def _urlencode(part_number, parameter, footprint):
+    from urllib.parse import urlencode
+    return urlencode({k: v for k, v in (('part_number', part_number), ('parameter', parameter),
+                                         ('footprint', footprint)) if v})
+
+
+def run_size(size, args):
+    """在临时目录中生成数据、导入服务器模块并运行选中的基准"""
+    workdir = tempfile.mkdtemp(prefix=f'bench{size}_')
+    try:
+        db = generate_library(size, seed=args.seed)
+        queries = generate_queries(db, args.queries, seed=args.seed + 1)
+        with open(os.path.join(workdir, 'components.json'), 'w', encoding='utf-8') as f:
+            json.dump(db, f, ensure_ascii=False)
+        with open(os.path.join(workdir, 'InteractiveBOM.html'), 'w', encoding='utf-8') as f:
+            f.write(generate_bom_html(queries[:500], args.bom_bytes))
+        os.chdir(workdir)
+        sys.path.insert(0, WEBUI_DIR)
+
+        result = {"size": size, "benchmarks": {}}
+        with quiet():
+            t0 = time.perf_counter()
+            import bom_app
+            import DanymicBomServer as server
+            app = bom_app.create_app()
+            result["server_load_seconds"] = time.perf_counter() - t0
+            ctx = {"server": server, "app": app, "db": db, "queries": queries,
+                   "page_requests": args.page_requests, "write_requests": args.write_requests}
+            for name in args.only or BENCHMARKS:
+                result["benchmarks"][name] = BENCHMARKS[name](ctx)
+        result["peak_rss_kb"] = peak_rss_kb()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- 主进程 ---
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=WEBUI_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(args):
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "queries": args.queries,
+            "seed": args.seed
+        },
+        "results": []
+    }
+    for size in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                   '--queries', str(args.queries), '--seed', str(args.seed),
+                   '--page-requests', str(args.page_requests), '--write-requests', str(args.write_requests),
+                   '--bom-bytes', str(args.bom_bytes)]
+        if args.only:
+            command += ['--only', *args.only]
+        print(f"  运行库规模 {size} ...", file=sys.stderr)
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            report["results"].append({"size": size, "error": completed.stderr.strip()[-2000:]})
+            continue
+        report["results"].append(json.loads(completed.stdout))
+    return report
+
+
+def compare(base_path, head_path):
+    """打印两个结果文件的 p50 / p99 / 吞吐量 对比"""
+    with open(base_path, encoding='utf-8') as f:
+        base = {r['size']: r for r in json.load(f)['results']}
+    with open(head_path, encoding='utf-8') as f:
+        head = {r['size']: r for r in json.load(f)['results']}
+    print(f"{'size':>8} {'benchmark':<22} {'p50 base':>10} {'p50 head':>10} {'p99 base':>10} "
+          f"{'p99 head':>10} {'speedup':>8}")
+    for size in sorted(set(base) & set(head)):
+        for name in sorted(set(base[size].get('benchmarks', {})) & set(head[size].get('benchmarks', {}))):
+            b, h = base[size]['benchmarks'][name], head[size]['benchmarks'][name]
+            speedup = b['mean_ms'] / h['mean_ms'] if h['mean_ms'] else float('inf')
+            print(f"{size:>8} {name:<22} {b['p50_ms']:>10.3f} {h['p50_ms']:>10.3f} {b['p99_ms']:>10.3f} "
+                  f"{h['p99_ms']:>10.3f} {speedup:>7.2f}x")
+        print(f"{size:>8} {'peak_rss_kb':<22} {_format_kb(base[size].get('peak_rss_kb')):>10} "
+              f"{_format_kb(head[size].get('peak_rss_kb')):>10}")
+
+
+def _format_kb(value):
+    return '-' if value is None else str(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='WebUI 性能基准 (输出 JSON)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help=f'元件库规模 (默认 {DEFAULT_SIZES}，完整: {ALL_SIZES})')
+    parser.add_argument('--queries', type=int, default=2000, help='每个规模的查询条数')
+    parser.add_argument('--page-requests', type=int, default=50, help='GET / 的请求次数')
+    parser.add_argument('--write-requests', type=int, default=200, help='add+delete 的次数')
+    parser.add_argument('--bom-bytes', type=int, default=2_000_000, help='合成 BOM 页面的大小')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='只运行指定的基准')
+    parser.add_argument('--output', help='结果写入文件 (默认输出到 stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='对比两个结果文件')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        print(json.dumps(run_size(args.worker, args), ensure_ascii=False))
+    else:
+        report = run_all(args)
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            print(text)
@@ -0,0 +1,210 @@
+'''
+Description: components.json 的二进制快照 (components.json.snap)，让查询服务器冷启动时不必解析整个 JSON。
+    快照保存 compact_store.CompactComponents 的各列 (原始 array 字节) 和词表 / key 列表，
+    文件头记录来源文件 (components.json 及其日志) 的 (mtime_ns, size) 和内容的 SHA-1:
+      - (mtime_ns, size) 都一致 -> 直接使用快照
+      - 只有 mtime 变了 (例如复制 / touch) -> 重新计算 SHA-1，内容一致仍然使用
+      - 否则快照过期，由调用方从存储后端加载后重新生成
+
+    文件格式 (版本 2):
+        MAGIC (8 字节) | 头部长度 (uint32, 小端) | 头部 JSON | 按 8 字节对齐的各段数据
+    头部 JSON 中 sections 给出每段相对数据区起点的 [偏移, 长度, 类型码]；类型码 'json' 为元数据段，
+    其余为 array 的类型码 (本机字节序，头部记录 byteorder 和 itemsize，不一致时视为过期)。
+
+    use_mmap=True 时各列直接是 mmap 上的只读 memoryview，多个服务器进程共享同一份页面；
+    快照总是写入临时文件再原子 rename，已经映射的旧文件不受影响。
+
+    用法:
+        python binary_snapshot.py              # 为 components.json 生成 / 更新快照
+        python binary_snapshot.py --check      # 只检查快照是否是最新的
+'''
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from compact_store import COLUMNS, CompactComponents
+
+# --- 配置 ---
+SNAPSHOT_SUFFIX = '.snap'
+MAGIC = b'BOMSNAP\n'
+FORMAT_VERSION = 2  # 2: 增加 versions 列
+ALIGNMENT = 8
+# --- ---
+
+_LENGTH = struct.Struct('<I')
+
+
+def snapshot_path_for(source_path):
+    return source_path + SNAPSHOT_SUFFIX
+
+
+def source_signature(sources):
+    """每个来源文件的 [mtime_ns, size]，不存在时为 None"""
+    signature = []
+    for path in sources:
+        try:
+            st = os.stat(path)
+            signature.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def source_hash(sources):
+    """全部来源文件内容的 SHA-1 (不存在的文件与空文件不同)"""
+    digest = hashlib.sha1()
+    for path in sources:
+        try:
+            with open(path, 'rb') as f:
+                digest.update(b'+')
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            digest.update(b'-')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_snapshot(path, components, sources, signature=None, sha1=None):
+    """
+    把 components 写成快照 (临时文件 + 原子 rename)。
+    signature / sha1: 加载 components 之前记录的来源文件状态；不给时现在计算。
+    """
+    keys, columns, vocabularies, layouts, extras = components.export_state()
+    meta = json.dumps({"keys": keys, "vocabularies": vocabularies, "layouts": layouts,
+                       "extras": {str(row): values for row, values in extras.items()}},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    blobs = [('meta', 'json', meta)] + [(name, typecode, columns[name]) for name, typecode in COLUMNS]
+    sections = {}
+    offset = 0
+    for name, typecode, blob in blobs:
+        offset = _align(offset)
+        length = len(blob) * (blob.itemsize if isinstance(blob, array) else 1)
+        sections[name] = [offset, length, typecode]
+        offset += length
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "itemsizes": {typecode: array(typecode).itemsize for _, typecode in COLUMNS},
+        "sources": signature if signature is not None else source_signature(sources),
+        "sha1": sha1 or source_hash(sources),
+        "rows": len(keys),
+        "components": len(components),
+        "sections": sections
+    }).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        data_start = _align(f.tell())
+        for name, _, blob in blobs:
+            f.write(b'\0' * (data_start + sections[name][0] - f.tell()))
+            f.write(blob.tobytes() if isinstance(blob, array) else blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_header(buffer):
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("不是二进制快照文件")
+    (length,) = _LENGTH.unpack_from(buffer, len(MAGIC))
+    start = len(MAGIC) + _LENGTH.size
+    header = json.loads(bytes(buffer[start:start + length]))
+    return header, _align(start + length)
+
+
+def is_current(header, sources):
+    """快照头部记录的来源文件状态是否与现在一致"""
+    if header.get('version') != FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+        return False
+    if any(array(typecode).itemsize != size for typecode, size in header.get('itemsizes', {}).items()):
+        return False
+    current = source_signature(sources)
+    if header['sources'] == current:
+        return True
+    # mtime 变了但大小相同: 比较内容
+    sizes = [entry and entry[1] for entry in header['sources']]
+    if sizes != [entry and entry[1] for entry in current]:
+        return False
+    return source_hash(sources) == header['sha1']
+
+
+def _close(buffer):
+    if isinstance(buffer, mmap.mmap):
+        try:
+            buffer.close()
+        except BufferError:
+            pass  # 还有 memoryview 引用它，随之一起回收
+
+
+def read_snapshot(path, sources, use_mmap=False):
+    """
+    读取快照，返回 CompactComponents；快照不存在、已过期或损坏时返回 None。
+    use_mmap=True: 各列映射为只读 memoryview (不复制)。
+    """
+    try:
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+    except (OSError, ValueError):
+        return None
+    try:
+        header, data_start = _read_header(buffer)
+        if not is_current(header, sources):
+            _close(buffer)
+            return None
+        view = memoryview(buffer)
+        columns = {}
+        meta = None
+        for name, (offset, length, typecode) in header['sections'].items():
+            start = data_start + offset
+            if start + length > len(buffer):
+                raise ValueError(f"快照被截断: {name}")
+            if typecode == 'json':
+                meta = json.loads(bytes(view[start:start + length]))
+            elif use_mmap:
+                columns[name] = view[start:start + length].cast(typecode)
+            else:
+                columns[name] = array(typecode)
+                columns[name].frombytes(view[start:start + length])
+        if meta is None or any(len(columns[name]) != header['rows'] for name, _ in COLUMNS):
+            raise ValueError("快照内容不完整")
+    except (ValueError, KeyError, TypeError, struct.error):
+        _close(buffer)
+        return None
+    return CompactComponents.from_state(
+        meta['keys'], columns, meta['vocabularies'], meta['layouts'],
+        {int(row): values for row, values in meta['extras'].items()},
+        buffer=buffer if use_mmap else None)
+
+
+if __name__ == '__main__':
+    from component_store import JSON_FILE, JournalStore, journal_path_for
+
+    parser = argparse.ArgumentParser(description='生成 / 检查 components.json 的二进制快照')
+    parser.add_argument('--source', default=JSON_FILE)
+    parser.add_argument('--check', action='store_true', help='只检查快照是否是最新的 (过期时退出码为 1)')
+    args = parser.parse_args()
+
+    sources = (args.source, journal_path_for(args.source))
+    snapshot_path = snapshot_path_for(args.source)
+    if args.check:
+        current = read_snapshot(snapshot_path, sources) is not None
+        print(f"{snapshot_path}: {'最新' if current else '不存在或已过期'}")
+        sys.exit(0 if current else 1)
+    # 存储后端加载时发现快照过期 (或不存在) 会重新生成
+    store = JournalStore(args.source, readonly=True)
+    store.reload()
+    print(f"{snapshot_path}: {len(store)} 条元件, {os.path.getsize(snapshot_path)} 字节")
@@ -0,0 +1,82 @@
+'''
+Description: 元件管理器 (InputDataset.manager) 和 BOM 查询服务器 (DanymicBomServer.lookup) 组成的应用。
+    两组路由共用进程内的一个元件库 (library.Library): 通过 /api/add 等写入的元件立即对 /lightup 可见，
+    索引和搜索缓存随写入增量更新，不需要重启查询服务器。
+      /, /bom      交互式 BOM (查询服务器)
+      /bom/<name>  BOM 目录 (BOM_DIR) 中的其他项目，/boms 列出全部项目及预解析覆盖率
+      /lookup.js, /bom/<name>/lookup.js  页面加载的预解析查找表 (元件库变化时只重新构建它)
+      /manager     元件管理器
+    通过 python InputDataset.py 启动时 / 重定向到 /manager (元件管理器原来的地址)，交互式 BOM 在 /bom。
+    监听地址由 BOM_HOST 设置，默认与原来的两个服务器相同:
+    python DanymicBomServer.py / bom_app.py 只监听本机 (127.0.0.1)，python InputDataset.py 监听 0.0.0.0 (局域网可访问)。
+    BOM_RECORD=<文件> 时记录 /lightup 和 /api/* 请求 (见 request_recorder)，用 replay.py 重放。
+    多 worker 的 WSGI 服务器 (每个 worker 一个进程) 下，各 worker 在处理请求前通过 library.sync()
+    读取其他 worker 写入存储后端的变化，例如:
+        COMPONENT_STORAGE=sqlite gunicorn -w 4 'bom_app:create_app()'
+
+    用法:
+        python bom_app.py
+        BOM_HOST=0.0.0.0 python bom_app.py
+'''
+import logging
+import os
+
+from flask import Flask, redirect, url_for
+
+import DanymicBomServer
+import InputDataset
+import request_recorder
+from library import shared_library
+
+# --- 配置 ---
+HOST = os.environ.get('BOM_HOST', '')  # 监听地址；不设置时由启动入口决定 (见 main)
+PORT = 5000
+# --- ---
+
+
+def create_app(load=True, home='bom'):
+    """
+    注册两组路由。load=True 时加载元件库 (倒排索引在后台建立)，并在后台预热 BOM 目录中的页面；
+    debug 模式下 werkzeug 重载器的父进程只负责监视文件、重启子进程，不需要加载。
+    home='manager' 时 / 重定向到元件管理器 (交互式 BOM 仍可通过 /bom 打开)。
+    """
+    app = Flask(__name__)
+    if home == 'manager':
+        # 先于蓝图注册，同一路径以先注册的规则为准
+        app.add_url_rule('/', 'home', lambda: redirect(url_for('manager.serve_index')))
+    app.register_blueprint(DanymicBomServer.lookup)
+    app.register_blueprint(InputDataset.manager)
+    if request_recorder.RECORD_PATH:
+        app.wsgi_app = request_recorder.RequestRecorder(app.wsgi_app, request_recorder.RECORD_PATH)
+    if load:
+        shared_library().load(defer_index=True)
+        if DanymicBomServer.BOM_WARM_INTERVAL > 0:
+            DanymicBomServer.start_bom_warmer()
+    return app
+
+
+def main(host='127.0.0.1', home='bom'):
+    """host: BOM_HOST 未设置时的监听地址；home: / 提供的页面 (见 create_app)"""
+    host = HOST or host
+    logging.basicConfig(level=DanymicBomServer.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    DanymicBomServer.print_banner()
+    print(f"🗂  元件管理器: http://127.0.0.1:{PORT}/manager (与查询服务器共用同一个元件库)")
+    if home == 'manager':
+        print(f"📄 交互式 BOM: http://127.0.0.1:{PORT}/bom (/ 重定向到元件管理器)")
+    if host != '127.0.0.1':
+        print(f"🌍 监听 {host}:{PORT}，局域网内的其他设备也可以访问")
+    reloader_child = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    app = create_app(load=reloader_child, home=home)
+    # debug 模式下 werkzeug 的重载器会再启动一个子进程来处理请求，事件服务器只在子进程中启动
+    if DanymicBomServer.EVENTS_PORT and reloader_child:
+        try:
+            # 与应用使用同一个监听地址: 应用只对本机开放时，事件也不会发到局域网
+            server = DanymicBomServer.start_event_server(host=host)
+            DanymicBomServer.log.info("事件推送: http://%s:%d/events (页面通过 /events 重定向)", host, server.port)
+        except OSError as e:
+            DanymicBomServer.log.warning("事件推送未启动: %s", e)
+    app.run(debug=True, port=PORT, host=host)
+
+
+if __name__ == '__main__':
+    main()
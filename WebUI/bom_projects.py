@@ -0,0 +1,144 @@
+'''
+Description: 一个目录中的多个 InteractiveBOM 导出文件 (每块板子一个)，由 /bom/<name> 提供。
+    页面 (注入脚本后) 放在共用的、按总字节数限制的 PageCache 中，切换项目时直接返回缓存的字节；
+    预解析的 "行 -> 位置" 查找表由 /bom/<name>/lookup.js 提供，放在另一个按元件库 revision 失效的 PageCache 中。
+    元件库变化只让查找表过期，页面本身 (几 MB，gzip-9 + brotli) 只在 BOM 文件变化时重新构建。
+    后台线程定期调用 warm() 扫描目录: 新出现或被修改的 BOM 文件提前构建页面和查找表，
+    元件库变化后已缓存的查找表提前重新构建 (预热)，第一次打开时不必等待预解析和压缩。
+    每个 BOM 最近一次构建查找表时的预解析统计 (行数 / 已定位 / 未找到) 另外保存，被淘汰后 /boms 仍能显示。
+
+    用法:
+        projects = BomProjects('boms', page_cache, lookup_cache)
+        page = projects.page('main_board')     # boms/main_board.html
+        table = projects.lookup('main_board')  # 查找表脚本
+        projects.summary()                     # /boms
+        projects.warm()                        # 由后台线程定期调用
+'''
+import logging
+import os
+import threading
+import time
+
+from page_cache import file_signature
+
+log = logging.getLogger('bom_projects')
+
+BOM_SUFFIX = '.html'
+
+
+class BomProjects:
+    def __init__(self, directory, cache, lookup_cache):
+        self.directory = directory
+        self.cache = cache
+        self.lookup_cache = lookup_cache
+        self.warmed = 0
+        self._stats = {}   # path -> (查找表签名, 预解析统计)
+        self._seen = {}    # path -> 文件签名 (预热线程上次看到的)
+        self._lock = threading.Lock()
+
+    # --- 目录 ---
+    def names(self):
+        """目录中的 BOM 名称 (文件名去掉 .html)，按名称排序；目录不存在时为空"""
+        try:
+            entries = os.scandir(self.directory)
+        except OSError:
+            return []
+        with entries:
+            return sorted(entry.name[:-len(BOM_SUFFIX)] for entry in entries
+                          if entry.name.endswith(BOM_SUFFIX) and not entry.name.startswith('.')
+                          and entry.is_file())
+
+    def path(self, name):
+        """BOM 名称 -> 文件路径；名称不合法 (含路径分隔符等) 或文件不存在时返回 None"""
+        if name.endswith(BOM_SUFFIX):
+            name = name[:-len(BOM_SUFFIX)]
+        if not name or name.startswith('.') or os.path.basename(name) != name or '\\' in name:
+            return None
+        path = os.path.join(self.directory, name + BOM_SUFFIX)
+        return path if os.path.isfile(path) else None
+
+    # --- 页面 ---
+    def page(self, name):
+        """最新的 CachedPage；没有这个 BOM 时返回 None"""
+        return self._get(self.cache, name)
+
+    def lookup(self, name):
+        """最新的查找表脚本 (CachedPage)；没有这个 BOM 时返回 None"""
+        table = self._get(self.lookup_cache, name)
+        if table is not None:
+            self._remember(self.path(name), table)
+        return table
+
+    def _get(self, cache, name):
+        path = self.path(name)
+        if path is None:
+            return None
+        try:
+            return cache.get(path)
+        except FileNotFoundError:
+            return None
+
+    def _remember(self, path, page):
+        if page.info is not None:
+            with self._lock:
+                self._stats[path] = (page.signature, page.info)
+
+    def summary(self):
+        """每个 BOM 的文件信息、缓存状态和预解析覆盖率 (已定位的行 / 有内容的行)"""
+        result = []
+        for name in self.names():
+            path = os.path.join(self.directory, name + BOM_SUFFIX)
+            signature = self.cache.signature(path)
+            lookup_signature = self.lookup_cache.signature(path)
+            if signature is None:
+                continue
+            page = self.cache.peek(path)
+            with self._lock:
+                known = self._stats.get(path)
+            entry = {
+                "name": name,
+                "url": f"/bom/{name}",
+                "bytes": os.path.getsize(path),
+                "modified": os.path.getmtime(path),
+                "cached": page is not None,
+                "fresh": page is not None and page.signature == signature,
+            }
+            if known is not None:
+                stats = known[1]
+                lines = stats['resolved'] + stats['not_found']
+                entry.update(stats)
+                entry["coverage"] = round(stats['resolved'] / lines, 4) if lines else None
+                entry["stats_fresh"] = known[0] == lookup_signature
+            result.append(entry)
+        return result
+
+    # --- 后台预热 ---
+    def warm(self):
+        """
+        构建新出现 / 被修改的 BOM (页面和查找表)，以及已缓存但已过期 (元件库变化) 的查找表；
+        返回构建的 BOM 个数
+        """
+        built = 0
+        for name in self.names():
+            path = os.path.join(self.directory, name + BOM_SUFFIX)
+            signature = file_signature(path)
+            if signature is None:
+                continue
+            table = self.lookup_cache.peek(path)
+            changed = self._seen.get(path) != signature
+            stale = table is not None and table.signature != self.lookup_cache.signature(path)
+            if not changed and not stale:
+                continue
+            start = time.perf_counter()
+            try:
+                if changed:
+                    self.cache.get(path)
+                self._remember(path, self.lookup_cache.get(path))
+            except Exception as e:  # 单个 BOM 文件损坏不影响其他 BOM
+                log.warning("预热 BOM %s 失败: %s", name, e)
+            else:
+                built += 1
+                log.info("BOM %s 已预热 (%.2f 秒)", name, time.perf_counter() - start)
+            self._seen[path] = signature
+        self.warmed += built
+        return built
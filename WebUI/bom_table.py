@@ -0,0 +1,235 @@
+'''
+Description: 页面构建时预先解析 InteractiveBOM 的全部行，生成 "行 -> 位置" 查找表嵌入页面。
+    网页点击时先查这张表，命中就直接通过 Web Serial 点灯，不再请求 /lightup。
+
+    行取自页面内嵌的 BOM 数据: 立创 EDA 导出的 InteractiveBOM 不含静态表格，表格由页面脚本根据内嵌数据生成，
+    每行是一个带 dataId / dataEle / value / package 的对象 (脚本读取 dataId[1], dataEle[1], value, package[1])。
+    数据可以是直接写在脚本中的 JSON、JSON.parse("...") 的字符串，或 LZString.decompressFromBase64("...") 压缩后的字符串。
+    找不到内嵌数据时退回到静态表格 (<tr><td>编号</td><td>型号</td><td>值</td><td>封装</td>...)。
+    查找表的 key 与网页脚本从 console.log 消息中提取的 (型号, 参数, 封装) 完全一致 (见 row_key)，
+    提取不到或查不到的行由网页回退到 /lightup。
+'''
+import html
+import json
+import re
+from collections import namedtuple
+
+BomRow = namedtuple('BomRow', 'designator part_number parameter footprint')
+
+_ROW_RE = re.compile(r'<tr\b[^>]*>(.*?)</tr\s*>', re.IGNORECASE | re.DOTALL)
+_CELL_RE = re.compile(r'<td\b[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+# 与注入脚本中的正则相同: 器件型号[::\s]*([^,]+) / 值[::\s]*([^\s,，;；\)]+) / 封装[::\s]*([^,]+)
+_PARAMETER_RE = re.compile(r'[:：\s]*([^\s,，;；)]+)')
+KEY_SEPARATOR = '|'
+
+# 导出页面中输出器件信息的 console.log 代码块 (中文在页面脚本中是 \uXXXX 转义)，
+# build_bom_page 把它替换成同时输出封装的版本
+CONSOLE_LOG_BLOCK = r"Se=H.dataId[1],X=H.dataEle[1],ze=H.value;console.log(`\u5668\u4EF6\u7F16\u53F7:${Se}, \u5668\u4EF6\u578B\u53F7:${X}, \u503C:${ze}`)"
+CONSOLE_LOG_PATCHED = r"Se=H.dataId[1],X=H.dataEle[1],ze=H.value,Oe=H.package[1];console.log(`\u5668\u4EF6\u7F16\u53F7:${Se}, \u5668\u4EF6\u578B\u53F7:${X}, \u503C:${ze}, \u5C01\u88C5:${Oe}`)"
+
+# 内嵌 BOM 数据
+_ROW_FIELD = '"dataEle"'
+_JSON_PARSE_RE = re.compile(r'JSON\.parse\(\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')\s*\)', re.DOTALL)
+_SINGLE_QUOTED_RE = re.compile(r'\\(.)|"')
+_LZ_BASE64_RE = re.compile(r'LZString\.decompressFromBase64\(\s*["\']([A-Za-z0-9+/=\s]+)["\']\s*\)')
+_LZ_ALPHABET = {c: i for i, c in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=')}
+_MAX_OBJECT_TRIES = 16
+
+
+def _cell_text(cell):
+    return html.unescape(_TAG_RE.sub('', cell)).strip()
+
+
+def extract_rows(html_content):
+    """页面内嵌的 BOM 行；没有内嵌数据时取 BOM 表格中至少有 4 列 (编号, 型号, 值, 封装) 的行"""
+    rows = extract_embedded_rows(html_content)
+    if rows:
+        return rows
+    for row in _ROW_RE.finditer(html_content):
+        cells = [_cell_text(cell) for cell in _CELL_RE.findall(row.group(1))]
+        if len(cells) >= 4:
+            rows.append(BomRow(*cells[:4]))
+    return rows
+
+
+# --- 内嵌 BOM 数据 ---
+def extract_embedded_rows(html_content):
+    """页面脚本使用的内嵌 BOM 行 (按出现顺序，重复的行只保留一次)"""
+    rows = []
+    seen = set()
+    for text in _embedded_texts(html_content):
+        for item in _row_objects(text):
+            row = BomRow(_field(item.get('dataId'), 1), _field(item.get('dataEle'), 1),
+                         _field(item.get('value'), None), _field(item.get('package'), 1))
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+    return rows
+
+
+def _field(value, index):
+    """脚本中的 H.dataId[1] / H.value: 数组取第 index 项，其他值直接转成文本"""
+    if index is not None and isinstance(value, list):
+        value = value[index] if len(value) > index else None
+    if value is None or isinstance(value, (dict, list)):
+        return ''
+    return str(value).strip()
+
+
+def _embedded_texts(html_content):
+    """可能包含 BOM 数据的文本: 页面本身、JSON.parse 的字符串参数、LZString 解压后的字符串"""
+    yield html_content
+    if 'JSON.parse' in html_content:
+        for match in _JSON_PARSE_RE.finditer(html_content):
+            text = _js_string(match.group(1))
+            if text and _ROW_FIELD in text:
+                yield text
+    if 'LZString' in html_content:
+        for match in _LZ_BASE64_RE.finditer(html_content):
+            text = lz_decompress_base64(re.sub(r'\s+', '', match.group(1)))
+            if text and _ROW_FIELD in text:
+                yield text
+
+
+def _js_string(literal):
+    """JS 字符串字面量 -> 文本 (单引号字符串先转成 JSON 的双引号形式)；解析失败返回 None"""
+    if literal[0] == "'":
+        literal = '"' + _SINGLE_QUOTED_RE.sub(_requote, literal[1:-1]) + '"'
+    try:
+        return json.loads(literal)
+    except ValueError:
+        return None
+
+
+def _requote(match):
+    if match.group(0) == '"':
+        return '\\"'
+    return "'" if match.group(1) == "'" else match.group(0)
+
+
+def _row_objects(text):
+    """
+    text 中所有带 "dataEle" 键的 JSON 对象。
+    从每个 "dataEle" 往前找最近的 '{' 尝试解析，解析出的对象要包含这个键 (否则继续往前找外层的 '{')。
+    """
+    if _ROW_FIELD not in text:
+        return
+    decoder = json.JSONDecoder()
+    covered = -1
+    position = text.find(_ROW_FIELD)
+    while position != -1:
+        if position > covered:
+            start = position
+            for _ in range(_MAX_OBJECT_TRIES):
+                start = text.rfind('{', 0, start)
+                if start == -1:
+                    break
+                try:
+                    item, end = decoder.raw_decode(text, start)
+                except ValueError:
+                    continue
+                if end > position and isinstance(item, dict) and 'dataEle' in item:
+                    covered = end
+                    yield item
+                    break
+        position = text.find(_ROW_FIELD, position + 1)
+
+
+def lz_decompress_base64(data):
+    """LZString.decompressFromBase64 的 Python 实现；数据不完整时返回 None"""
+    if not data:
+        return ''
+    length = len(data)
+
+    def value_at(index):
+        return _LZ_ALPHABET.get(data[index], 0) if index < length else 0
+
+    state = {'value': value_at(0), 'position': 32, 'index': 1}
+
+    def read_bits(count):
+        bits = 0
+        for shift in range(count):
+            bit = state['value'] & state['position']
+            state['position'] >>= 1
+            if state['position'] == 0:
+                state['position'] = 32
+                state['value'] = value_at(state['index'])
+                state['index'] += 1
+            if bit:
+                bits |= 1 << shift
+        return bits
+
+    dictionary = {}
+    dict_size = 4
+    num_bits = 3
+    enlarge_in = 4
+    code = read_bits(2)
+    if code == 2:
+        return ''
+    if code > 2:
+        return None
+    w = chr(read_bits(8 if code == 0 else 16))
+    dictionary[3] = w
+    result = [w]
+    while True:
+        if state['index'] > length:
+            return None
+        code = read_bits(num_bits)
+        if code in (0, 1):
+            dictionary[dict_size] = chr(read_bits(8 if code == 0 else 16))
+            code = dict_size
+            dict_size += 1
+            enlarge_in -= 1
+        elif code == 2:
+            return ''.join(result)
+        if enlarge_in == 0:
+            enlarge_in = 1 << num_bits
+            num_bits += 1
+        if code in dictionary:
+            entry = dictionary[code]
+        elif code == dict_size:
+            entry = w + w[0]
+        else:
+            return None
+        result.append(entry)
+        dictionary[dict_size] = w + entry[0]
+        dict_size += 1
+        enlarge_in -= 1
+        w = entry
+        if enlarge_in == 0:
+            enlarge_in = 1 << num_bits
+            num_bits += 1
+
+
+def row_key(part_number, parameter, footprint):
+    """
+    网页脚本从 console.log 消息中提取的 (型号, 参数, 封装)，拼成查找表的 key。
+    型号 / 封装取到第一个逗号为止，参数取第一个不含空白和标点的片段。
+    """
+    part_number = part_number.split(',')[0].strip()
+    match = _PARAMETER_RE.match(parameter)
+    parameter = match.group(1) if match else ''
+    footprint = footprint.split(',')[0].strip()
+    return part_number, parameter, footprint
+
+
+def build_lookup_table(rows, resolve):
+    """
+    rows: [BomRow]；resolve(part_number, parameter, footprint) -> (matched_pn, data, score, reasons)
+    返回 (table, stats)。table: {"型号|参数|封装": [box_id, led_id, score, matched_pn]}，
+    score 为 None 表示型号精确匹配。相同的 key 只解析一次。
+    """
+    table = {}
+    misses = set()
+    for row in rows:
+        key = row_key(row.part_number, row.parameter, row.footprint)
+        text = KEY_SEPARATOR.join(key)
+        if text in table or text in misses or not any(key):
+            continue
+        matched_pn, data, score, _ = resolve(*key)
+        if data is None or data.get('box_id') is None or data.get('led_id') is None:
+            misses.add(text)
+            continue
+        table[text] = [data['box_id'], data['led_id'], score, matched_pn]
+    return table, {"rows": len(rows), "resolved": len(table), "not_found": len(misses)}
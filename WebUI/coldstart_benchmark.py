@@ -0,0 +1,125 @@
+'''
+Description: 查询服务器的冷启动时间: 从启动 Python 进程到第一次 /lightup 返回结果。
+    对每个库规模，在临时目录中生成 components.json，分别以三种方式启动 (每次一个新进程):
+      - json:     BOM_SNAPSHOT=off，解析 components.json
+      - snapshot: 读取二进制快照 (components.json.snap，事先生成)
+      - mmap:     同上，各列以内存映射方式读取
+    记录:
+      - import_ms:        导入 bom_app 并创建应用 (元件表加载完成，精确匹配可用)
+      - first_exact_ms:   从进程启动到第一次精确匹配的 /lightup 返回
+      - first_fuzzy_ms:   从进程启动到第一次模糊匹配的 /lightup 返回 (需要等后台建好倒排索引)
+      - rss_kb / file_kb: 第一次模糊匹配之后的 RSS，以及其中以文件为后备的页面 (/proc/self/smaps_rollup，
+                          mmap 方式下快照中的各列在这里，可以被多个进程共享)
+    输出 JSON。
+
+    用法:
+        python coldstart_benchmark.py --sizes 10000 100000 --repeat 3
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import WEBUI_DIR, current_rss_kb, generate_library, generate_queries
+
+MODES = {'json': 'off', 'snapshot': 'on', 'mmap': 'mmap'}
+
+
+def file_backed_kb():
+    """RSS 中以文件为后备的页面 (RSS - 匿名页, kB)，不支持时为 None"""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.endswith('kB\n')}
+        return fields['Rss'] - fields['Anonymous']
+    except (OSError, ValueError, IndexError, KeyError):
+        return None
+
+
+def worker(started, exact, fuzzy):
+    """在子进程中运行: started 为父进程启动本进程的时间 (time.time())"""
+    from urllib.parse import urlencode
+
+    t0 = time.time()
+    import bom_app
+    client = bom_app.create_app().test_client()
+    imported = time.time()
+    response = client.get('/lightup?' + urlencode({'part_number': exact}))
+    assert response.status_code == 200, response.status_code
+    first_exact = time.time()
+    response = client.get('/lightup?' + urlencode(dict(zip(('part_number', 'parameter', 'footprint'), fuzzy))))
+    assert response.status_code in (200, 404), response.status_code
+    first_fuzzy = time.time()
+    return {
+        "import_ms": (imported - t0) * 1e3,
+        "first_exact_ms": (first_exact - started) * 1e3,
+        "first_fuzzy_ms": (first_fuzzy - started) * 1e3,
+        "rss_kb": current_rss_kb(),
+        "file_kb": file_backed_kb()
+    }
+
+
+def run_size(size, repeat, seed):
+    workdir = tempfile.mkdtemp(prefix=f'coldstart{size}_')
+    try:
+        db = generate_library(size, seed=seed)
+        exact = next(iter(db))
+        fuzzy = next(query for query in generate_queries(db, 100, seed + 1) if query[0] not in db and query[1])
+        with open(os.path.join(workdir, 'components.json'), 'w', encoding='utf-8') as f:
+            json.dump(db, f, ensure_ascii=False, indent=4)
+        del db
+        subprocess.run([sys.executable, os.path.join(WEBUI_DIR, 'binary_snapshot.py')],
+                       cwd=workdir, check=True, capture_output=True)
+
+        result = {"size": size, "snapshot_bytes": os.path.getsize(os.path.join(workdir, 'components.json.snap')),
+                  "json_bytes": os.path.getsize(os.path.join(workdir, 'components.json')), "modes": {}}
+        for mode, setting in MODES.items():
+            runs = []
+            for _ in range(repeat):
+                env = dict(os.environ, BOM_SNAPSHOT=setting, BOM_EVENTS_PORT='0', BOM_LOG_LEVEL='WARNING',
+                           PYTHONPATH=WEBUI_DIR)
+                started = time.time()
+                completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(started),
+                                            json.dumps([exact, fuzzy])],
+                                           cwd=workdir, env=env, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    runs.append({"error": completed.stderr.strip()[-2000:]})
+                    break
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            ok = [run for run in runs if 'error' not in run]
+            result["modes"][mode] = {
+                # 多次运行取中位数 (第一次运行时文件可能还不在页缓存中)
+                name: sorted(run[name] for run in ok)[len(ok) // 2] if ok and ok[0][name] is not None else None
+                for name in ('import_ms', 'first_exact_ms', 'first_fuzzy_ms', 'rss_kb', 'file_kb')
+            } if ok else runs[-1]
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='查询服务器冷启动时间 (json / 二进制快照 / mmap)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式启动的次数 (取中位数)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    parser.add_argument('--worker', nargs=2, metavar=('STARTED', 'QUERIES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        exact, fuzzy = json.loads(args.worker[1])
+        print(json.dumps(worker(float(args.worker[0]), exact, fuzzy)))
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        print(f"  {size} 条 ...", file=sys.stderr)
+        results.append(run_size(size, args.repeat, args.seed))
+    text = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
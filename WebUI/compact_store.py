@@ -0,0 +1,261 @@
+'''
+Description: 查询服务器用的紧凑元件表 (列式存储 + 字符串驻留)。
+    components.json 加载后是 "字典的字典"，每个元件一个 dict，'0402'、'10K'、'' 这样的值
+    在每个条目里都是独立的字符串对象，百万级元件库要占用几百 MB。
+
+    CompactComponents 把每个字段存成一列:
+        box_id / led_id / version -> array('i')
+        parameter / voltage / footprint -> 词表编码 array('I')，词表中每个不同的字符串只存一次，
+                                并预先算好大写形式和数值解析结果 (Term)
+    不在标准字段里的值 (note 等) 放在按行号索引的 extras 中。
+    对外表现为 MutableMapping: components[key] 返回与原来相同的 details 字典 (按需生成)，
+    components[key] = details / del components[key] 增删元件。
+
+    export_state / from_state 供 binary_snapshot 保存和恢复；恢复时各列可以直接是 mmap 上的
+    只读 memoryview (多个进程共享同一份页面)，第一次写入时才复制成 array。
+'''
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+from value_parser import parse_value
+
+INT_FIELDS = ('box_id', 'led_id', 'version')
+TEXT_FIELDS = ('parameter', 'voltage', 'footprint')
+MISSING = -(2 ** 31)     # 整数列中表示 None (超出 int32 范围的值放在 extras 中)
+NONE_CODE = 0            # 词表编码 0 表示 None
+# 列名 -> array 类型码
+COLUMNS = (('box_ids', 'i'), ('led_ids', 'i'), ('versions', 'i'), ('param_codes', 'I'), ('voltage_codes', 'I'),
+           ('footprint_codes', 'I'), ('layout_codes', 'H'))
+
+
+class Term:
+    """词表中的一个字符串: 原文、大写形式、数值解析结果 (只对参数词表计算)"""
+    __slots__ = ('text', 'upper', 'value')
+
+    def __init__(self, text, value=None):
+        self.text = text
+        self.upper = text.upper()
+        self.value = value
+
+
+class Vocabulary:
+    """字符串 <-> 整数编码。terms[0] 为 None"""
+
+    def __init__(self, parse=None):
+        self.terms = [None]
+        self._codes = {}
+        self._parse = parse
+
+    def code(self, text):
+        if text is None:
+            return NONE_CODE
+        code = self._codes.get(text)
+        if code is None:
+            text = sys.intern(text)
+            code = self._codes[text] = len(self.terms)
+            self.terms.append(Term(text, self._parse(text) if self._parse and text else None))
+        return code
+
+    def __len__(self):
+        return len(self.terms) - 1
+
+    @classmethod
+    def from_texts(cls, texts, parse=None):
+        """按编码顺序恢复词表 (texts 不含编码 0 的 None)"""
+        vocabulary = cls(parse)
+        for text in texts:
+            vocabulary.code(text)
+        return vocabulary
+
+
+class CompactComponents(MutableMapping):
+    """
+    用法:
+        components = CompactComponents(store.iter_items())
+        components['C29DF']            # -> {'box_id': 1, 'led_id': 5, 'parameter': '10K', ...}
+        row = components.row_of('C29DF')
+        components.parameters.terms[components.param_codes[row]].upper   # -> '10K'
+    行号按写入顺序递增，迭代顺序即行号顺序。删除留下空行，重新加载时才会消失；
+    覆盖已有元件时同样写入新的一行再切换 key -> 行号 (旧行成为空行，元件移到最后，与删除后重新添加相同)。
+    查询线程不持锁读取: 新行的各列先写完，最后才发布 key -> 行号，读者看不到写了一半的行；
+    旧行在覆盖 / 删除后保持不变 (包括 extras)，正在读取旧行的线程仍然得到完整的旧值。
+    """
+
+    def __init__(self, items=()):
+        self._rows = {}
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.parameters = Vocabulary(parse=parse_value)
+        self.voltages = Vocabulary()
+        self.footprints = Vocabulary()
+        # 字段顺序 / 是否存在 (与原字典完全一致)，通常整个库只有一两种
+        self._layouts = {}
+        self._layout_fields = []
+        self.extras = {}       # 行号 -> {字段: 值}，非标准字段 或 无法按列存储的值
+        self._buffer = None    # 列所在的 mmap (from_state)，需要和列一起保持打开
+        self._bind_columns()
+        for key, details in items:
+            self.add(key, details)
+
+    def _bind_columns(self):
+        self._ints = {'box_id': self.box_ids, 'led_id': self.led_ids, 'version': self.versions}
+        self._terms = {'parameter': self.parameters, 'voltage': self.voltages, 'footprint': self.footprints}
+        self._codes = {'parameter': self.param_codes, 'voltage': self.voltage_codes,
+                       'footprint': self.footprint_codes}
+
+    # --- 保存 / 恢复 (binary_snapshot) ---
+    def export_state(self):
+        """
+        返回 (keys, columns, vocabularies, layouts, extras):
+            keys: 按行号排列的元件 key (已删除的行为 None)；columns: {列名: array}
+            vocabularies: {'parameters' / 'voltages' / 'footprints': 按编码排列的字符串}
+        """
+        keys = self._keys_by_row()
+        columns = {name: getattr(self, name) for name, _ in COLUMNS}
+        vocabularies = {name: [term.text for term in getattr(self, name).terms[1:]]
+                        for name in ('parameters', 'voltages', 'footprints')}
+        # 空行 (已删除 / 已被覆盖) 的 extras 不再需要
+        extras = {row: values for row, values in list(self.extras.items()) if row < len(keys) and keys[row] is not None}
+        return keys, columns, vocabularies, [list(fields) for fields in self._layout_fields], extras
+
+    @classmethod
+    def from_state(cls, keys, columns, vocabularies, layouts, extras, buffer=None):
+        """
+        export_state 的逆操作。columns 中的列可以是 array 或 (只读) memoryview，
+        buffer 为 memoryview 所在的 mmap。
+        """
+        components = cls()
+        components._rows = {key: row for row, key in enumerate(keys) if key is not None}
+        for name, _ in COLUMNS:
+            setattr(components, name, columns[name])
+        components.parameters = Vocabulary.from_texts(vocabularies['parameters'], parse=parse_value)
+        components.voltages = Vocabulary.from_texts(vocabularies['voltages'])
+        components.footprints = Vocabulary.from_texts(vocabularies['footprints'])
+        components._layout_fields = [tuple(fields) for fields in layouts]
+        components._layouts = {fields: code for code, fields in enumerate(components._layout_fields)}
+        components.extras = extras
+        components._buffer = buffer
+        components._bind_columns()
+        return components
+
+    def copy(self):
+        """独立的副本 (列复制，mmap 上的只读列和词表中的字符串共享)"""
+        keys, columns, vocabularies, layouts, extras = self.export_state()
+        columns = {name: column[:] if isinstance(column, array) else column for name, column in columns.items()}
+        return CompactComponents.from_state(keys, columns, vocabularies, layouts,
+                                            {row: dict(values) for row, values in extras.items()},
+                                            buffer=self._buffer)
+
+    def _thaw(self):
+        """mmap 上的只读列在第一次写入时复制成 array"""
+        for name, typecode in COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, array):
+                copy = array(typecode)
+                copy.frombytes(column.cast('B'))
+                setattr(self, name, copy)
+        self._buffer = None
+        self._bind_columns()
+
+    # --- 写入 ---
+    def add(self, key, details):
+        """新增或覆盖一个元件，返回 (新的) 行号"""
+        if self._buffer is not None:
+            self._thaw()
+        extras = {}
+        values = {}
+        for name, value in details.items():
+            if name in INT_FIELDS and (value is None or type(value) is int and MISSING < value < 2 ** 31):
+                values[name] = MISSING if value is None else value
+            elif name in TEXT_FIELDS and (value is None or type(value) is str):
+                values[name] = value
+            else:
+                extras[name] = value
+        fields = tuple(details)
+        layout = self._layouts.get(fields)
+        if layout is None:
+            layout = self._layouts[fields] = len(self._layout_fields)
+            self._layout_fields.append(fields)
+        columns = (
+            (self.box_ids, values.get('box_id', MISSING)),
+            (self.led_ids, values.get('led_id', MISSING)),
+            (self.versions, values.get('version', MISSING)),
+            (self.param_codes, self.parameters.code(values.get('parameter'))),
+            (self.voltage_codes, self.voltages.code(values.get('voltage'))),
+            (self.footprint_codes, self.footprints.code(values.get('footprint'))),
+            (self.layout_codes, layout),
+        )
+        row = len(self.layout_codes)
+        # 先把各列 (以及 extras) 都写完，最后才发布 key -> 行号
+        for column, value in columns:
+            column.append(value)
+        if extras:
+            self.extras[row] = extras
+        self._rows[key] = row
+        return row
+
+    def remove(self, key):
+        """删除一个元件，返回是否存在 (旧行的内容保持不变，见类的说明)"""
+        return self._rows.pop(key, None) is not None
+
+    # --- 读取 ---
+    def row_of(self, key):
+        """元件的行号；不存在时返回 None"""
+        return self._rows.get(key)
+
+    def details(self, row):
+        """按行号生成与原来相同的 details 字典"""
+        extras = self.extras.get(row)
+        result = {}
+        for name in self._layout_fields[self.layout_codes[row]]:
+            if extras is not None and name in extras:
+                result[name] = extras[name]
+            elif name in self._ints:
+                value = self._ints[name][row]
+                result[name] = None if value == MISSING else value
+            else:
+                term = self._terms[name].terms[self._codes[name][row]]
+                result[name] = None if term is None else term.text
+        return result
+
+    def parameter_term(self, row):
+        return self.parameters.terms[self.param_codes[row]]
+
+    def footprint_term(self, row):
+        return self.footprints.terms[self.footprint_codes[row]]
+
+    def __getitem__(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            raise KeyError(key)
+        return self.details(row)
+
+    def __setitem__(self, key, details):
+        self.add(key, details)
+
+    def __delitem__(self, key):
+        if not self.remove(key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def _keys_by_row(self):
+        """按行号排列的 key (空行为 None)"""
+        items = list(self._rows.items())
+        # 先取 key -> 行号 再取行数: 已发布的行一定都在列中
+        keys = [None] * len(self.layout_codes)
+        for key, row in items:
+            keys[row] = key
+        return keys
+
+    def __iter__(self):
+        return (key for key in self._keys_by_row() if key is not None)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self):
+        """逐个产出 (key, 行号)，按行号顺序"""
+        return ((key, row) for row, key in enumerate(self._keys_by_row()) if key is not None)
@@ -0,0 +1,564 @@
+'''
+Description: 元件库倒排索引。
+    在数据库加载时一次性建立 "归一化参数 -> 元件key"、"归一化封装 -> 元件key"
+    以及子串(n-gram)索引，使 search_component 的模糊搜索只对候选集打分，
+    而不是每次点击都全量扫描 components_db。
+    数值参数 (10K, 4K7, 100nF ...) 额外按数值建立有序索引 (value_parser.ValueIndex)。
+    元件 key 和型号类参数另有容错索引 (typo_index.TypoIndex)，手输型号错一两个字符也能找到。
+    元件本身存放在列式的 compact_store.CompactComponents 中，打分按词表编码缓存。
+'''
+import heapq
+
+from compact_store import CompactComponents
+from typo_index import TypoIndex
+from value_parser import ValueIndex, parse_value, values_equal
+
+# n-gram 的最大长度。值的所有 1..GRAM_SIZE 长度子串都会被索引，
+# 这样 "查询串 in 库中值" 可以通过一次倒排表查询 + 校验完成。
+GRAM_SIZE = 3
+
+# 模糊匹配阈值 (与原 search_component 保持一致: score > 19)
+SCORE_THRESHOLD = 19
+
+# --- 容错匹配 (型号拼写错误) ---
+TYPO_MIN_LENGTH = 4     # 短于此长度的型号不做容错匹配
+TYPO_MAX_DISTANCE = 2   # 编辑距离预算上限 (型号 4..9 个字符允许 1 处错误，10 个以上允许 2 处)
+TYPO_MAX_CANDIDATES = 8
+# 单独计分的信号 (按编辑距离)，单独都不超过阈值，必须有参数/封装佐证才会点灯：
+#   型号 vs 元件 key:   key 是很短的随机编号，错一个字符 (D2A2B / D2A2A) 就是另一个盒子，
+#                       距离 1 加上参数或封装的部分匹配即可，距离 2 需要完全匹配
+#   型号 vs 型号类参数: 一个字符之差常常就是另一个器件 (AMS1117 / AMS1118)，必须有封装等佐证
+TYPO_KEY_SCORES = {1: 15, 2: 12}
+TYPO_MODEL_SCORES = {1: 10, 2: 5}
+
+
+def typo_budget(length):
+    """型号长度 -> 允许的编辑距离"""
+    if length < TYPO_MIN_LENGTH:
+        return 0
+    return min(1 if length < 10 else 2, TYPO_MAX_DISTANCE)
+
+
+def _is_model_like(parameter):
+    """型号类参数: 不是数值 (10K / 100nF 这类由数值索引处理)"""
+    return len(parameter) >= TYPO_MIN_LENGTH and parse_value(parameter) is None
+
+
+def normalize_footprint(footprint):
+    """封装归一化 (R0402 -> 0402)，保留 SOT-23-5 这样的长封装名称"""
+    if not footprint:
+        return None
+    fp_upper = footprint.upper()
+    if (len(fp_upper) == 5 and
+            fp_upper[0] in ('R', 'C') and
+            fp_upper[1:].isdigit()):
+        return fp_upper[1:]
+    return fp_upper
+
+
+def normalize_parameter(parameter):
+    """参数归一化 (kΩ -> K, Ω -> R, MΩ -> M)，保持原始大小写"""
+    if not parameter:
+        return None
+    normalized_param = parameter
+
+    # 规则1: 替换 Kilo-Ohms (kΩ/KΩ/kΩ/KΩ) 为 K
+    normalized_param = normalized_param.replace('kΩ', 'K')
+    normalized_param = normalized_param.replace('KΩ', 'K')
+    normalized_param = normalized_param.replace('kΩ', 'K')
+    normalized_param = normalized_param.replace('KΩ', 'K')
+
+    # 规则2: 替换 Ohms (Ω/Ω) 为 R
+    normalized_param = normalized_param.replace('Ω', 'R')
+    normalized_param = normalized_param.replace('Ω', 'R')
+
+    # (可选) 规则3: 替换 Mega-Ohms (MΩ/MΩ) 为 M
+    normalized_param = normalized_param.replace('MΩ', 'M')
+    normalized_param = normalized_param.replace('mΩ', 'M')  # 兼容小写 m
+    normalized_param = normalized_param.replace('MΩ', 'M')
+    normalized_param = normalized_param.replace('mΩ', 'M')
+
+    return normalized_param
+
+
+def normalize_query(part_number, parameter=None, footprint=None):
+    """
+    把一次查询归一化为 (大写型号, 大写归一化参数, 归一化封装, 参数数值)。
+    参数数值由原始参数解析 (区分 mΩ 和 MΩ)，不是数值参数时为 None。
+    相同的归一化结果一定得到相同的搜索结果，可用于去重/缓存。
+    """
+    normalized_parameter = normalize_parameter(parameter)
+    return (part_number.upper() if part_number else None,
+            normalized_parameter.upper() if normalized_parameter else None,
+            normalize_footprint(footprint),
+            parse_value(parameter) if parameter else None)
+
+
+def score_parameter(db_parameter, db_parameter_upper, input_parameter_upper, part_number_upper,
+                    input_value=None, db_value=None):
+    """参数相关的得分 (规则 3a、3b)，返回 (score, reasons)。db_parameter 为空时得 0 分"""
+    score = 0
+    reasons = []
+    if not db_parameter:
+        return score, reasons
+
+    # --- 3a. 参数匹配 (传入的 'parameter' vs 数据库的 'parameter') ---
+    if input_parameter_upper:
+        if input_parameter_upper == db_parameter_upper:
+            score += 10
+            reasons.append(f"参数完全匹配({db_parameter})")
+        elif input_value is not None and db_value is not None:
+            if values_equal(input_value, db_value):
+                score += 10
+                reasons.append(f"参数数值匹配({db_parameter})")
+        elif input_parameter_upper in db_parameter_upper or db_parameter_upper in input_parameter_upper:
+            score += 5
+            reasons.append(f"参数部分匹配({db_parameter})")
+
+    # --- 3b. 型号-参数 交叉匹配 (传入的 'part_number' vs 数据库的 'parameter') ---
+    if part_number_upper:
+        if db_parameter_upper == part_number_upper:
+            # 例如: 传入 'SPX3819', 数据库 'SPX3819'
+            score += 20
+            reasons.append(f"型号-参数完全匹配({db_parameter})")
+        elif db_parameter_upper in part_number_upper:
+            # 例如: 传入 'SPX3819M5-3.3', 数据库 'SPX3819'
+            score += 20
+            reasons.append(f"型号-参数包含匹配({db_parameter})")
+        elif part_number_upper in db_parameter_upper:
+            # 例如: 传入 'SPX3819', 数据库 'SPX3819-L'
+            score += 5
+            reasons.append(f"参数-型号包含匹配({db_parameter})")
+    return score, reasons
+
+
+def score_footprint(db_footprint, db_footprint_upper, normalized_input_footprint):
+    """封装的得分 (规则 4，使用归一化后的封装)，返回 (score, reasons)"""
+    if not normalized_input_footprint or not db_footprint:
+        return 0, []
+    if normalized_input_footprint == db_footprint_upper:
+        return 10, [f"封装完全匹配({db_footprint})"]
+    if normalized_input_footprint in db_footprint_upper or db_footprint_upper in normalized_input_footprint:
+        return 5, [f"封装部分匹配({db_footprint})"]
+    return 0, []
+
+
+def score_component(data, input_parameter_upper, part_number_upper, normalized_input_footprint,
+                    input_value=None, db_value=None):
+    """
+    对单个元件打分，返回 (score, reasons)。
+    input_value / db_value 为两边参数的解析结果 (value_parser.parse_value)。
+    两边都是数值时按数值比较: '4K7' == '4.7K' == '4700' 得 10 分，而 '10K' 不再部分匹配 '100K'；
+    其余规则与原 search_component 中的循环体一致。
+    """
+    db_parameter = data.get('parameter')
+    db_footprint = data.get('footprint')
+    parameter_score, parameter_reasons = score_parameter(
+        db_parameter, db_parameter.upper() if db_parameter else None,
+        input_parameter_upper, part_number_upper, input_value, db_value)
+    footprint_score, footprint_reasons = score_footprint(
+        db_footprint, db_footprint.upper() if db_footprint else None, normalized_input_footprint)
+    return parameter_score + footprint_score, parameter_reasons + footprint_reasons
+
+
+class _ValueIndex:
+    """
+    单个字段 (参数 或 封装) 的倒排索引:
+      value_keys: 大写值 -> 元件key集合
+      grams:      长度 1..GRAM_SIZE 的子串 -> 包含它的大写值集合
+      lengths:    当前出现过的值长度 -> 计数 (用于枚举查询串的子串)
+    """
+
+    def __init__(self):
+        self.value_keys = {}
+        self.grams = {}
+        self.lengths = {}
+
+    def add(self, value, key):
+        keys = self.value_keys.get(value)
+        if keys is None:
+            self.value_keys[value] = keys = set()
+            self.lengths[len(value)] = self.lengths.get(len(value), 0) + 1
+            for gram in _grams(value):
+                self.grams.setdefault(gram, set()).add(value)
+        keys.add(key)
+
+    def remove(self, value, key):
+        keys = self.value_keys.get(value)
+        if keys is None:
+            return
+        keys.discard(key)
+        if keys:
+            return
+        del self.value_keys[value]
+        count = self.lengths[len(value)] - 1
+        if count:
+            self.lengths[len(value)] = count
+        else:
+            del self.lengths[len(value)]
+        for gram in _grams(value):
+            holders = self.grams.get(gram)
+            if holders is not None:
+                holders.discard(value)
+                if not holders:
+                    del self.grams[gram]
+
+    def values_within(self, query):
+        """库中值是 query 的子串 (含相等) 的所有值"""
+        found = set()
+        value_keys = self.value_keys
+        n = len(query)
+        for length in self.lengths:
+            if length > n:
+                continue
+            for start in range(n - length + 1):
+                sub = query[start:start + length]
+                if sub in value_keys:
+                    found.add(sub)
+        return found
+
+    def values_containing(self, query):
+        """包含 query 的所有库中值 (含相等)"""
+        if len(query) <= GRAM_SIZE:
+            return set(self.grams.get(query, ()))
+        # 选倒排表最短的 n-gram，再逐个校验
+        best = None
+        for start in range(len(query) - GRAM_SIZE + 1):
+            holders = self.grams.get(query[start:start + GRAM_SIZE])
+            if not holders:
+                return set()
+            if best is None or len(holders) < len(best):
+                best = holders
+        return {value for value in best if query in value}
+
+    def related_keys(self, query):
+        """与 query 完全匹配或互相包含的所有元件key"""
+        keys = set()
+        for value in self.values_within(query) | self.values_containing(query):
+            keys |= self.value_keys[value]
+        return keys
+
+    def keys_within(self, query):
+        """库中值是 query 子串的所有元件key"""
+        keys = set()
+        for value in self.values_within(query):
+            keys |= self.value_keys[value]
+        return keys
+
+
+def _memoized(memo, key, func, arg):
+    result = memo.get(key)
+    if result is None:
+        result = memo[key] = func(arg)
+    return result
+
+
+def _reasons(parameter_reasons, footprint_reasons, signal):
+    reasons = parameter_reasons + footprint_reasons
+    if signal is not None:
+        reasons.append(signal[1])
+    return reasons
+
+
+def _select_top(scored, limit=None, bound=None):
+    """
+    从按数据库顺序产生的 (score, row, ...) 中选出前 limit 个 (分数降序，同分按数据库顺序)，
+    与全量稳定排序的结果相同。堆顶是已选出的最差一个，新元素分数更高时才替换它。
+    bound: 可能的最高分；堆满且堆顶已达到 bound 时提前结束。
+    返回 (已打分的匹配数, 前 limit 个, 是否扫描完全部候选)。
+    """
+    if limit is None:
+        items = list(scored)
+        items.sort(key=lambda item: item[0], reverse=True)
+        return len(items), items, True
+    if limit <= 0:
+        return 0, [], True
+    heap = []
+    count = 0
+    for item in scored:
+        count += 1
+        # 后产生的元件行号更大，同分时排在已选出的后面，所以只比较分数
+        if len(heap) < limit:
+            heapq.heappush(heap, (item[0], -item[1], item))
+        elif item[0] > heap[0][0]:
+            heapq.heapreplace(heap, (item[0], -item[1], item))
+        else:
+            continue
+        if bound is not None and len(heap) == limit and heap[0][0] >= bound:
+            return count, [entry[2] for entry in sorted(heap, reverse=True)], False
+    return count, [entry[2] for entry in sorted(heap, reverse=True)], True
+
+
+def _grams(value):
+    n = len(value)
+    seen = set()
+    for length in range(1, GRAM_SIZE + 1):
+        for start in range(n - length + 1):
+            seen.add(value[start:start + length])
+    return seen
+
+
+class ComponentIndex:
+    """
+    components_db 的倒排索引。
+
+    search_component 的得分 > 19 只可能来自两类元件:
+      1. 数据库参数 是 型号 的子串 (型号-参数 匹配, 20 分)
+      2. 参数 与 封装 都至少部分匹配 (10+10, 10+5+5, 5+5+10 ...)
+    因此候选集 = 第1类 ∪ (参数相关 ∩ 封装相关)，只对候选集打分即可得到与全量扫描相同的结果。
+    容错信号 (typo_signals) 命中的元件另外加入候选集。
+
+    self.db 是 CompactComponents (行号即数据库中的原始顺序)；参数 / 封装的得分只取决于词表中的字符串，
+    一次查询内按词表编码缓存，同一个 '10K' 或 '0402' 只打一次分。
+    """
+
+    def __init__(self, db=None):
+        self.db = CompactComponents()
+        # 每次数据库内容变化 +1，派生缓存 (搜索结果等) 据此作废
+        self.revision = 0
+        self._parameters = _ValueIndex()
+        self._footprints = _ValueIndex()
+        self.values = ValueIndex()
+        self._typo_keys = TypoIndex()
+        self._typo_models = TypoIndex()
+        if db:
+            self.rebuild(db)
+
+    def rebuild(self, db):
+        """根据新的数据库 (字典 或 CompactComponents) 重建索引"""
+        self.db = db if isinstance(db, CompactComponents) else CompactComponents(db.items())
+        self.revision += 1
+        self._parameters = _ValueIndex()
+        self._footprints = _ValueIndex()
+        self.values = ValueIndex()
+        self._typo_keys = TypoIndex()
+        self._typo_models = TypoIndex()
+        values = []
+        for key, row in self.db.rows():
+            self._typo_keys.add(key.upper(), key)
+            self._index(key, row, values)
+        self.values.load(values)
+
+    def _index(self, key, row, values=None):
+        """values: 重建时收集数值索引条目，最后一次性排序 (ValueIndex.load)"""
+        parameter = self.db.parameter_term(row)
+        footprint = self.db.footprint_term(row)
+        if parameter is not None and parameter.text:
+            self._parameters.add(parameter.upper, key)
+            # 数值在加载时按词表解析一次
+            if parameter.value is not None:
+                entry = (key, parameter.value, normalize_footprint(footprint.text if footprint is not None else None),
+                         row)
+                if values is not None:
+                    values.append(entry)
+                else:
+                    self.values.add(*entry)
+            elif _is_model_like(parameter.text):
+                self._typo_models.add(parameter.upper, key)
+        if footprint is not None and footprint.text:
+            self._footprints.add(footprint.upper, key)
+
+    def _unindex(self, key, row):
+        parameter = self.db.parameter_term(row)
+        footprint = self.db.footprint_term(row)
+        if parameter is not None and parameter.text:
+            self._parameters.remove(parameter.upper, key)
+            self._typo_models.remove(parameter.upper, key)
+            if parameter.value is not None:
+                self.values.remove(key)
+        if footprint is not None and footprint.text:
+            self._footprints.remove(footprint.upper, key)
+
+    def add(self, key, data):
+        """新增或覆盖一个元件 (同时更新 self.db)"""
+        row = self.db.row_of(key)
+        if row is not None:
+            self._unindex(key, row)
+        else:
+            self._typo_keys.add(key.upper(), key)
+        row = self.db.add(key, data)
+        self._index(key, row)
+        self.revision += 1
+
+    def remove(self, key):
+        """删除一个元件 (同时更新 self.db)"""
+        row = self.db.row_of(key)
+        if row is None:
+            return
+        self._unindex(key, row)
+        self._typo_keys.remove(key.upper(), key)
+        self.db.remove(key)
+        self.revision += 1
+
+    def __len__(self):
+        return len(self.db)
+
+    def parsed_value(self, key):
+        """元件参数的解析结果 (加载时计算)，不是数值参数时为 None"""
+        row = self.db.row_of(key)
+        term = self.db.parameter_term(row) if row is not None else None
+        return term.value if term is not None else None
+
+    def candidates(self, part_number_upper, input_parameter_upper, normalized_input_footprint,
+                   input_value=None, memo=None):
+        """
+        返回可能超过阈值的元件key，按数据库中的原始顺序排列。
+        memo: 可选的字典，批量查询时在多条查询之间复用倒排表查询结果。
+        """
+        if memo is None:
+            memo = {}
+        keys = set()
+        if part_number_upper:
+            keys |= _memoized(memo, ('pn', part_number_upper),
+                              self._parameters.keys_within, part_number_upper)
+        if input_parameter_upper and normalized_input_footprint:
+            param_keys = _memoized(memo, ('param', input_parameter_upper),
+                                   self._parameters.related_keys, input_parameter_upper)
+            if input_value is not None:
+                # 数值相等的元件 (4K7 vs 4.7K) 字符串上不一定相关
+                param_keys = param_keys | set(_memoized(memo, ('value', input_value),
+                                                        self.values.exact, input_value))
+            if param_keys:
+                fp_keys = _memoized(memo, ('fp', normalized_input_footprint),
+                                    self._footprints.related_keys, normalized_input_footprint)
+                if len(fp_keys) < len(param_keys):
+                    param_keys, fp_keys = fp_keys, param_keys
+                keys |= {key for key in param_keys if key in fp_keys}
+        return sorted(keys, key=self.db.row_of)
+
+    def typo_signals(self, part_number_upper, memo=None):
+        """
+        型号的容错匹配信号 {元件key: (分数, 原因)}。
+        与型号-参数包含匹配 (score_component 规则 3b) 重叠的参数不再重复计分。
+        """
+        if not part_number_upper:
+            return {}
+        budget = typo_budget(len(part_number_upper))
+        if not budget:
+            return {}
+        if memo is not None and ('typo', part_number_upper) in memo:
+            return memo[('typo', part_number_upper)]
+        signals = {}
+        for text, distance in self._typo_keys.search(part_number_upper, budget, TYPO_MAX_CANDIDATES):
+            for key in self._typo_keys.keys(text):
+                signals[key] = (TYPO_KEY_SCORES[distance], f"型号近似匹配({key}, 编辑距离{distance})")
+        for text, distance in self._typo_models.search(part_number_upper, budget, TYPO_MAX_CANDIDATES):
+            if text in part_number_upper or part_number_upper in text:
+                continue
+            score = TYPO_MODEL_SCORES[distance]
+            for key in self._typo_models.keys(text):
+                if key not in signals or signals[key][0] < score:
+                    parameter = self.db.parameter_term(self.db.row_of(key)).text
+                    signals[key] = (score, f"型号-参数近似匹配({parameter}, 编辑距离{distance})")
+        if memo is not None:
+            memo[('typo', part_number_upper)] = signals
+        return signals
+
+    def fuzzy_matches(self, part_number, parameter=None, footprint=None, memo=None):
+        """
+        模糊搜索，返回按分数降序排列的匹配列表
+        (分数相同按数据库顺序，与原全量扫描 + 稳定排序一致)。
+        """
+        return self.fuzzy_matches_normalized(*normalize_query(part_number, parameter, footprint), memo=memo)
+
+    def fuzzy_matches_normalized(self, part_number_upper, input_parameter_upper,
+                                 normalized_input_footprint, input_value=None, memo=None):
+        """同 fuzzy_matches，但输入已经过 normalize_query 归一化"""
+        return self.fuzzy_top(part_number_upper, input_parameter_upper, normalized_input_footprint,
+                              input_value, memo=memo)[1]
+
+    def fuzzy_top(self, part_number_upper, input_parameter_upper, normalized_input_footprint,
+                  input_value=None, limit=None, memo=None):
+        """
+        返回 (匹配总数, 前 limit 个匹配)。前 limit 个用大小为 limit 的堆选出 (O(n log k))，
+        只为返回的匹配生成 details 字典，大量元件同分时 (例如 10K 0402) 不必全部排序、全部生成。
+        """
+        scored = self._scored(part_number_upper, input_parameter_upper, normalized_input_footprint,
+                              input_value, memo)
+        count, top, _ = _select_top(scored, limit)
+        db = self.db
+        matches = []
+        for score, row, pn, parameter_reasons, footprint_reasons, signal in top:
+            matches.append({
+                'part_number': pn,
+                'data': db.details(row),
+                'score': score,
+                'reasons': _reasons(parameter_reasons, footprint_reasons, signal)
+            })
+        return count, matches
+
+    def search_top(self, part_number_upper, input_parameter_upper, normalized_input_footprint,
+                   input_value=None, k=10, memo=None):
+        """
+        前 k 个匹配 (顺序与 fuzzy_top 相同)，返回 (matches, complete)。
+        按数据库顺序打分，堆中已有 k 个达到本次查询最高可能得分 (max_score) 的匹配时提前结束:
+        之后的元件最多同分，而同分按数据库顺序排在后面。提前结束时 complete 为 False。
+        matches 只含 part_number / score / reasons，details 由调用方按需读取。
+        """
+        if memo is None:
+            memo = {}
+        scored = self._scored(part_number_upper, input_parameter_upper, normalized_input_footprint,
+                              input_value, memo)
+        bound = self.max_score(part_number_upper, input_parameter_upper, normalized_input_footprint, memo)
+        _, top, complete = _select_top(scored, k, bound)
+        return [{'part_number': pn, 'score': score, 'reasons': _reasons(parameter_reasons, footprint_reasons, signal)}
+                for score, row, pn, parameter_reasons, footprint_reasons, signal in top], complete
+
+    def max_score(self, part_number_upper, input_parameter_upper, normalized_input_footprint, memo=None):
+        """
+        本次查询任何元件可能得到的最高分 (各项规则上限之和):
+          参数匹配 10；型号-参数 20 (库中有参数是型号的子串时) 或 5 (库中有参数包含型号时)；
+          封装匹配 10；容错信号取最大的一个。
+        """
+        if memo is None:
+            memo = {}
+        bound = 10 if input_parameter_upper else 0
+        if part_number_upper:
+            if _memoized(memo, ('pn', part_number_upper), self._parameters.keys_within, part_number_upper):
+                bound += 20
+            elif self._parameters.values_containing(part_number_upper):
+                bound += 5
+        if normalized_input_footprint:
+            bound += 10
+        typo = self.typo_signals(part_number_upper, memo)
+        if typo:
+            bound += max(score for score, _ in typo.values())
+        return bound
+
+    def _scored(self, part_number_upper, input_parameter_upper, normalized_input_footprint,
+                input_value=None, memo=None):
+        """按数据库顺序逐个产生超过阈值的 (score, row, key, 参数原因, 封装原因, 容错信号)"""
+        candidates = self.candidates(part_number_upper, input_parameter_upper,
+                                     normalized_input_footprint, input_value, memo)
+        typo = self.typo_signals(part_number_upper, memo)
+        db = self.db
+        if typo:
+            # 容错信号可能和参数/封装信号叠加，所以近似匹配的元件也要参与打分
+            candidates = sorted(set(candidates) | typo.keys(), key=db.row_of)
+
+        param_codes, param_terms = db.param_codes, db.parameters.terms
+        footprint_codes, footprint_terms = db.footprint_codes, db.footprints.terms
+        param_scores = {}
+        footprint_scores = {}
+        for pn in candidates:
+            row = db.row_of(pn)
+            code = param_codes[row]
+            parameter_score = param_scores.get(code)
+            if parameter_score is None:
+                term = param_terms[code]
+                parameter_score = param_scores[code] = (
+                    score_parameter(term.text, term.upper, input_parameter_upper, part_number_upper,
+                                    input_value, term.value) if term is not None else (0, []))
+            code = footprint_codes[row]
+            footprint_score = footprint_scores.get(code)
+            if footprint_score is None:
+                term = footprint_terms[code]
+                footprint_score = footprint_scores[code] = (
+                    score_footprint(term.text, term.upper, normalized_input_footprint)
+                    if term is not None else (0, []))
+            score = parameter_score[0] + footprint_score[0]
+            signal = typo.get(pn)
+            if signal is not None:
+                score += signal[0]
+            if score > SCORE_THRESHOLD:
+                yield score, row, pn, parameter_score[1], footprint_score[1], signal
@@ -0,0 +1,182 @@
+'''
+Description: 元件库批量导入 / 导出。
+    导入: CSV 或 JSON Lines，逐行流式解析；所有行先校验
+         (字段、key 重复、(box_id, led_id) 位置冲突)，全部通过后一次性原子提交。
+    导出: 逐条生成 CSV / JSON Lines / components.json 格式的文本块，不在内存中拼出完整结果。
+'''
+import csv
+import io
+import json
+
+LEDS_PER_BOX = 81  # 每个元件盒的灯数 (固件中的 NUM_LEDS)
+
+# CSV 列 (也是 JSON Lines 平铺格式的字段)
+CSV_FIELDS = ('key', 'box_id', 'led_id', 'parameter', 'voltage', 'footprint', 'note')
+DETAIL_FIELDS = CSV_FIELDS[1:]
+
+
+def detect_format(content_type, explicit=None):
+    """根据 ?format= 或 Content-Type 判断导入格式: 'csv' / 'jsonl'"""
+    if explicit:
+        return explicit.lower()
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json-lines' in content_type:
+        return 'jsonl'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    从二进制流中逐行读取，产出 (行号, 原始字典 或 None, 解析错误 或 None)。
+    CSV 第一行为表头；JSON Lines 的每行可以是
+      {"component_name"/"key": ..., "details": {...}} 或平铺的 {"key": ..., "box_id": ..., ...}
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, row, None
+    elif fmt == 'jsonl':
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"JSON 解析失败: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, "每行必须是 JSON 对象"
+                continue
+            yield row_number, row, None
+    else:
+        raise ValueError(f"不支持的导入格式: {fmt}")
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_row(row):
+    """把一行转换为 (key, details, 错误列表)"""
+    errors = []
+    if isinstance(row.get('details'), dict):
+        key = row.get('component_name') or row.get('key')
+        source = row['details']
+    else:
+        key = row.get('key') or row.get('component_name')
+        source = row
+    key = str(key).strip() if key is not None else ''
+    if not key:
+        errors.append("缺少元件名称 (key)")
+
+    details = {}
+    for field in DETAIL_FIELDS:
+        value = source.get(field)
+        if field in ('box_id', 'led_id'):
+            number = _to_int(value)
+            if number is None:
+                errors.append(f"{field} 必须是整数")
+            details[field] = number
+        elif field == 'note':
+            if value:
+                details[field] = str(value).strip()
+        else:
+            details[field] = '' if value is None else str(value).strip()
+
+    if details['box_id'] is not None and details['box_id'] < 1:
+        errors.append("box_id 必须 >= 1")
+    if details['led_id'] is not None and not 1 <= details['led_id'] <= LEDS_PER_BOX:
+        errors.append(f"led_id 必须在 1 到 {LEDS_PER_BOX} 之间")
+    if not details['parameter']:
+        errors.append("缺少参数 (parameter)")
+    return key, details, errors
+
+
+def validate_import(rows, existing, owner=None):
+    """
+    一次遍历完成校验。rows 为 iter_rows 的输出，existing 为当前元件库 {key: details}。
+    owner(box_id, led_id) -> 占用该位置的 key (例如 SlotIndex.owner)；不给时遍历 existing 得到。
+    返回 (可提交的 [(key, details)], 逐行报告, 是否全部有效)。
+    """
+    occupied = {}  # 本次导入中前面的行占用的位置
+    if owner is None:
+        for key, details in existing.items():
+            occupied[(details.get('box_id'), details.get('led_id'))] = key
+
+    accepted = []
+    report = []
+    seen_keys = {}
+    valid = True
+    for row_number, row, parse_error in rows:
+        if parse_error:
+            report.append({"row": row_number, "status": "error", "errors": [parse_error]})
+            valid = False
+            continue
+        key, details, errors = normalize_row(row)
+        if key:
+            if key in existing:
+                errors.append("该元件名称已存在")
+            elif key in seen_keys:
+                errors.append(f"元件名称与第 {seen_keys[key]} 行重复")
+        location = (details['box_id'], details['led_id'])
+        if None not in location:
+            holder = occupied.get(location)
+            if holder is None and owner is not None:
+                holder = owner(*location)
+            if holder is not None:
+                errors.append(f"位置 (Box {location[0]}, LED {location[1]}) 已被 {holder} 占用")
+
+        if errors:
+            valid = False
+            report.append({"row": row_number, "key": key, "status": "error", "errors": errors})
+            continue
+        seen_keys[key] = row_number
+        occupied[location] = key
+        accepted.append((key, details))
+        report.append({"row": row_number, "key": key, "status": "ok"})
+    return accepted, report, valid
+
+
+# --- 导出 ---
+def export_chunks(items, fmt):
+    """把 (key, details) 迭代器逐条序列化为文本块"""
+    if fmt == 'jsonl':
+        for key, details in items:
+            yield json.dumps({"key": key, "details": details}, ensure_ascii=False) + '\n'
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        for key, details in items:
+            writer.writerow([key] + [details.get(field, '') for field in DETAIL_FIELDS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == 'json':
+        # 与 components.json 相同的格式
+        first = True
+        yield '{'
+        for key, details in items:
+            body = json.dumps({key: details}, indent=4, ensure_ascii=False)[1:-1].rstrip()
+            yield ('\n' if first else ',\n') + body.lstrip('\n')
+            first = False
+        yield '\n}' if not first else '}'
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+EXPORT_MIMETYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
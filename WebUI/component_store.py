@@ -0,0 +1,566 @@
+'''
+Description: components.json 的追加式日志存储。
+    内存中保存完整的元件字典；每次添加/删除只向 components.json.journal 追加一行操作记录，
+    一个批次只 fsync 一次。日志累积到一定条数后压缩：把当前数据写入临时文件，
+    再原子地 rename 成 components.json，并清空日志。
+    启动时 = 读取快照 (components.json) + 重放日志；二进制快照 (binary_snapshot) 是最新的时直接读取它。
+    内存中的数据存放在列式的 compact_store.CompactComponents 中。
+    多个进程 (多 worker 部署) 共用同一组文件时，refresh() 只重放其他进程新追加的日志行；
+    写入批次、加载和压缩都持有 components.json.lock 上的文件锁 (FileLock)，
+    批次开始时先读入其他进程的写入，所以 "检查 + 写入" 在进程之间也是原子的。
+    每个元件带有版本号 details['version']，每次写入 +1 (供 If-Match 乐观并发控制)。
+    components.json 受 git 管理，压缩时不写出初始版本 (1)，读取时补上，第一次压缩不会改动每一个条目。
+
+    ComponentStore 是存储后端接口，JournalStore (JSON + 日志) 和
+    sqlite_store.SqliteStore (SQLite, WAL 模式) 都实现它，由 open_store() 按配置选择。
+'''
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from binary_snapshot import read_snapshot, snapshot_path_for, source_hash, source_signature, write_snapshot
+from compact_store import CompactComponents
+from component_io import export_chunks
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- 配置 ---
+# 存储后端: 'json' (components.json + 日志) 或 'sqlite' (components.db)
+STORAGE_BACKEND = os.environ.get('COMPONENT_STORAGE', 'json')
+JSON_FILE = 'components.json'
+SQLITE_FILE = 'components.db'
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+COMPACT_EVERY = 500  # 日志达到多少条操作后压缩进快照
+CHANGE_LOG_SIZE = 10000  # 为增量同步 (since=<revision>) 保留的最近变更条数
+# 二进制快照 (binary_snapshot, components.json.snap): 'on' 加载时优先读取快照，过期时重新生成；
+# 'mmap' 同上，并以内存映射方式读取 (多个进程共享页面)；'off' 总是解析 components.json
+SNAPSHOT_MODE = os.environ.get('BOM_SNAPSHOT', 'on')
+# --- ---
+
+
+def journal_path_for(snapshot_path):
+    return snapshot_path + JOURNAL_SUFFIX
+
+
+class FileLock:
+    """
+    跨进程的排他文件锁 (POSIX flock / Windows msvcrt.locking)，同一进程内可重入。
+    调用方负责进程内的线程互斥 (JournalStore 总是在自己的 RLock 内使用它)。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def acquire(self):
+        if self._depth == 0:
+            if self._file is None:
+                self._file = open(self.path, 'a+b')  # 保持打开，每次只加锁 / 解锁
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK 重试 10 秒后放弃，继续等待
+                        time.sleep(0.05)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        if self._file is not None and self._depth == 0:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+INITIAL_VERSION = 1
+
+
+def entry_version(details):
+    """元件的版本号；没有记录版本时为 0 (components.json 中省略的初始版本在读取时补上)"""
+    version = details.get('version') if isinstance(details, dict) else None
+    return version if type(version) is int else 0
+
+
+def versioned(details, previous):
+    """写入前的 details 副本，版本号 = 上一版本 + 1 (previous 为 None 时是新元件，版本 1)"""
+    details = {name: value for name, value in details.items() if name != 'version'}
+    details['version'] = entry_version(previous) + 1 if previous is not None else INITIAL_VERSION
+    return details
+
+
+def without_initial_version(items):
+    """写入 components.json 的 (key, details)：初始版本不写出，读取时由 _read_snapshot 补上"""
+    for key, details in items:
+        if details.get('version') == INITIAL_VERSION:
+            details = {name: value for name, value in details.items() if name != 'version'}
+        yield key, details
+
+
+def _read_snapshot(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError:
+        return {}  # 如果文件是空的或损坏的，返回空字典
+    for details in data.values():
+        if isinstance(details, dict) and 'version' not in details:
+            details['version'] = INITIAL_VERSION
+    return data
+
+
+def _replay_journal(path, data):
+    """
+    把日志中的操作应用到 data 上，返回 (成功应用的条数, 有效内容的字节长度)。
+    崩溃时最后一行可能只写了一半，遇到无法解析的行就停止。
+    """
+    applied = 0
+    valid_bytes = 0
+    if not os.path.exists(path):
+        return applied, valid_bytes
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            try:
+                op = json.loads(raw)
+            except ValueError:
+                break
+            _apply(data, op)
+            applied += 1
+            valid_bytes += len(raw)
+    return applied, valid_bytes
+
+
+def _apply(data, op):
+    # 两种操作都是幂等的：压缩过程中崩溃导致重复重放也不会出错
+    if op['op'] == 'add':
+        data[op['key']] = op['details']
+    elif op['op'] == 'delete':
+        data.pop(op['key'], None)
+    elif op['op'] == 'batch':
+        # 批量导入写成一行，整行要么完整重放，要么被当作写了一半的记录丢弃
+        for sub_op in op['ops']:
+            _apply(data, sub_op)
+
+
+def load_components_file(snapshot_path):
+    """只读加载：快照 + 日志，返回字典 (供 sqlite_store.import_json 使用)"""
+    data = _read_snapshot(snapshot_path)
+    _replay_journal(journal_path_for(snapshot_path), data)
+    return data
+
+
+def store_signature(snapshot_path):
+    """快照和日志两个文件的 (mtime_ns, size)，任意一个变化都说明数据变了"""
+    signature = []
+    for path in (snapshot_path, journal_path_for(snapshot_path)):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def parse_revision_token(token, epoch):
+    """解析 "<epoch>-<revision>"，epoch 不一致或格式错误时返回 None"""
+    token_epoch, _, revision = (token or '').strip('"').rpartition('-')
+    if str(token_epoch) != str(epoch) or not revision.isdigit():
+        return None
+    return int(revision)
+
+
+class ComponentStore:
+    """
+    存储后端接口。元件以 key -> details 字典的形式存取，
+    details 与 components.json 中的条目格式相同 (box_id, led_id, parameter, voltage, footprint, ...)。
+    """
+
+    def __contains__(self, key):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def all(self):
+        """全部元件 (Mapping {key: details})，按添加顺序排列。调用方不应修改返回的对象"""
+        raise NotImplementedError
+
+    def add(self, key, details):
+        """新增或覆盖元件，返回实际写入的 details (带新的版本号，见 versioned)"""
+        raise NotImplementedError
+
+    def add_many(self, items):
+        """
+        原子地添加多个元件 [(key, details), ...]：崩溃后要么全部存在，要么全部不存在。
+        返回实际写入的 [(key, details), ...]
+        """
+        raise NotImplementedError
+
+    def iter_items(self):
+        """逐条产出 (key, details)，用于流式导出"""
+        return iter(list(self.all().items()))
+
+    def compact_copy(self):
+        """全部元件的列式副本 (CompactComponents)，供 library.Library 建立查找索引"""
+        return CompactComponents(self.iter_items())
+
+    def delete(self, key):
+        """删除元件，返回是否存在"""
+        raise NotImplementedError
+
+    def batch(self):
+        """
+        上下文管理器：批次内的写入作为一个整体提交。
+        批次持有写锁 (包括其他进程)，批次内先检查再写入 (例如比较版本号) 不会与其他写入交错
+        """
+        raise NotImplementedError
+
+    def signature(self):
+        """数据的版本标识，任何写入 (包括其他进程的写入) 都会使它变化"""
+        raise NotImplementedError
+
+    def revision_token(self):
+        """
+        给客户端的版本号字符串 "<epoch>-<revision>"。
+        epoch 在数据可能被整体替换时 (例如重新加载) 改变，revision 每次写入 +1。
+        """
+        raise NotImplementedError
+
+    def changes_since(self, token):
+        """
+        token 之后变化过的元件 {key: 最新 details 或 None(已删除)}。
+        token 无效、来自其他 epoch 或变更记录已被淘汰时返回 None (客户端需全量刷新)。
+        """
+        raise NotImplementedError
+
+    def reload(self):
+        """重新从磁盘读取 (只对有内存副本的后端有意义)"""
+
+    def refresh(self):
+        """
+        读取其他进程的写入，使 changes_since 能返回它们 (只对有内存副本的后端有意义)。
+        无法增量读取时整体重新加载 (epoch 改变)。
+        """
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JournalStore(ComponentStore):
+    """
+    用法:
+        store = JournalStore('components.json')
+        store.add(key, details)          # 单条写入，立即 fsync
+        with store.batch():              # 批量写入，结束时只 fsync 一次
+            for key, details in rows:
+                store.add(key, details)
+
+    readonly=True 时不打开日志文件、不截断日志，只能读取，数据在第一次 reload() 时才读取。
+    """
+
+    def __init__(self, snapshot_path=JSON_FILE, compact_every=COMPACT_EVERY, readonly=False):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path_for(snapshot_path)
+        self.compact_every = compact_every
+        self.readonly = readonly
+        self.data = {}
+        self._journal = None
+        self._journal_ops = 0
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(snapshot_path + LOCK_SUFFIX)
+        self._revision = 0
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)  # (revision, key)
+        self._epoch = uuid.uuid4().hex[:8]
+        self._journal_offset = 0         # 日志中已经读入内存的字节数 (refresh 从这里继续)
+        self._pending_bytes = 0          # 本进程写入、尚未 fsync 的日志字节数
+        self._snapshot_signature = None  # 加载时 components.json 的 (mtime_ns, size)
+        if not readonly:
+            self.load()
+
+    # --- 读取 ---
+    @contextmanager
+    def _locked(self):
+        """进程内 + 跨进程互斥"""
+        with self._lock, self._file_lock:
+            yield
+
+    def load(self):
+        """读取快照并重放日志；日志末尾写了一半的记录会被截掉"""
+        with self._locked():
+            self._close_journal()
+            self._epoch = uuid.uuid4().hex[:8]
+            self._revision = 0
+            self._changes.clear()
+            self._snapshot_signature = store_signature(self.snapshot_path)[0]
+            sources = (self.snapshot_path, self.journal_path)
+            binary_path = snapshot_path_for(self.snapshot_path)
+            data = None
+            if SNAPSHOT_MODE != 'off':
+                data = read_snapshot(binary_path, sources, use_mmap=SNAPSHOT_MODE == 'mmap')
+            if data is not None:
+                # 二进制快照与日志的当前内容一致: 日志是完整的，不需要重放
+                try:
+                    with open(self.journal_path, 'rb') as f:
+                        journal = f.read()
+                except FileNotFoundError:
+                    journal = b''
+                self._journal_ops, valid_bytes = journal.count(b'\n'), len(journal)
+            else:
+                # 读取前记录来源状态: 读取期间文件被修改时，二进制快照会在下次加载时被判为过期
+                signature = source_signature(sources) if SNAPSHOT_MODE != 'off' else None
+                sha1 = source_hash(sources) if signature is not None else None
+                data = CompactComponents(_read_snapshot(self.snapshot_path).items())
+                self._journal_ops, valid_bytes = _replay_journal(self.journal_path, data)
+                if not self.readonly and os.path.exists(self.journal_path) and \
+                        os.path.getsize(self.journal_path) != valid_bytes:
+                    with open(self.journal_path, 'r+b') as f:
+                        f.truncate(valid_bytes)
+                    signature = None  # 日志被截断过，记录的来源状态已经不对了
+                if signature is not None:
+                    self._write_binary_snapshot(data, signature, sha1)
+            self.data = data
+            self._journal_offset = valid_bytes
+            self._pending_bytes = 0
+            if not self.readonly:
+                self._journal = open(self.journal_path, 'ab')
+
+    reload = load
+
+    def refresh(self):
+        """
+        components.json 没有变化、日志只是变长了 (其他进程追加了记录) 时，只重放新增的日志行，
+        并计入变更记录；否则 (其他进程压缩过日志) 整体重新加载。
+        """
+        with self._locked():
+            snapshot_signature, journal_signature = store_signature(self.snapshot_path)
+            journal_size = journal_signature[1] if journal_signature else 0
+            if snapshot_signature != self._snapshot_signature or journal_size < self._journal_offset:
+                self.load()
+                return
+            if journal_size == self._journal_offset:
+                return
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break
+                    try:
+                        op = json.loads(raw)
+                    except ValueError:
+                        break
+                    # 本进程自己写的记录也可能在其中 (与其他进程交错追加时)，操作幂等，重放无害
+                    _apply(self.data, op)
+                    self._record(op)
+                    self._journal_offset += len(raw)
+
+    def _write_binary_snapshot(self, data, signature=None, sha1=None):
+        try:
+            write_snapshot(snapshot_path_for(self.snapshot_path), data,
+                           (self.snapshot_path, self.journal_path), signature, sha1)
+        except OSError:
+            pass  # 二进制快照只是加速下次加载，写不了不影响使用
+
+    def compact_copy(self):
+        with self._lock:
+            return self.data.copy()
+
+    def iter_items(self):
+        with self._lock:
+            keys = list(self.data)
+        for key in keys:
+            details = self.data.get(key)
+            if details is not None:
+                yield key, details
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def all(self):
+        return self.data
+
+    def signature(self):
+        return store_signature(self.snapshot_path)
+
+    def revision_token(self):
+        return f"{self._epoch}-{self._revision}"
+
+    def changes_since(self, token):
+        with self._lock:
+            revision = parse_revision_token(token, self._epoch)
+            if revision is None or revision > self._revision:
+                return None
+            oldest = self._changes[0][0] if self._changes else self._revision + 1
+            if revision < oldest - 1:
+                return None
+            # 从最新的变更往回找，只看 token 之后的部分
+            changed = {}
+            for change_revision, key in reversed(self._changes):
+                if change_revision <= revision:
+                    break
+                if key not in changed:
+                    changed[key] = self.data.get(key)
+            return changed
+
+    # --- 写入 ---
+    @contextmanager
+    def batch(self):
+        """
+        批次内的所有操作只在结束时 flush + fsync 一次。
+        最外层批次持有文件锁，开始时先读入其他进程追加的记录，结束 (fsync) 后才释放。
+        """
+        with self._locked():
+            if self._batch_depth == 0 and self._journal is not None:
+                self.refresh()
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._sync()
+
+    def add(self, key, details):
+        with self.batch():
+            details = versioned(details, self.data.get(key))
+            self._append({"op": "add", "key": key, "details": details})
+            self.data[key] = details
+            return details
+
+    def add_many(self, items):
+        items = list(items)
+        if not items:
+            return []
+        with self.batch():
+            written = {}  # 同一批次中重复的 key 以最后一条为准，版本号连续
+            for key, details in items:
+                written[key] = versioned(details, written.get(key, self.data.get(key)))
+            items = list(written.items())
+            self._append({"op": "batch",
+                          "ops": [{"op": "add", "key": key, "details": details} for key, details in items]})
+            self.data.update(items)
+            return items
+
+    def delete(self, key):
+        """删除元件，返回是否存在"""
+        with self.batch():
+            if key not in self.data:
+                return False
+            self._append({"op": "delete", "key": key})
+            del self.data[key]
+            return True
+
+    def _append(self, op):
+        if self._journal is None:
+            raise RuntimeError("只读存储不能写入")
+        line = (json.dumps(op, ensure_ascii=False) + '\n').encode('utf-8')
+        self._journal.write(line)
+        self._journal_ops += 1
+        self._pending_bytes += len(line)
+        self._record(op)
+
+    def _record(self, op):
+        for sub_op in op['ops'] if op['op'] == 'batch' else (op,):
+            self._revision += 1
+            self._changes.append((self._revision, sub_op['key']))
+
+    def _sync(self):
+        if self._journal is None:
+            return
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        # 日志末尾正好是本进程刚写的内容时，其他进程没有插入记录，refresh 可以跳过这一段
+        if self._journal.tell() == self._journal_offset + self._pending_bytes:
+            self._journal_offset += self._pending_bytes
+        self._pending_bytes = 0
+        if self._journal_ops >= self.compact_every:
+            self.compact()
+
+    # --- 压缩 ---
+    def compact(self):
+        """把内存中的数据写成新快照 (临时文件 + 原子 rename)，然后清空日志并更新二进制快照"""
+        with self._locked():
+            self.refresh()  # 先读入其他进程追加的记录，避免被清空的日志丢掉它们
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                # 逐条写出，不在内存中生成整个 JSON 文本
+                for chunk in export_chunks(without_initial_version(self.data.items()), 'json'):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # 快照已落盘；此时崩溃只会导致日志被重复重放 (操作幂等)
+            self._journal.truncate(0)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal_ops = 0
+            self._journal_offset = 0
+            self._snapshot_signature = store_signature(self.snapshot_path)[0]
+            self._write_binary_snapshot(self.data)
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self):
+        with self._lock:
+            self._close_journal()
+            self._file_lock.close()
+
+
+def open_store(backend=None, readonly=False):
+    """按配置打开存储后端"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'json':
+        return JournalStore(JSON_FILE, readonly=readonly)
+    if backend == 'sqlite':
+        from sqlite_store import SqliteStore
+        return SqliteStore(SQLITE_FILE, readonly=readonly)
+    raise ValueError(f"未知的存储后端: {backend}")
@@ -0,0 +1,281 @@
+'''
+Description: 点灯 / 元件库变化事件的 Server-Sent Events 广播。
+    EventHub:    线程安全的发布端。每个事件只序列化一次 (SSE 文本字节)，
+                 每个订阅者一个有界队列 (deque(maxlen))，慢客户端只会丢掉自己最旧的事件，
+                 不会拖慢发布者，也不会无限占用内存。
+    EventServer: 单线程 asyncio SSE 服务器 (GET /events)。空闲的订阅者只是一个挂起的协程
+                 加一个 socket，不占用 Flask 的工作线程；几百个看板同时在线几乎没有开销。
+
+    用法:
+        hub = EventHub()
+        EventServer(hub, port=5001).start()
+        hub.publish('lightup', {...})
+    客户端断线重连时带上 Last-Event-ID，可以补发最近 HISTORY_SIZE 条内错过的事件。
+'''
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+# --- 配置 ---
+CLIENT_BACKLOG = 64     # 每个订阅者最多积压的事件数，超出后丢弃最旧的
+HISTORY_SIZE = 256      # 供 Last-Event-ID 补发的最近事件
+HEARTBEAT = 15.0        # 空闲时发送注释行的间隔 (秒)，防止代理 / 浏览器断开
+RETRY_MS = 3000         # 浏览器断线重连间隔
+MAX_REQUEST_BYTES = 8192
+# --- ---
+
+
+def format_event(event_id, event, data):
+    """一条 SSE 消息 (bytes)；data 为可 JSON 序列化的对象"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event}\ndata: {body}\n\n".encode('utf-8')
+
+
+class Subscriber:
+    """一个订阅者的有界事件队列"""
+
+    def __init__(self, backlog):
+        self.queue = deque(maxlen=backlog)
+        self.dropped = 0        # 因积压被丢弃的事件数 (累计)
+        self._lagged = 0        # 上次取走之后丢弃的事件数
+        self.wakeup = None      # 由 EventServer 设置 (asyncio.Event)
+
+    def push(self, message):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            self._lagged += 1
+        self.queue.append(message)
+
+    def drain(self):
+        """取走全部积压的事件 (bytes)；有丢弃时先发一条 lagged 事件，客户端据此重新同步"""
+        parts = []
+        if self._lagged:
+            parts.append(f"event: lagged\ndata: {{\"dropped\":{self._lagged}}}\n\n".encode('ascii'))
+            self._lagged = 0
+        while self.queue:
+            parts.append(self.queue.popleft())
+        return b''.join(parts)
+
+
+class EventHub:
+    def __init__(self, backlog=CLIENT_BACKLOG, history=HISTORY_SIZE):
+        self.backlog = backlog
+        self._history = deque(maxlen=history)   # (id, message)
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._listeners = []                    # 每次发布后调用 (EventServer 用来唤醒事件循环)
+        self.published = 0
+
+    # --- 发布 ---
+    def publish(self, event, data):
+        """广播一个事件，返回事件 id。没有订阅者时只记入历史，开销只有一次 JSON 序列化"""
+        with self._lock:
+            event_id = next(self._ids)
+            message = format_event(event_id, event, data)
+            self._history.append((event_id, message))
+            for subscriber in self._subscribers:
+                subscriber.push(message)
+            self.published += 1
+            listeners = list(self._listeners) if self._subscribers else ()
+        for listener in listeners:
+            listener()
+        return event_id
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    # --- 订阅 ---
+    def subscribe(self, last_event_id=None):
+        """新订阅者；last_event_id 之后的历史事件先放入它的队列"""
+        subscriber = Subscriber(self.backlog)
+        with self._lock:
+            if last_event_id is not None:
+                for event_id, message in self._history:
+                    if event_id > last_event_id:
+                        subscriber.push(message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def drain(self, subscriber):
+        with self._lock:
+            return subscriber.drain()
+
+    def subscribers(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(subscriber.dropped for subscriber in self._subscribers)
+            }
+
+
+class EventServer:
+    """
+    在后台线程中运行的 asyncio SSE 服务器，只提供 GET /events。
+    浏览器通过 Flask 的 /events 重定向到这里 (不同端口，响应带 Access-Control-Allow-Origin)。
+    host 应与 Flask 应用的监听地址相同 (见 bom_app.main)，否则事件会被应用本身访问不到的设备收到。
+    """
+
+    def __init__(self, hub, host='127.0.0.1', port=5001, heartbeat=HEARTBEAT):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._writers = set()   # 当前的 SSE 连接
+        hub.add_listener(self._notify)
+
+    def start(self):
+        """启动后台线程；返回实际监听的端口 (port=0 时由系统分配)"""
+        self._thread = threading.Thread(target=self._run, name='sse-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise OSError(f"SSE 服务器无法监听 {self.host}:{self.port}")
+        return self.port
+
+    def stop(self):
+        """关闭监听和所有连接，结束后台线程"""
+        if self.loop is None or self._server is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _shutdown(self):
+        # 断开所有连接，让每个连接的协程自己正常结束 (不 cancel 任务)
+        self._server.close()
+        for writer in list(self._writers):
+            writer.transport.abort()
+        deadline = self.loop.time() + 2
+        while self._writers and self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=1024))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError:
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    # --- 唤醒 ---
+    def _notify(self):
+        # 发布者线程 -> 事件循环：每次发布只唤醒一次，而不是每个订阅者一次
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake_all)
+
+    def _wake_all(self):
+        for subscriber in self.hub.subscribers():
+            if subscriber.wakeup is not None and subscriber.queue:
+                subscriber.wakeup.set()
+
+    # --- 连接处理 ---
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        if len(head) > MAX_REQUEST_BYTES:
+            writer.close()
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        method, _, target = lines[0].partition(' ')
+        target = target.rsplit(' ', 1)[0]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        if method == 'OPTIONS':
+            writer.write(b"HTTP/1.1 204 No Content\r\nAccess-Control-Allow-Origin: *\r\n"
+                         b"Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n"
+                         b"Content-Length: 0\r\n\r\n")
+            await self._close(writer)
+            return
+        if method != 'GET' or url.path != '/events':
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await self._close(writer)
+            return
+
+        last_id = headers.get('last-event-id') or parse_qs(url.query).get('lastEventId', [None])[0]
+        try:
+            last_id = int(last_id) if last_id is not None else None
+        except ValueError:
+            last_id = None
+
+        subscriber = self.hub.subscribe(last_id)
+        subscriber.wakeup = asyncio.Event()
+        self._writers.add(writer)
+        # 客户端断开时 read() 返回 b''，由它结束等待
+        closed = asyncio.ensure_future(reader.read(1))
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                         b"Cache-Control: no-cache\r\n"
+                         b"Connection: keep-alive\r\n"
+                         b"X-Accel-Buffering: no\r\n"
+                         b"Access-Control-Allow-Origin: *\r\n\r\n" +
+                         f"retry: {RETRY_MS}\n\n".encode('ascii'))
+            await writer.drain()
+            while not closed.done():
+                if not subscriber.queue:
+                    waiter = asyncio.ensure_future(subscriber.wakeup.wait())
+                    await asyncio.wait((waiter, closed), timeout=self.heartbeat,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    subscriber.wakeup.clear()
+                    if closed.done():
+                        break
+                data = self.hub.drain(subscriber)
+                writer.write(data or b': ping\n\n')
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.hub.unsubscribe(subscriber)
+            closed.cancel()
+            await self._close(writer)
+            self._writers.discard(writer)
+
+    def write_buffer_sizes(self):
+        """每个连接在 asyncio 中尚未写入 socket 的字节数"""
+        return [writer.transport.get_write_buffer_size() for writer in list(self._writers)]
+
+    @property
+    def connections(self):
+        return len(self._writers)
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
@@ -0,0 +1,194 @@
+'''
+Description: /events (SSE) 的负载测试。
+    在本进程中启动 EventHub + EventServer，打开 N 个空闲订阅者 (原始 socket，用 selectors 读取)，测量:
+      - 连接前后的线程数 / 内存 (RSS)，以及每个订阅者的平均内存
+      - 空闲期间的 CPU 时间 (订阅者全部在线，没有事件)
+      - 广播延迟: 从 publish 到所有订阅者都收到该事件的时间 (p50 / p99)
+      - 慢客户端: 一个从不读取的订阅者，积压被限制在 CLIENT_BACKLOG 条以内
+    输出 JSON。
+
+    用法:
+        python events_loadtest.py --subscribers 200 500 1000
+    每个订阅者数量在独立的子进程中运行。
+'''
+import argparse
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmark import current_rss_kb, percentile
+from event_hub import CLIENT_BACKLOG, EventHub, EventServer
+
+
+def raise_fd_limit(needed):
+    """提高打开文件数的软限制 (Windows 没有这个限制，直接跳过)"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def connect(port, count, read=True):
+    """打开 count 个订阅者，等待响应头；返回 socket 列表"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b"GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+        sockets.append(sock)
+    for sock in sockets:
+        sock.settimeout(10)
+        head = b''
+        while b'\n\n' not in head.partition(b'\r\n\r\n')[2]:  # 响应头 + "retry:" 行
+            head += sock.recv(4096)
+        if read:
+            sock.setblocking(False)
+    return sockets
+
+
+def wait_for_event(selector, pending, marker, deadline):
+    """等待 pending 中的每个 socket 都收到 marker；返回最后一个收到的时间"""
+    buffers = {}
+    last = None
+    while pending and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            sock = key.fileobj
+            if sock not in pending:
+                sock.recv(65536)
+                continue
+            data = buffers.get(sock, b'') + sock.recv(65536)
+            if marker in data:
+                pending.discard(sock)
+                buffers.pop(sock, None)
+                last = time.perf_counter()
+            else:
+                buffers[sock] = data[-len(marker):]
+    return last
+
+
+def run(subscribers, events, idle_seconds, slow_events):
+    hub = EventHub()
+    server = EventServer(hub, host='127.0.0.1', port=0, heartbeat=60)
+    port = server.start()
+    raise_fd_limit(subscribers * 2 + 256)
+
+    threads_before = threading.active_count()
+    rss_before = current_rss_kb()
+    sockets = connect(port, subscribers)
+    while hub.stats()['subscribers'] < subscribers:
+        time.sleep(0.01)
+    threads_after = threading.active_count()
+    rss_after = current_rss_kb()
+
+    # 空闲: 所有订阅者在线，没有事件
+    cpu_start = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_start
+
+    # 广播延迟
+    selector = selectors.DefaultSelector()
+    for sock in sockets:
+        selector.register(sock, selectors.EVENT_READ)
+    latencies = []
+    for i in range(events):
+        pending = set(sockets)
+        marker = f'"seq":{i}}}'.encode('ascii')
+        start = time.perf_counter()
+        hub.publish('lightup', {"status": "success", "location": {"box_id": 1, "led_id": i % 81 + 1}, "seq": i})
+        done = wait_for_event(selector, pending, marker, start + 10)
+        if done is None or pending:
+            raise RuntimeError(f"事件 {i}: {len(pending)} 个订阅者 10 秒内没有收到")
+        latencies.append(done - start)
+
+    for sock in sockets:
+        selector.unregister(sock)
+        sock.close()
+    selector.close()
+    while hub.stats()['subscribers']:
+        time.sleep(0.01)
+
+    # 慢客户端: 从不读取 socket。服务器端的积压 = 有界队列 + asyncio 写缓冲 (drain 的高水位)，
+    # 不随事件数增长
+    slow = connect(port, 1, read=False)[0]
+    subscriber = hub.subscribers()[0]
+    payload = 'x' * 1024
+    max_backlog = 0
+    for i in range(slow_events):
+        hub.publish('lightup', {"seq": -1, "padding": payload})
+        if i % 100 == 0:
+            time.sleep(0.01)  # 让事件循环把数据写进 socket，直到内核缓冲区写满
+        max_backlog = max(max_backlog, len(subscriber.queue))
+    time.sleep(0.2)
+    transport_buffer = server.write_buffer_sizes()
+    slow_dropped = subscriber.dropped
+    slow.close()
+    server.stop()
+
+    latencies.sort()
+    rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return {
+        "subscribers": subscribers,
+        "threads_before": threads_before,
+        "threads_after": threads_after,
+        "rss_before_kb": rss_before,
+        "rss_after_kb": rss_after,
+        "rss_per_subscriber_kb": rss_delta / subscribers if rss_delta is not None else None,
+        "idle_seconds": idle_seconds,
+        "idle_cpu_seconds": idle_cpu,
+        "fanout_ms": {
+            "p50": percentile(latencies, 0.50) * 1e3,
+            "p99": percentile(latencies, 0.99) * 1e3,
+            "max": latencies[-1] * 1e3
+        },
+        "slow_client": {
+            "events": slow_events,
+            "event_bytes": len(payload),
+            "max_backlog": max_backlog,
+            "backlog_limit": CLIENT_BACKLOG,
+            "dropped": slow_dropped,
+            "write_buffer_bytes": max(transport_buffer, default=0)
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='/events (SSE) 负载测试')
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--events', type=int, default=50, help='测量广播延迟的事件数')
+    parser.add_argument('--idle', type=float, default=2.0, help='空闲测量时长 (秒)')
+    parser.add_argument('--slow-events', type=int, default=5000, help='发给慢客户端的事件数')
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run(args.worker, args.events, args.idle, args.slow_events)))
+        sys.exit(0)
+
+    # 每个订阅者数量在独立的子进程中运行，内存 / 线程数互不影响
+    results = []
+    for count in args.subscribers:
+        print(f"  {count} 个订阅者 ...", file=sys.stderr)
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(count),
+                                    '--events', str(args.events), '--idle', str(args.idle),
+                                    '--slow-events', str(args.slow_events)], capture_output=True, text=True)
+        if completed.returncode != 0:
+            results.append({"subscribers": count, "error": completed.stderr.strip()[-2000:]})
+        else:
+            results.append(json.loads(completed.stdout))
+    text = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,148 @@
+'''
+Description: 主控 ESP32 固件的串口模拟 (基于 pty，仅 POSIX)。
+    按 Software/src/main.cpp (FIRMWARE_IS_MASTER) 的 loop() 解析 "box_id:X,led_id:Y"，
+    输出与固件相同的回显，并模拟 ESP-NOW 发送回调 "  ESP-NOW 发送状态: 成功/失败"。
+    用于在没有硬件的情况下测试 serial_bridge.SerialBridge。
+
+    命令行:
+        python fake_master.py --boxes 3 --offline 2
+        # 输出 pty 路径，然后: BOM_SERIAL_PORT=/dev/pts/N python DanymicBomServer.py
+    代码中:
+        with FakeMaster(boxes=3) as master:
+            bridge = SerialBridge(master.port_name)
+            ...
+            master.commands  # 收到的 [(box_id, led_id)]
+'''
+import argparse
+import os
+import pty
+import re
+import select
+import threading
+import time
+import tty
+
+_TO_INT_RE = re.compile(r'^\s*([+-]?\d+)')
+
+
+def arduino_to_int(text):
+    """Arduino String::toInt(): 解析开头的整数，失败返回 0"""
+    match = _TO_INT_RE.match(text)
+    return int(match.group(1)) if match else 0
+
+
+def parse_command(cmd):
+    """与 main.cpp 中主控 loop() 相同的解析逻辑，返回 (box_id, led_id)，格式错误时为 (-1, -1)"""
+    box_id = led_id = -1
+    box_id_pos = cmd.find('box_id:')
+    led_id_pos = cmd.find('led_id:')
+    if box_id_pos != -1 and led_id_pos != -1:
+        box_id_start = box_id_pos + 7
+        box_id_end = cmd.find(',', box_id_start)
+        if box_id_end == -1:
+            box_id_end = len(cmd)
+        box_id = arduino_to_int(cmd[box_id_start:box_id_end])
+
+        led_id_start = led_id_pos + 7
+        led_id_end = cmd.find(',', led_id_start)
+        if led_id_end == -1:
+            led_id_end = len(cmd)
+        led_id = arduino_to_int(cmd[led_id_start:led_id_end])
+    return box_id, led_id
+
+
+class FakeMaster:
+    """
+    boxes: 路由表中的盒子数量 (num_boxes)
+    offline: 不会确认收到的盒子 (ESP-NOW 发送状态: 失败)
+    ack_delay: 从转发到发送回调之间的延迟 (秒)
+    silent: 收到命令后不回显任何内容 (模拟卡死的主控)
+    """
+
+    def __init__(self, boxes=1, offline=(), ack_delay=0.005, silent=False):
+        self.boxes = boxes
+        self.offline = set(offline)
+        self.ack_delay = ack_delay
+        self.silent = silent
+        self.commands = []
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._slave_fd)
+        self.port_name = os.ttyname(self._slave_fd)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-master', daemon=True)
+        self._thread.start()
+        self._println("==================================")
+        self._println("  主设备 (Master) 启动...")
+        self._println("==================================")
+        self._println("\n系统就绪,等待来自电脑的串口命令...")
+
+    def _println(self, text):
+        try:
+            os.write(self._master_fd, (text + '\r\n').encode('utf-8'))
+        except OSError:
+            pass
+
+    def _run(self):
+        buffer = b''
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._master_fd], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self._master_fd, 4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\n' in buffer:
+                raw, _, buffer = buffer.partition(b'\n')
+                self._handle(raw.decode('utf-8', errors='replace').strip())
+
+    def _handle(self, cmd):
+        box_id, led_id = parse_command(cmd)
+        self.commands.append((box_id, led_id))
+        if self.silent:
+            return
+        self._println(f"收到串口命令: {cmd}")
+        if box_id > 0 and led_id >= 0:
+            if box_id - 1 < self.boxes:
+                self._println(f"  转发命令给 盒子 {box_id} (MAC: 44:17:93:3B:69:{box_id:02X})")
+                self._println(f"  LED ID: {led_id}, RGB: (255,255,255)")
+                time.sleep(self.ack_delay)
+                self._println("  ESP-NOW 发送状态: " + ("失败" if box_id in self.offline else "成功"))
+            else:
+                self._println(f"  错误: 盒子 ID {box_id} 无效 (范围: 1 到 {self.boxes})。")
+        else:
+            self._println("  错误: 命令格式不正确。应为: box_id:1,led_id:66")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(1)
+        for fd in (self._master_fd, self._slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='主控 ESP32 串口模拟 (pty)')
+    parser.add_argument('--boxes', type=int, default=1, help='路由表中的盒子数量')
+    parser.add_argument('--offline', type=int, nargs='*', default=[], help='不会确认收到的盒子')
+    parser.add_argument('--ack-delay', type=float, default=0.005)
+    args = parser.parse_args()
+    master = FakeMaster(args.boxes, args.offline, args.ack_delay)
+    print(f"模拟主控已就绪: {master.port_name}")
+    print(f"启动服务器: BOM_SERIAL_PORT={master.port_name} python DanymicBomServer.py")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        master.close()
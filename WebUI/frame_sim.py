@@ -0,0 +1,243 @@
+'''
+Description: 主控 / 从控 固件行为的 Python 参考模拟，用于离线对比 文本协议 与 批量二进制帧 (led_frame.py)。
+    SimMaster: 与 main.cpp 的主控相同 —— 文本行按 box_id/led_id 解析后转发一个 struct_message；
+               另外按 led_frame.FrameDecoder 解析二进制帧，每个盒子转发一个 (或拆分后的几个) ESP-NOW 批量包。
+    SimSlave:  81 颗灯的状态；旧 struct_message "先全部熄灭再点亮一颗"，批量包按 FLAG_CLEAR 处理。
+
+    用法:
+        python frame_sim.py                     # 输出各场景的字节数 / 包数 / 编解码耗时 (JSON)
+        python frame_sim.py --check 2000        # 随机往返测试 + 损坏帧测试
+'''
+import argparse
+import json
+import random
+import struct
+import sys
+import time
+
+from fake_master import parse_command
+from led_frame import (FLAG_CLEAR, LEGACY_MESSAGE_SIZE, FrameDecoder, FrameError, LedCommand,
+                       decode_espnow, decode_frame, encode_espnow, encode_frame, encode_legacy_message,
+                       encode_text, group_commands)
+
+NUM_LEDS = 81
+SERIAL_BAUDRATE = 115200
+BITS_PER_BYTE = 10  # 8N1: 起始位 + 8 数据位 + 停止位
+DEFAULT_COLOR = (255, 255, 255)  # 主控对文本命令使用的颜色
+
+
+class SimSlave:
+    """从控: ESP32 固件使用 0..80 的灯号 (ESP8266 固件为 1..81，one_based=True)"""
+
+    def __init__(self, num_leds=NUM_LEDS, one_based=False):
+        self.num_leds = num_leds
+        self.offset = 1 if one_based else 0
+        self.leds = [(0, 0, 0)] * num_leds
+        self.packets = 0
+        self.invalid = 0
+
+    def _set(self, led_id, rgb):
+        index = led_id - self.offset
+        if 0 <= index < self.num_leds:
+            self.leds[index] = rgb
+        else:
+            self.invalid += 1
+
+    def clear(self):
+        self.leds = [(0, 0, 0)] * self.num_leds
+
+    def receive(self, packet):
+        self.packets += 1
+        if len(packet) == LEGACY_MESSAGE_SIZE:
+            led_id, r, g, b = struct.unpack('<iBBBx', packet)
+            if led_id == -1:
+                self.clear()
+            elif 0 <= led_id - self.offset < self.num_leds:
+                self.clear()
+                self._set(led_id, (r, g, b))
+            else:
+                self.invalid += 1
+            return
+        flags, entries = decode_espnow(packet)
+        if flags & FLAG_CLEAR:
+            self.clear()
+        for led_id, r, g, b in entries:
+            self._set(led_id, (r, g, b))
+
+    def lit(self):
+        """{灯号: (r, g, b)}，只包含亮着的灯"""
+        return {index + self.offset: rgb for index, rgb in enumerate(self.leds) if rgb != (0, 0, 0)}
+
+
+class SimMaster:
+    """主控: num_boxes 为路由表大小，slaves 为 {box_id: SimSlave}"""
+
+    def __init__(self, slaves):
+        self.slaves = slaves
+        self.num_boxes = max(slaves) if slaves else 0
+        self.decoder = FrameDecoder(on_text=self._on_text, on_frame=self._on_frame)
+        self._line = bytearray()
+        self.serial_bytes = 0
+        self.espnow_packets = 0
+        self.espnow_bytes = 0
+        self.rejected = 0
+
+    def _send(self, box_id, packet):
+        self.espnow_packets += 1
+        self.espnow_bytes += len(packet)
+        slave = self.slaves.get(box_id)
+        if slave is not None:
+            slave.receive(packet)
+
+    def receive_serial(self, data):
+        self.serial_bytes += len(data)
+        self.decoder.feed(data)
+
+    def _on_frame(self, frame):
+        for box_id, entries in frame.groups.items():
+            if not 1 <= box_id <= self.num_boxes:
+                self.rejected += 1
+                continue
+            for packet in encode_espnow(entries, clear=bool(frame.flags & FLAG_CLEAR)):
+                self._send(box_id, packet)
+
+    def _on_text(self, data):
+        # 文本命令 (readStringUntil('\n'))
+        self._line += data
+        while b'\n' in self._line:
+            line, _, rest = bytes(self._line).partition(b'\n')
+            self._line[:] = rest
+            box_id, led_id = parse_command(line.decode('utf-8', errors='replace').strip())
+            if box_id > 0 and led_id >= 0 and box_id - 1 < self.num_boxes:
+                self._send(box_id, encode_legacy_message(led_id, *DEFAULT_COLOR))
+            else:
+                self.rejected += 1
+
+
+def make_system(num_boxes, one_based=False):
+    slaves = {box_id: SimSlave(one_based=one_based) for box_id in range(1, num_boxes + 1)}
+    return SimMaster(slaves), slaves
+
+
+def random_kit(rng, leds, num_boxes, color=DEFAULT_COLOR):
+    """随机的一套元件 (不重复的盒子 / 灯位置)"""
+    positions = rng.sample([(box_id, led_id) for box_id in range(1, num_boxes + 1)
+                            for led_id in range(NUM_LEDS)], leds)
+    return [LedCommand(box_id, led_id, *color) for box_id, led_id in positions]
+
+
+def expected_state(commands):
+    state = {}
+    for box_id, entries in group_commands(commands).items():
+        state[box_id] = {led_id: (r, g, b) for led_id, r, g, b in entries}
+    return state
+
+
+def actual_state(slaves):
+    return {box_id: slave.lit() for box_id, slave in slaves.items() if slave.lit()}
+
+
+# --- 对比基准 ---
+def _timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def run_scenario(leds, num_boxes, seed=0, repeat=200):
+    rng = random.Random(seed)
+    commands = random_kit(rng, leds, num_boxes)
+    expected = expected_state(commands)
+    result = {"leds": leds, "boxes": num_boxes}
+
+    for name, encode in (('text', encode_text), ('binary', encode_frame)):
+        data, encode_seconds = _timed(lambda: encode(commands), repeat)
+        master, slaves = make_system(num_boxes)
+        start = time.perf_counter()
+        master.receive_serial(data)
+        simulate_seconds = time.perf_counter() - start
+        result[name] = {
+            "serial_bytes": len(data),
+            "serial_ms": len(data) * BITS_PER_BYTE / SERIAL_BAUDRATE * 1e3,
+            "espnow_packets": master.espnow_packets,
+            "espnow_bytes": master.espnow_bytes,
+            "encode_us": encode_seconds * 1e6,
+            "simulate_us": simulate_seconds * 1e6,
+            # 文本协议中每颗灯都会先熄灭同一盒子的其他灯，一个盒子只能亮最后一颗
+            "all_leds_lit": actual_state(slaves) == expected
+        }
+    _, decode_seconds = _timed(lambda: decode_frame(encode_frame(commands)), repeat)
+    result["binary"]["roundtrip_us"] = decode_seconds * 1e6
+    result["byte_ratio"] = result["binary"]["serial_bytes"] / result["text"]["serial_bytes"]
+    return result
+
+
+# --- 往返测试 ---
+def check(iterations, seed=0):
+    """随机往返 + 损坏帧测试，返回失败描述列表"""
+    rng = random.Random(seed)
+    failures = []
+    for i in range(iterations):
+        num_boxes = rng.randint(1, 12)
+        commands = [LedCommand(rng.randint(1, num_boxes), rng.randint(0, NUM_LEDS - 1),
+                               rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+                    for _ in range(rng.randint(1, 300))]
+        frame = encode_frame(commands)
+        decoded = decode_frame(frame)
+        if decoded.groups != group_commands(commands):
+            failures.append(f"#{i}: 往返结果不一致")
+
+        # 主控 + 从控: 最终亮灯状态与期望一致 (按任意位置切分字节流喂入)
+        master, slaves = make_system(num_boxes)
+        # 帧前后混入文本命令，文本与帧必须按字节流顺序执行
+        noise = b'box_id:1,led_id:3\n' if rng.random() < 0.3 else b''
+        tail = b'box_id:1,led_id:4\n' if rng.random() < 0.3 else b''
+        stream = noise + frame + tail
+        cut = rng.randint(0, len(stream))
+        master.receive_serial(stream[:cut])
+        master.receive_serial(stream[cut:])
+        expected = expected_state(commands)
+        if tail:
+            expected[1] = {4: DEFAULT_COLOR}  # 旧命令先熄灭盒子 1 的其他灯
+        elif noise and 1 not in expected:
+            # FLAG_CLEAR 只熄灭帧中涉及的盒子，文本命令点亮的灯保留
+            expected[1] = {3: DEFAULT_COLOR}
+        if actual_state(slaves) != expected:
+            failures.append(f"#{i}: 模拟亮灯状态不一致")
+
+        # 随机翻转一个字节: 不能被当作有效帧接受 (除非翻转后内容不变)
+        corrupted = bytearray(frame)
+        position = rng.randrange(len(corrupted))
+        corrupted[position] ^= rng.randint(1, 255)
+        try:
+            decode_frame(corrupted)
+        except FrameError:
+            pass
+        else:
+            failures.append(f"#{i}: 第 {position} 字节损坏后仍被接受")
+        decoder = FrameDecoder()
+        frames = decoder.feed(bytes(corrupted) + frame) + decoder.idle()
+        if not frames or frames[-1].groups != decoded.groups:
+            failures.append(f"#{i}: 损坏帧之后没有重新同步")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='文本协议 vs 批量二进制帧 的离线模拟')
+    parser.add_argument('--leds', type=int, nargs='+', default=[1, 10, 40, 81, 200, 500])
+    parser.add_argument('--boxes', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', type=int, metavar='N', help='运行 N 次随机往返测试')
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check(args.check, args.seed)
+        for failure in failures[:20]:
+            print(failure)
+        print(f"往返测试: {args.check} 次, 失败 {len(failures)} 次")
+        sys.exit(1 if failures else 0)
+
+    results = [run_scenario(leds, args.boxes, args.seed) for leds in args.leds
+               if leds <= args.boxes * NUM_LEDS]
+    print(json.dumps({"baudrate": SERIAL_BAUDRATE, "results": results}, indent=2, ensure_ascii=False))
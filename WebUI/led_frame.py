@@ -0,0 +1,243 @@
+'''
+Description: 电脑 -> 主控 的批量二进制点灯帧 (以及 主控 -> 从控 的 ESP-NOW 批量包) 的编码 / 解码。
+    文本协议 "box_id:1,led_id:66\\n" 一行只能点一颗灯，从控收到后还会先熄灭其他灯；
+    二进制帧一次携带任意多个 (盒子, 灯, RGB)，按盒子分组，主控每个盒子只需发一个 ESP-NOW 包。
+
+    串口帧 (小端):
+        偏移  长度  字段
+        0     2     同步字 0xA5 0x5A (不会出现在 ASCII 文本命令中，主控据此区分两种协议)
+        2     1     版本号 (FRAME_VERSION)
+        3     1     标志位 (FLAG_CLEAR: 先熄灭帧中涉及的盒子的所有灯)
+        4     2     载荷长度 N
+        6     N     载荷: 分组数 (1)，每组 = 盒子号 (1) + 条目数 (1) + 条目 [灯号 (1), R, G, B] * 条目数
+        6+N   2     CRC-16/CCITT-FALSE (覆盖 版本号 .. 载荷)
+
+    ESP-NOW 包 (主控 -> 从控，每包最多 ESPNOW_MAX_PAYLOAD 字节，超出时拆分):
+        版本号 (1) + 标志位 (1) + 条目数 (1) + 条目 [灯号, R, G, B] * 条目数
+    长度为 3 + 4n，永远不等于旧的 struct_message (8 字节)，从控可以按长度区分新旧格式。
+'''
+import binascii
+import struct
+from collections import OrderedDict, namedtuple
+
+FRAME_MAGIC = b'\xA5\x5A'
+FRAME_VERSION = 1
+FLAG_CLEAR = 0x01
+
+HEADER = struct.Struct('<2sBBH')   # 同步字, 版本号, 标志位, 载荷长度
+CRC = struct.Struct('<H')
+ESPNOW_HEADER = struct.Struct('<BBB')  # 版本号, 标志位, 条目数
+ENTRY_SIZE = 4
+MAX_PAYLOAD = 4096        # 主控串口接收缓冲区的上限 (约 1000 颗灯)；头部声明更长的帧直接视为损坏
+ESPNOW_MAX_PAYLOAD = 250  # ESP-NOW 单包最大载荷
+LEGACY_MESSAGE_SIZE = 8   # sizeof(struct_message) on ESP32: int + 3 * uint8_t + 填充
+
+# 一颗灯的命令；led_id 与文本协议相同 (直接转发给从控，不做 0/1 起始的换算)
+LedCommand = namedtuple('LedCommand', 'box_id led_id r g b')
+Frame = namedtuple('Frame', 'version flags groups')  # groups: OrderedDict {box_id: [(led_id, r, g, b)]}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (多项式 0x1021，初值 0xFFFF)，MCU 上用查表法同样便宜"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def group_commands(commands):
+    """按盒子分组 (保持第一次出现的顺序)；同一颗灯出现多次时以最后一次为准"""
+    groups = OrderedDict()
+    for command in commands:
+        box_id, led_id, r, g, b = command
+        groups.setdefault(box_id, OrderedDict())[led_id] = (r, g, b)
+    return OrderedDict((box_id, [(led_id,) + rgb for led_id, rgb in leds.items()])
+                       for box_id, leds in groups.items())
+
+
+def _check_byte(name, value):
+    if not 0 <= value <= 0xFF:
+        raise FrameError(f"{name} 超出范围 0..255: {value}")
+
+
+# --- 串口帧 ---
+def encode_frame(commands, clear=True, version=FRAME_VERSION):
+    """把 LedCommand 列表编码为一个串口帧"""
+    groups = group_commands(commands)
+    if len(groups) > 0xFF:
+        raise FrameError(f"一帧最多 255 个盒子，实际 {len(groups)}")
+    payload = bytearray([len(groups)])
+    for box_id, entries in groups.items():
+        _check_byte('box_id', box_id)
+        if len(entries) > 0xFF:
+            raise FrameError(f"盒子 {box_id} 的条目数超过 255")
+        payload += bytes((box_id, len(entries)))
+        for entry in entries:
+            for name, value in zip(('led_id', 'r', 'g', 'b'), entry):
+                _check_byte(name, value)
+            payload += bytes(entry)
+    if len(payload) > MAX_PAYLOAD:
+        raise FrameError(f"载荷过长: {len(payload)} 字节")
+    header = HEADER.pack(FRAME_MAGIC, version, FLAG_CLEAR if clear else 0, len(payload))
+    return header + payload + CRC.pack(crc16(header[2:] + payload))
+
+
+def _parse_payload(payload):
+    if not payload:
+        raise FrameError("载荷为空")
+    group_count = payload[0]
+    groups = OrderedDict()
+    offset = 1
+    for _ in range(group_count):
+        if offset + 2 > len(payload):
+            raise FrameError("分组头不完整")
+        box_id, count = payload[offset], payload[offset + 1]
+        offset += 2
+        end = offset + count * ENTRY_SIZE
+        if end > len(payload):
+            raise FrameError(f"盒子 {box_id} 的条目不完整")
+        groups[box_id] = [tuple(payload[i:i + ENTRY_SIZE]) for i in range(offset, end, ENTRY_SIZE)]
+        offset = end
+    if offset != len(payload):
+        raise FrameError(f"载荷末尾有 {len(payload) - offset} 个多余字节")
+    return groups
+
+
+def decode_frame(data):
+    """解码一个完整的串口帧 (严格：长度、CRC、版本号都必须正确)"""
+    data = bytes(data)
+    if len(data) < HEADER.size + CRC.size:
+        raise FrameError("帧太短")
+    magic, version, flags, length = HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise FrameError("同步字错误")
+    if len(data) != HEADER.size + length + CRC.size:
+        raise FrameError(f"长度不符: 头部声明 {length} 字节载荷，实际帧长 {len(data)}")
+    body = data[2:HEADER.size + length]
+    (expected,) = CRC.unpack_from(data, HEADER.size + length)
+    if crc16(body) != expected:
+        raise FrameError("CRC 校验失败")
+    if version != FRAME_VERSION:
+        raise FrameError(f"不支持的版本号: {version}")
+    return Frame(version, flags, _parse_payload(data[HEADER.size:HEADER.size + length]))
+
+
+def frame_commands(frame):
+    """Frame -> [LedCommand]"""
+    return [LedCommand(box_id, *entry) for box_id, entries in frame.groups.items() for entry in entries]
+
+
+class FrameDecoder:
+    """
+    串口字节流的增量解码 (主控侧的参考实现)。
+    feed() 返回解出的 [Frame]；同步字之前的字节 (例如文本命令) 交给 on_text 回调，没有回调时累积在 text 中。
+    需要文本和帧严格按字节流顺序处理时 (主控的行为)，同时传入 on_frame 回调。
+    CRC 错误或格式错误的帧跳过一个字节后重新找同步字。
+    """
+
+    def __init__(self, on_text=None, on_frame=None):
+        self._buffer = bytearray()
+        self._on_text = on_text
+        self._on_frame = on_frame
+        self.text = bytearray()
+        self.frames = 0
+        self.errors = 0
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        while True:
+            start = self._buffer.find(FRAME_MAGIC)
+            if start == -1:
+                # 末尾可能是同步字的前半个字节，先留着
+                keep = 1 if self._buffer.endswith(FRAME_MAGIC[:1]) else 0
+                self._emit_text(self._buffer[:len(self._buffer) - keep])
+                del self._buffer[:len(self._buffer) - keep]
+                return frames
+            self._emit_text(self._buffer[:start])
+            del self._buffer[:start]
+            if len(self._buffer) < HEADER.size:
+                return frames
+            _, _, _, length = HEADER.unpack_from(self._buffer)
+            if length > MAX_PAYLOAD:
+                self.errors += 1
+                del self._buffer[:1]
+                continue
+            total = HEADER.size + length + CRC.size
+            if len(self._buffer) < total:
+                return frames
+            try:
+                frame = decode_frame(self._buffer[:total])
+            except FrameError:
+                self.errors += 1
+                del self._buffer[:1]
+                continue
+            del self._buffer[:total]
+            self.frames += 1
+            frames.append(frame)
+            if self._on_frame is not None:
+                self._on_frame(frame)
+
+    def _emit_text(self, data):
+        if not data:
+            return
+        if self._on_text is not None:
+            self._on_text(bytes(data))
+        else:
+            self.text += data
+
+    def idle(self):
+        """
+        串口空闲超时 (固件中的帧间超时)：缓冲区中不完整的帧不会再补全了。
+        长度字段被损坏时声明的长度可能比实际长，不丢弃就会吞掉后面的正常帧。
+        丢掉它的同步字后重新扫描，返回因此解出的 [Frame]。
+        """
+        frames = []
+        while self._buffer.startswith(FRAME_MAGIC):
+            self.errors += 1
+            del self._buffer[:1]
+            frames += self.feed(b'')
+        return frames
+
+
+# --- ESP-NOW 包 ---
+def encode_espnow(entries, clear=True, version=FRAME_VERSION, max_payload=ESPNOW_MAX_PAYLOAD):
+    """
+    一个盒子的条目 [(led_id, r, g, b)] -> ESP-NOW 包列表。
+    超过单包容量时拆成多个包，只有第一个包带 FLAG_CLEAR (否则后面的包会把前面点亮的灯熄灭)。
+    """
+    per_packet = (max_payload - ESPNOW_HEADER.size) // ENTRY_SIZE
+    packets = []
+    for start in range(0, max(len(entries), 1), per_packet):
+        chunk = entries[start:start + per_packet]
+        flags = FLAG_CLEAR if clear and start == 0 else 0
+        packets.append(ESPNOW_HEADER.pack(version, flags, len(chunk)) +
+                       b''.join(bytes(entry) for entry in chunk))
+    return packets
+
+
+def decode_espnow(packet):
+    """ESP-NOW 包 -> (flags, [(led_id, r, g, b)])"""
+    packet = bytes(packet)
+    if len(packet) < ESPNOW_HEADER.size:
+        raise FrameError("ESP-NOW 包太短")
+    version, flags, count = ESPNOW_HEADER.unpack_from(packet)
+    if version != FRAME_VERSION:
+        raise FrameError(f"不支持的版本号: {version}")
+    if len(packet) != ESPNOW_HEADER.size + count * ENTRY_SIZE:
+        raise FrameError("ESP-NOW 包长度与条目数不符")
+    body = packet[ESPNOW_HEADER.size:]
+    return flags, [tuple(body[i:i + ENTRY_SIZE]) for i in range(0, len(body), ENTRY_SIZE)]
+
+
+# --- 旧协议 (用于对比) ---
+def encode_text(commands):
+    """旧的文本协议：每颗灯一行"""
+    return b''.join(f"box_id:{box_id},led_id:{led_id}\n".encode('ascii')
+                    for box_id, led_id, *_ in commands)
+
+
+def encode_legacy_message(led_id, r, g, b):
+    """旧的 struct_message (int led_id; uint8_t r, g, b;) 按 ESP32 的内存布局打包"""
+    return struct.pack('<iBBBx', led_id, r, g, b)
@@ -0,0 +1,210 @@
+'''
+Description: 进程内唯一的元件库对象，元件管理器 (InputDataset) 和 BOM 查询服务器 (DanymicBomServer) 共用。
+    library.store       存储后端 (component_store.open_store)，负责持久化
+    library.components  列式元件表 (CompactComponents)，即 library.index.db
+    library.index       倒排索引 (ComponentIndex)，revision 每次增删 +1，搜索缓存 / BOM 页面缓存以它为版本
+    library.slots       料盒位置占用索引 (SlotIndex)
+
+    本进程的写入 (add / delete / add_many) 先写存储后端，再逐条增量更新索引，不重新加载整个库。
+    按 key 读取 library.components (精确匹配) 不需要持锁: CompactComponents 写完整行后才发布，
+    覆盖 / 删除不修改旧行 (见 compact_store)。跨越多个索引结构的查询 (模糊搜索等) 持有 library.lock。
+    其他进程 (多 worker 的 WSGI 服务器、命令行脚本) 的写入由 sync() 读取: 存储后端的 signature 变化后，
+    通过 store.refresh() + changes_since() 取得变化的元件并逐条应用；变更记录不够用时整体重新加载。
+
+    用法:
+        library = shared_library()
+        library.load(defer_index=True)   # 启动时: 元件表立即可用于精确匹配，倒排索引在后台建立
+        library.sync()                   # 每次请求前: 读取其他进程的写入
+        library.add(key, details)
+        with library.batch():            # 检查 + 写入在同一个写锁内完成
+            ...
+'''
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from compact_store import CompactComponents
+from component_index import ComponentIndex
+from component_store import STORAGE_BACKEND, open_store
+from slot_index import SlotIndex
+
+log = logging.getLogger('bom_library')
+
+
+class Library:
+    def __init__(self, store=None):
+        self.store = store
+        self.index = ComponentIndex()
+        self.components = self.index.db
+        self.slots = SlotIndex()
+        self.ready = threading.Event()  # 倒排索引已建立 (启动时在后台建立)
+        self.loads = 0
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._signature = None
+        self._token = None
+        self._listeners = []
+
+    @property
+    def revision(self):
+        return self.index.revision
+
+    @property
+    def lock(self):
+        """读取倒排索引 (模糊搜索等多步查询) 时持有，不与写入时的增量更新交错"""
+        return self._lock
+
+    def add_listener(self, listener):
+        """listener(event): 每次变化后调用，event 为 {"action", "keys", "components", "revision", "time"}"""
+        self._listeners.append(listener)
+
+    def _notify(self, action, keys=()):
+        event = {"action": action, "keys": list(keys)[:100], "components": len(self.components),
+                 "revision": self.revision, "time": time.time()}
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                log.warning("元件库事件处理失败: %s", e)
+
+    # --- 加载 ---
+    def load(self, defer_index=False):
+        """
+        (重新) 加载整个元件库并重建索引。
+        defer_index=True (启动时): 元件表加载后立即可用于精确匹配，倒排索引和位置索引在后台线程中建立。
+        """
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                if self.store is None:
+                    self.store = open_store()
+                else:
+                    self.store.reload()
+                self._signature = self.store.signature()
+                self._token = self.store.revision_token()
+                table = self.store.compact_copy()
+                log.info("成功加载 %d 条元件数据 (%s, %.2f 秒)。", len(table), STORAGE_BACKEND,
+                         time.perf_counter() - start)
+            except Exception as e:
+                log.warning("加载元件库 (%s) 失败: %s", STORAGE_BACKEND, e)
+                table = CompactComponents()
+            self.loads += 1
+            self.components = table
+            if not defer_index:
+                self._build(table)
+                return
+            self.ready.clear()
+        threading.Thread(target=self._build_later, args=(table,), name='index-builder', daemon=True).start()
+
+    def _build(self, table):
+        start = time.perf_counter()
+        self.index.rebuild(table)
+        self.components = self.index.db
+        self.slots.rebuild(self.components)
+        self.ready.set()
+        log.info("倒排索引已建立 (%.2f 秒)。", time.perf_counter() - start)
+
+    def _build_later(self, table):
+        with self._lock:
+            if self.components is table:  # 期间已经重新加载过 (索引也随之建好) 时不再重复
+                self._build(table)
+
+    # --- 与其他进程同步 ---
+    def sync(self):
+        """存储后端被其他进程修改后，把变化逐条应用到索引上 (无法增量时整体重新加载)"""
+        if self.store is None or self.store.signature() == self._signature:
+            return
+        self.ready.wait()
+        with self._lock:
+            signature = self.store.signature()
+            if signature == self._signature:
+                return
+            self.store.refresh()
+            changes = self.store.changes_since(self._token)
+            if changes is None:
+                self.load()
+                self._notify('reload')
+                return
+            for key, details in changes.items():
+                self._apply(key, details)
+            self._signature = signature
+            self._token = self.store.revision_token()
+            if changes:
+                self._notify('sync', changes)
+
+    def _apply(self, key, details):
+        old = self.components.get(key)
+        if old is not None:
+            self.slots.remove(key, old)
+        if details is None:
+            self.index.remove(key)
+        else:
+            self.index.add(key, details)
+            self.slots.add(key, details)
+
+    # --- 写入 ---
+    @contextmanager
+    def batch(self):
+        """
+        写锁 (包括其他进程，见 ComponentStore.batch): 批次内先读取其他进程的写入，再做检查 + 写入；
+        存储后端在最外层批次结束时一次提交。
+        """
+        self.ready.wait()
+        with self._lock:
+            self._depth += 1
+            try:
+                with self.store.batch():
+                    if self._depth == 1:
+                        self.sync()
+                    yield self
+                    if self._depth == 1:
+                        # 本进程的写入已经应用到索引上，只需记下存储后端的新状态。
+                        # 在存储后端的批次 (写锁) 内记录，不会把其他进程随后的写入当成已经读过的
+                        self._signature = self.store.signature()
+                        self._token = self.store.revision_token()
+            finally:
+                self._depth -= 1
+
+    def add(self, key, details):
+        """新增或覆盖元件，返回写入的 details (带新的版本号)"""
+        with self.batch():
+            details = self.store.add(key, details)
+            self._apply(key, details)
+        self._notify('add', (key,))
+        return details
+
+    def add_many(self, items):
+        with self.batch():
+            items = self.store.add_many(items)
+            for key, details in items:
+                self._apply(key, details)
+        self._notify('import', [key for key, _ in items])
+        return items
+
+    def delete(self, key):
+        """删除元件，返回是否存在"""
+        with self.batch():
+            deleted = self.store.delete(key)
+            if deleted:
+                self._apply(key, None)
+        if deleted:
+            self._notify('delete', (key,))
+        return deleted
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_library():
+    """进程内共用的 Library (不做任何 IO，由 bom_app.create_app 调用 load)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Library()
+        return _shared
@@ -0,0 +1,67 @@
+'''
+Description: 模糊搜索结果的 LRU 缓存。
+    以归一化后的 (型号, 参数, 封装) 作为 key，带 命中/未命中/淘汰 计数。
+    每条缓存都绑定数据库的 revision，数据库一变，整个缓存自动作废，
+    保证不会返回过期的 box_id / led_id。
+'''
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LookupCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._revision = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, revision):
+        """返回缓存值；未命中 (或数据库已变化) 时返回 None"""
+        with self._lock:
+            if revision != self._revision:
+                self._invalidate(revision)
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, revision):
+        with self._lock:
+            if revision != self._revision:
+                self._invalidate(revision)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _invalidate(self, revision):
+        if self._data:
+            self.invalidations += 1
+        self._data.clear()
+        self._revision = revision
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "revision": self._revision
+            }
@@ -0,0 +1,136 @@
+'''
+Description: 注入后的 BOM 页面缓存。
+    页面只在源文件 (mtime, size) 变化时重新生成一次，
+    同时预先算好 ETag 以及 gzip / brotli 压缩版本，GET / 直接返回字节。
+    多个 BOM 共用一个缓存时可以限制总字节数 (max_bytes)，超出时淘汰最久未访问的页面。
+'''
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli  # 可选依赖: pip install brotli
+except ImportError:
+    brotli = None
+
+
+def file_signature(path):
+    """文件的 (mtime_ns, size)；文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class CachedPage:
+    """一份生成好的页面：原始字节、ETag 和预压缩版本；info 为构建时附带的信息 (例如预解析统计)"""
+
+    def __init__(self, text, signature=None, info=None):
+        self.signature = signature
+        self.info = info
+        self.body = text.encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.variants = {'gzip': gzip.compress(self.body, compresslevel=9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(self.body)
+
+    def choose(self, accept_encodings):
+        """
+        根据 Accept-Encoding 选择最小的可用版本。
+        返回 (content_encoding 或 None, 字节)。
+        """
+        best_encoding, best_body = None, self.body
+        for encoding, body in self.variants.items():
+            if encoding in accept_encodings and len(body) < len(best_body):
+                best_encoding, best_body = encoding, body
+        return best_encoding, best_body
+
+    def __len__(self):
+        return len(self.body) + sum(len(body) for body in self.variants.values())
+
+
+class PageCache:
+    """
+    按源文件路径缓存生成好的页面。
+    build(path) 负责读文件并返回最终的 HTML 文本 (或 (文本, info))，只在文件签名变化时被调用。
+    version: 可选，返回页面依赖的其他数据的版本 (例如元件库 revision)，变化时同样重新构建。
+    max_bytes: 可选，缓存页面 (含压缩版本) 的总字节数上限，按最近访问顺序淘汰 (最新的一页总是保留)。
+    """
+
+    def __init__(self, build, version=None, max_bytes=None):
+        self._build = build
+        self._version = version
+        self.max_bytes = max_bytes
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.builds = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def signature(self, path):
+        """path 当前的签名 (文件签名 + version)；文件不存在时返回 None"""
+        signature = file_signature(path)
+        if signature is None or self._version is None:
+            return signature
+        return (signature, self._version())
+
+    def get(self, path):
+        """返回最新的 CachedPage；源文件不存在时抛出 FileNotFoundError"""
+        signature = self.signature(path)
+        if signature is None:
+            raise FileNotFoundError(path)
+        page = self._fresh(path, signature)
+        if page is not None:
+            return page
+        with self._lock:
+            build_lock = self._build_locks.setdefault(path, threading.Lock())
+        # 构建 (读文件、预解析、压缩) 只持有该页面自己的锁: 同一页面只构建一次，不阻塞其他 BOM 的缓存命中
+        with build_lock:
+            page = self._fresh(path, signature)
+            if page is not None:
+                return page
+            result = self._build(path)
+            text, info = result if isinstance(result, tuple) else (result, None)
+            page = CachedPage(text, signature, info)
+            with self._lock:
+                self.builds += 1
+                self._store(path, page)
+            return page
+
+    def _fresh(self, path, signature):
+        with self._lock:
+            page = self._pages.get(path)
+            if page is None or page.signature != signature:
+                return None
+            self._pages.move_to_end(path)
+            return page
+
+    def _store(self, path, page):
+        old = self._pages.pop(path, None)
+        if old is not None:
+            self.bytes -= len(old)
+        self._pages[path] = page
+        self.bytes += len(page)
+        while self.max_bytes is not None and self.bytes > self.max_bytes and len(self._pages) > 1:
+            _, evicted = self._pages.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def peek(self, path):
+        """已缓存的 CachedPage (可能已过期)，不构建、不改变访问顺序；未缓存时返回 None"""
+        with self._lock:
+            return self._pages.get(path)
+
+    def pages(self):
+        """当前缓存的全部 CachedPage"""
+        with self._lock:
+            return list(self._pages.values())
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.bytes = 0
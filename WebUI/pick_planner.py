@@ -0,0 +1,201 @@
+'''
+Description: 备料 (kitting) 拣选路径规划。
+    把一张 BOM 解析出的元件按料盒分组，盒内按格子位置排序，得到拣选顺序；
+    每个料盒同一时间只能亮一颗灯 (从控的 OnDataRecv 会先 FastLED.clear())，
+    所以按盒子集中拣选，盒内按行来回 (蛇形) 走，减少在料盒之间来回跑。
+
+    BoxGrid 描述 81 格料盒的布局: 每行几格、灯带的走线方式 (逐行同向 / 蛇形)、led_id 从 0 还是 1 开始。
+    plan_picks 返回拣选序列和未找到的 BOM 行；PickList 在序列上逐步前进 (/picklist/next)。
+'''
+import itertools
+import threading
+from collections import OrderedDict
+
+from component_io import LEDS_PER_BOX
+
+# --- 配置 ---
+GRID_COLUMNS = 9             # 料盒每行的格数 (81 = 9 x 9)
+GRID_WIRING = 'serpentine'   # 灯带走线: 'rows' 每行同向；'serpentine' 逐行换向
+LED_BASE = 1                 # 元件库中 led_id 的起始编号
+MAX_PICKLISTS = 16           # 服务器保留的拣选单数量
+# --- ---
+
+
+class BoxGrid:
+    def __init__(self, columns=GRID_COLUMNS, wiring=GRID_WIRING, led_base=LED_BASE):
+        if wiring not in ('rows', 'serpentine'):
+            raise ValueError(f"未知的走线方式: {wiring}")
+        if not 1 <= columns <= LEDS_PER_BOX:
+            raise ValueError(f"每行格数必须在 1 到 {LEDS_PER_BOX} 之间: {columns}")
+        self.columns = columns
+        self.wiring = wiring
+        self.led_base = led_base
+
+    def position(self, led_id):
+        """led_id -> 料盒中的 (行, 列)，都从 0 开始"""
+        index = led_id - self.led_base
+        row, column = divmod(index, self.columns)
+        if self.wiring == 'serpentine' and row % 2:
+            column = self.columns - 1 - column
+        return row, column
+
+    def order_key(self, led_id):
+        """盒内拣选顺序: 逐行，奇数行反向 (手不用每行都回到最左边)"""
+        row, column = self.position(led_id)
+        return row, -column if row % 2 else column
+
+    def distance(self, led_a, led_b):
+        """两个格子之间的曼哈顿距离 (格数)"""
+        (row_a, column_a), (row_b, column_b) = self.position(led_a), self.position(led_b)
+        return abs(row_a - row_b) + abs(column_a - column_b)
+
+
+def route_cost(picks, grid):
+    """
+    按给定顺序拣选的代价: (换盒次数, 盒内移动的格数)。
+    盒内移动从该盒上一次拣选的格子算起 (回到之前拣过的盒子也算)。
+    """
+    box_changes = 0
+    travel = 0
+    previous_box = None
+    last_led = {}
+    for box_id, led_id in picks:
+        if previous_box is not None and previous_box != box_id:
+            box_changes += 1
+        if box_id in last_led:
+            travel += grid.distance(last_led[box_id], led_id)
+        last_led[box_id] = led_id
+        previous_box = box_id
+    return box_changes, travel
+
+
+def plan_picks(lines, resolve, grid=None):
+    """
+    lines: [{"part_number", "parameter", "footprint", "designator"?, "quantity"?}]
+    resolve(part_number, parameter, footprint) -> (matched_pn, data, score, reasons)
+    同一位置 (box_id, led_id) 的多行合并为一次拣选。返回:
+        {"picks": [...], "unresolved": [...], "stats": {...}}
+    """
+    grid = grid or BoxGrid()
+    picks = OrderedDict()   # (box_id, led_id) -> pick，保持 BOM 中第一次出现的顺序
+    unresolved = []
+    resolved = {}
+    line_slots = []         # 每个找到的 BOM 行的位置 (合并前，按 BOM 顺序)
+    for index, line in enumerate(lines):
+        part_number = str(line.get('part_number') or '')
+        parameter = str(line.get('parameter') or '')
+        footprint = str(line.get('footprint') or '')
+        designator = str(line.get('designator') or '')
+        quantity = line.get('quantity')
+        quantity = quantity if type(quantity) is int and quantity > 0 else 1
+        searched = {"part_number": part_number, "parameter": parameter, "footprint": footprint}
+
+        key = (part_number, parameter, footprint)
+        if not any(key):
+            unresolved.append({"index": index, "designator": designator, "searched": searched,
+                               "reason": "没有搜索条件"})
+            continue
+        result = resolved.get(key)
+        if result is None:
+            result = resolved[key] = resolve(*key)
+        matched_pn, data, score, _ = result
+        box_id = data.get('box_id') if data else None
+        led_id = data.get('led_id') if data else None
+        if type(box_id) is not int or type(led_id) is not int:
+            unresolved.append({"index": index, "designator": designator, "searched": searched,
+                               "reason": "未找到匹配的元件" if not data else "元件没有有效的位置"})
+            continue
+
+        line_slots.append((box_id, led_id))
+        pick = picks.get((box_id, led_id))
+        if pick is None:
+            pick = picks[(box_id, led_id)] = {
+                "box_id": box_id,
+                "led_id": led_id,
+                "matched_part_number": matched_pn,
+                "parameter": data.get('parameter'),
+                "footprint": data.get('footprint'),
+                "score": score,
+                "lines": [],
+                "designators": [],
+                "quantity": 0
+            }
+        pick["lines"].append(index)
+        if designator:
+            pick["designators"].append(designator)
+        pick["quantity"] += quantity
+
+    # 按盒子编号依次拣选，盒内按格子位置蛇形前进
+    planned = sorted(picks, key=lambda slot: (slot[0], grid.order_key(slot[1])))
+    sequence = [dict(picks[slot], step=step) for step, slot in enumerate(planned, 1)]
+
+    # 对比: 操作员照着 BOM 逐行拣选时的路径
+    before = route_cost(line_slots, grid)
+    after = route_cost(planned, grid)
+    return {
+        "picks": sequence,
+        "unresolved": unresolved,
+        "stats": {
+            "lines": len(lines),
+            "picks": len(sequence),
+            "unresolved": len(unresolved),
+            "boxes": len({slot[0] for slot in planned}),
+            "box_changes": {"bom_order": before[0], "planned": after[0]},
+            "travel_cells": {"bom_order": before[1], "planned": after[1]}
+        }
+    }
+
+
+class PickList:
+    """一张拣选单: 规划结果 + 当前进度 (cursor 指向下一个要拣的位置)"""
+
+    def __init__(self, picklist_id, plan):
+        self.id = picklist_id
+        self.plan = plan
+        self.cursor = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        """前进到下一个拣选，返回它；已经全部拣完时返回 None"""
+        with self._lock:
+            if self.cursor >= len(self.plan["picks"]):
+                return None
+            pick = self.plan["picks"][self.cursor]
+            self.cursor += 1
+            return pick
+
+    def back(self):
+        """回退一步，返回上一个拣选 (下一次 next() 重新从当前这个开始)"""
+        with self._lock:
+            if self.cursor > 1:
+                self.cursor -= 1
+            return self.plan["picks"][self.cursor - 1] if self.cursor else None
+
+    def progress(self):
+        return {"id": self.id, "done": self.cursor, "total": len(self.plan["picks"]),
+                "finished": self.cursor >= len(self.plan["picks"])}
+
+
+class PickListStore:
+    """最近创建的拣选单 (最多 MAX_PICKLISTS 张，超出时丢弃最早的)"""
+
+    def __init__(self, maxsize=MAX_PICKLISTS):
+        self.maxsize = maxsize
+        self._lists = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, plan):
+        with self._lock:
+            picklist = PickList(str(next(self._ids)), plan)
+            self._lists[picklist.id] = picklist
+            while len(self._lists) > self.maxsize:
+                self._lists.popitem(last=False)
+            return picklist
+
+    def get(self, picklist_id=None):
+        """按 id 取拣选单；不给 id 时返回最近创建的一张"""
+        with self._lock:
+            if picklist_id:
+                return self._lists.get(picklist_id)
+            return next(reversed(self._lists.values()), None)
@@ -0,0 +1,330 @@
+'''
+Description: 请求重放负载生成器。
+    把记录下来的 (request_recorder, BOM_RECORD=...) 或合成的请求序列，在本进程内通过 Flask test client
+    打到 bom_app 上 (线程池并发)，复现一整个装配班次的负载，用来发现 search_component 和存储路径上的回归。
+    三种调度方式:
+      original  按记录的时间间隔
+      speed     记录的时间间隔除以 --speed (N 倍速)
+      rate      开环泊松到达，平均 --rate 个请求/秒 (忽略记录的时间，只用请求内容)
+    开环: 请求按计划时间发出，不等前一个完成；响应时间从计划时间算起 (包含排队)，另外给出纯处理时间。
+    输出 JSON: 延迟分布 (总体 + 按路径)、错误率、与记录状态码不一致的次数、搜索缓存命中率等。
+
+    重放在临时目录中的一份元件库上进行 (--library 指定的 components.json 的副本，或 --size 生成的合成库)，
+    不会修改原来的元件库。
+
+    用法:
+        python replay.py --trace shift.jsonl --mode speed --speed 4
+        python replay.py --synthetic 5000 --mode rate --rate 200 --threads 16
+        python replay.py --synthetic 5000 --save-trace synthetic.jsonl   # 保存合成序列，之后可以原样重放
+'''
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmark import WEBUI_DIR, generate_library, generate_queries, percentile, quiet
+from component_io import LEDS_PER_BOX
+from component_store import load_components_file
+from request_recorder import read_trace
+
+SYNTHETIC_RATE = 20.0  # 合成序列的平均到达率 (请求/秒)，即一个繁忙工位的点击 + 入库速度
+SYNTHETIC_BOM_LINES = 300  # 合成序列中 BOM 行的种类数，点击按 Zipf 分布重复 (热门元件被反复点击)
+
+
+# --- 请求序列 ---
+def synthetic_trace(db, count, seed=0, rate=SYNTHETIC_RATE):
+    """
+    合成的请求序列 (与 request_recorder 的格式相同):
+      80% /lightup (BOM 行按 Zipf 分布重复)，8% /api/add + 之后的 /api/delete (入库后又取出)，
+      7% /api/components 分页，5% /api/next_free_slot
+    """
+    rng = random.Random(seed)
+    lines = generate_queries(db, SYNTHETIC_BOM_LINES, seed=seed + 1)
+    weights = [1.0 / (rank + 1) for rank in range(len(lines))]
+    box_id = len(db) // LEDS_PER_BOX + 2
+    trace = []
+    pending_deletes = []
+    t = 1_000_000.0
+    added = 0
+    while len(trace) < count:
+        t += rng.expovariate(rate)
+        kind = rng.random()
+        if pending_deletes and kind < 0.04:
+            trace.append(_json_request(t, '/api/delete', {"component_name": pending_deletes.pop(0)}))
+        elif kind < 0.08:
+            key = f"REPLAY{added:06d}"
+            details = {"box_id": box_id + added // LEDS_PER_BOX, "led_id": added % LEDS_PER_BOX + 1,
+                       "parameter": rng.choice(("10K", "4.7K", "100nF", "1uF")), "voltage": "",
+                       "footprint": rng.choice(("0402", "0603"))}
+            trace.append(_json_request(t, '/api/add', {"component_name": key, "details": details}))
+            pending_deletes.append(key)
+            added += 1
+        elif kind < 0.15:
+            trace.append({"t": t, "m": "GET", "p": "/api/components",
+                          "q": urlencode({"limit": 50, "sort": "parameter", "cursor": rng.randrange(0, 500)})})
+        elif kind < 0.20:
+            trace.append({"t": t, "m": "GET", "p": "/api/next_free_slot"})
+        else:
+            part_number, parameter, footprint = rng.choices(lines, weights)[0]
+            query = {k: v for k, v in (('part_number', part_number), ('parameter', parameter),
+                                        ('footprint', footprint)) if v}
+            trace.append({"t": t, "m": "GET", "p": "/lightup", "q": urlencode(query)})
+    return trace
+
+
+def _json_request(t, path, payload):
+    return {"t": t, "m": "POST", "p": path, "ct": "application/json",
+            "b": json.dumps(payload, ensure_ascii=False)}
+
+
+def schedule(trace, mode, speed=1.0, rate=None, seed=0):
+    """每个请求相对开始时刻的计划发出时间 (秒)"""
+    if not trace:
+        return []
+    if mode == 'rate':
+        rng = random.Random(seed)
+        offsets = []
+        t = 0.0
+        for _ in trace:
+            offsets.append(t)
+            t += rng.expovariate(rate)
+        return offsets
+    t0 = trace[0]['t']
+    factor = 1.0 if mode == 'original' else 1.0 / speed
+    return [(record['t'] - t0) * factor for record in trace]
+
+
+def endpoint_of(record):
+    return record['p']
+
+
+# --- 重放 (子进程中) ---
+class Replayer:
+    """线程池 + 每个线程一个 test client；调度线程按计划时间提交请求 (开环)"""
+
+    def __init__(self, app, threads):
+        self.app = app
+        self.threads = threads
+        self._local = threading.local()
+        self.results = []
+        self._lock = threading.Lock()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def _fire(self, record, scheduled):
+        begin = time.perf_counter()
+        error = None
+        try:
+            response = self._client().open(record['p'], method=record.get('m', 'GET'),
+                                           query_string=record.get('q', ''),
+                                           data=record.get('b', '').encode('utf-8') if 'b' in record else None,
+                                           content_type=record.get('ct'))
+            response.get_data()  # 流式响应 (导出等) 也要读完
+            status = response.status_code
+        except Exception as e:
+            status = None
+            error = repr(e)
+        end = time.perf_counter()
+        with self._lock:
+            self.results.append((endpoint_of(record), end - scheduled, end - begin, status, record.get('s'), error))
+
+    def run(self, trace, offsets):
+        """返回 (总耗时, 调度落后的最大秒数)"""
+        max_lag = 0.0
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            start = time.perf_counter()
+            for record, offset in zip(trace, offsets):
+                scheduled = start + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+                pool.submit(self._fire, record, scheduled)
+        return time.perf_counter() - start, max_lag
+
+
+def _latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {"p50_ms": percentile(values, 0.50) * 1e3, "p90_ms": percentile(values, 0.90) * 1e3,
+            "p99_ms": percentile(values, 0.99) * 1e3, "max_ms": values[-1] * 1e3,
+            "mean_ms": sum(values) / len(values) * 1e3}
+
+
+def _cache_snapshot(server):
+    stats = server.lookup_cache.stats()
+    return {
+        "lookup_cache": {event: stats[event] for event in ('hits', 'misses', 'evictions', 'invalidations')},
+        "lookup_results": {result: server.lookup_results.value(result)
+                           for result in ('exact', 'fuzzy', 'not_found', 'table')},
+        "page_builds": server.bom_page_cache.builds,
+        "lookup_builds": server.bom_lookup_cache.builds,
+        "index_revision": server.component_index.revision,
+    }
+
+
+def _delta(before, after):
+    if isinstance(before, dict):
+        return {key: _delta(before[key], after[key]) for key in before}
+    return after - before
+
+
+def worker(args):
+    import bom_app
+    import DanymicBomServer as server
+    from library import shared_library
+
+    trace = read_trace(args.worker)
+    # 请求体太大没有记录内容的请求 (bl) 无法重放
+    skipped = sum(1 for record in trace if 'bl' in record)
+    trace = [record for record in trace if 'bl' not in record]
+    offsets = schedule(trace, args.mode, args.speed, args.rate, args.seed)
+    with quiet():
+        t0 = time.perf_counter()
+        app = bom_app.create_app()
+        shared_library().ready.wait()
+        load_seconds = time.perf_counter() - t0
+        replayer = Replayer(app, args.threads)
+        before = _cache_snapshot(server)
+        elapsed, max_lag = replayer.run(trace, offsets)
+        after = _cache_snapshot(server)
+
+    results = replayer.results
+    by_endpoint = {}
+    for endpoint, response_time, service_time, status, recorded, error in results:
+        by_endpoint.setdefault(endpoint, []).append((response_time, service_time, status, recorded, error))
+
+    def errors_of(items):
+        return sum(1 for _, _, status, _, error in items if error is not None or status >= 500)
+
+    def mismatches_of(items):
+        return sum(1 for _, _, status, recorded, _ in items if recorded is not None and status != recorded)
+
+    all_items = [item[1:] for item in results]
+    cache = _delta(before, after)
+    lookups = cache["lookup_cache"]["hits"] + cache["lookup_cache"]["misses"]
+    cache["lookup_cache"]["hit_ratio"] = cache["lookup_cache"]["hits"] / lookups if lookups else None
+    return {
+        "requests": len(results),
+        "skipped_without_body": skipped,
+        "mode": args.mode,
+        "speed": args.speed if args.mode == 'speed' else None,
+        "rate": args.rate if args.mode == 'rate' else None,
+        "threads": args.threads,
+        "load_seconds": load_seconds,
+        "seconds": elapsed,
+        "offered_per_second": len(trace) / offsets[-1] if offsets and offsets[-1] > 0 else None,
+        "throughput_per_second": len(results) / elapsed if elapsed else None,
+        "max_dispatch_lag_ms": max_lag * 1e3,
+        "response_time": _latency_summary([item[0] for item in all_items]),
+        "service_time": _latency_summary([item[1] for item in all_items]),
+        "errors": errors_of(all_items),
+        "error_rate": errors_of(all_items) / len(all_items) if all_items else None,
+        "status_mismatches": mismatches_of(all_items),
+        "error_samples": [error for *_, error in results if error is not None][:5],
+        "endpoints": {
+            endpoint: {"count": len(items), "errors": errors_of(items), "status_mismatches": mismatches_of(items),
+                       "response_time": _latency_summary([item[0] for item in items]),
+                       "service_time": _latency_summary([item[1] for item in items])}
+            for endpoint, items in sorted(by_endpoint.items())
+        },
+        "cache": cache,
+    }
+
+
+# --- 主进程 ---
+def prepare(args, workdir):
+    """在 workdir 中准备元件库，返回请求序列文件的路径"""
+    target = os.path.join(workdir, 'components.json')
+    if args.library:
+        shutil.copyfile(args.library, target)
+        if os.path.exists(args.library + '.journal'):
+            shutil.copyfile(args.library + '.journal', target + '.journal')
+        db = load_components_file(target)
+    else:
+        db = generate_library(args.size, seed=args.seed)
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(db, f, ensure_ascii=False)
+    if args.backend == 'sqlite':
+        from sqlite_store import import_json
+        import_json(target, os.path.join(workdir, 'components.db'))
+
+    if args.trace:
+        return os.path.abspath(args.trace)
+    trace_path = os.path.abspath(args.save_trace) if args.save_trace else os.path.join(workdir, 'trace.jsonl')
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        for record in synthetic_trace(db, args.synthetic, seed=args.seed):
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    return trace_path
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    try:
+        trace_path = prepare(args, workdir)
+        env = dict(os.environ, COMPONENT_STORAGE=args.backend, BOM_EVENTS_PORT='0', BOM_LOG_LEVEL='WARNING',
+                   BOM_WARM_INTERVAL='0', BOM_RECORD='', PYTHONPATH=WEBUI_DIR)
+        command = [sys.executable, os.path.abspath(__file__), '--worker', trace_path, '--mode', args.mode,
+                   '--speed', str(args.speed), '--threads', str(args.threads), '--seed', str(args.seed)]
+        if args.rate is not None:
+            command += ['--rate', str(args.rate)]
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip()[-2000:]}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    result["trace"] = args.trace or f"synthetic ({args.synthetic} requests, seed {args.seed})"
+    result["backend"] = args.backend
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='重放记录的 (或合成的) 请求序列，输出延迟分布 / 错误率 / 缓存命中率')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--trace', help='request_recorder 记录的日志 (BOM_RECORD=...)')
+    source.add_argument('--synthetic', type=int, default=2000, help='合成序列的请求数 (未指定 --trace 时)')
+    parser.add_argument('--save-trace', help='合成序列同时保存到该文件')
+    parser.add_argument('--library', help='重放用的 components.json (复制一份，不会被修改)；默认生成合成库')
+    parser.add_argument('--size', type=int, default=5000, help='合成库的元件数')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--mode', choices=('original', 'speed', 'rate'), default='original')
+    parser.add_argument('--speed', type=float, default=1.0, help='--mode speed 的倍速')
+    parser.add_argument('--rate', type=float, help='--mode rate 的平均到达率 (请求/秒)')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.mode == 'rate' and not args.rate:
+        parser.error('--mode rate 需要 --rate')
+    if args.mode == 'speed' and args.speed <= 0:
+        parser.error('--speed 必须 > 0')
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.worker:
+        print(json.dumps(worker(args), ensure_ascii=False))
+        sys.exit(0)
+
+    text = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,102 @@
+'''
+Description: 请求记录中间件 (可选)。把 /lightup 和 /api/* 请求连同时间戳追加到一个紧凑的日志文件中，
+    之后用 replay.py 在本地按原速 / N 倍速 / 指定到达率重放，复现一整个装配班次的负载。
+
+    日志每行一个 JSON (键名尽量短):
+        {"t": 1760000000.123, "m": "GET", "p": "/lightup", "q": "part_number=...", "s": 200, "ms": 0.41}
+        {"t": ..., "m": "POST", "p": "/api/add", "ct": "application/json", "b": "{...}", "s": 200, "ms": 2.3}
+      t  请求到达的时间 (time.time())      q  查询串 (没有时省略)
+      b  请求体 (文本，超过 RECORD_MAX_BODY 时只记录长度 bl)    ct 请求体的 Content-Type
+      s  响应状态码                          ms 处理耗时 (到返回响应为止，流式响应不含发送时间)
+    文件以 O_APPEND 打开，每条记录一次 write，多个 worker 进程可以写同一个文件。
+
+    用法:
+        BOM_RECORD=shift.jsonl python bom_app.py
+        python replay.py --trace shift.jsonl --mode speed --speed 4
+'''
+import io
+import json
+import os
+import time
+
+# --- 配置 ---
+RECORD_PATH = os.environ.get('BOM_RECORD', '')  # 设置后由 bom_app.create_app 启用记录
+RECORD_PREFIXES = ('/lightup', '/api/')
+RECORD_MAX_BODY = 64 * 1024  # 更大的请求体 (例如整份导入文件) 只记录长度
+# --- ---
+
+
+class RequestRecorder:
+    """WSGI 中间件: app.wsgi_app = RequestRecorder(app.wsgi_app, 'shift.jsonl')"""
+
+    def __init__(self, app, path, prefixes=RECORD_PREFIXES, max_body=RECORD_MAX_BODY):
+        self.app = app
+        self.path = path
+        self.prefixes = tuple(prefixes)
+        self.max_body = max_body
+        self.recorded = 0
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefixes):
+            return self.app(environ, start_response)
+
+        record = {"t": time.time(), "m": environ.get('REQUEST_METHOD', 'GET'), "p": path}
+        query = environ.get('QUERY_STRING')
+        if query:
+            record["q"] = query
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length:
+            if environ.get('CONTENT_TYPE'):
+                record["ct"] = environ['CONTENT_TYPE']
+            if length <= self.max_body:
+                # 读出请求体后换成 BytesIO 交给应用，应用读到的内容不变
+                body = environ['wsgi.input'].read(length)
+                environ['wsgi.input'] = io.BytesIO(body)
+                record["b"] = body.decode('utf-8', errors='replace')
+            else:
+                record["bl"] = length
+
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line[:3]))
+            return start_response(status_line, headers, exc_info)
+
+        start = time.perf_counter()
+        try:
+            return self.app(environ, recording_start_response)
+        finally:
+            record["s"] = status[0] if status else 500
+            record["ms"] = round((time.perf_counter() - start) * 1e3, 3)
+            self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            os.write(self._fd, line.encode('utf-8'))
+            self.recorded += 1
+        except OSError:
+            pass  # 记录失败 (磁盘满等) 不影响请求本身
+
+    def close(self):
+        os.close(self._fd)
+
+
+def read_trace(path):
+    """读取记录的日志，按时间排序；忽略不完整的行 (例如进程被杀时写了一半)"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'p' in record and 't' in record:
+                records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,331 @@
+'''
+Description: 服务器端串口桥 (可选)。
+    由 Python 服务器常驻持有主控 ESP32 的串口，不再依赖浏览器的 Web Serial:
+      - 后台写线程 + 有界队列，/lightup 只负责入队，不等待串口写完；
+      - 同一个盒子的旧命令还没发出去就被新命令覆盖 (从控一次只点亮一颗灯，旧命令已经没有意义)；
+      - 每条命令发出后读取主控的回显，直到 "ESP-NOW 发送状态: 成功/失败" 或错误行，
+        据此判断是否送达 (一次只有一条命令在途，回显不会错配)；
+      - 写入失败时关闭串口、退避重连并重试。
+
+    串口协议与 Software/src/main.cpp (FIRMWARE_IS_MASTER) 一致:
+        电脑 -> 主控: "box_id:1,led_id:66\\n"
+        主控 -> 电脑: "收到串口命令: ..." / "  转发命令给 盒子 1 ..." / "  ESP-NOW 发送状态: 成功"
+    可以用 fake_master.py (基于 pty 的主控模拟) 在没有硬件的情况下测试。
+
+    pyserial 是可选依赖；没有安装时在 POSIX 系统上直接用 termios 打开串口设备。
+'''
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import serial  # pyserial (可选)
+except ImportError:
+    serial = None
+
+# --- 配置 ---
+DEFAULT_BAUDRATE = 115200
+QUEUE_SIZE = 32         # 最多排队的盒子数 (同一盒子的命令会合并)
+ACK_TIMEOUT = 1.0       # 等待主控回显 "ESP-NOW 发送状态" 的秒数
+RETRIES = 2             # 串口写入失败后的重试次数
+RECONNECT_DELAYS = (0.2, 0.5, 1.0, 2.0, 5.0)  # 重连退避 (秒)
+# --- ---
+
+# 主控回显中的关键字
+ACK_PREFIX = 'ESP-NOW 发送状态:'
+ACK_SUCCESS = '成功'
+SEND_ERROR = 'ESP-NOW 发送错误'
+ERROR_PREFIX = '错误:'
+
+# 送达状态
+PENDING = 'pending'
+DELIVERED = 'delivered'      # 主控回显 "发送状态: 成功" (从控已确认收到)
+FAILED = 'failed'            # 主控回显 "发送状态: 失败" 或 "发送错误"
+REJECTED = 'rejected'        # 主控拒绝命令 (盒子 ID 无效 / 格式错误)
+TIMEOUT = 'timeout'          # 在 ACK_TIMEOUT 内没有收到回显
+SUPERSEDED = 'superseded'    # 还没发出就被同一盒子的新命令覆盖
+DROPPED = 'dropped'          # 队列已满被丢弃，或桥已关闭
+PORT_ERROR = 'port_error'    # 串口打不开 / 写入失败且重试用尽
+
+
+def format_command(box_id, led_id):
+    return f"box_id:{box_id},led_id:{led_id}\n".encode('ascii')
+
+
+class Delivery:
+    """一条命令的送达结果；wait() 阻塞到有结果或超时"""
+
+    def __init__(self, box_id, led_id):
+        self.box_id = box_id
+        self.led_id = led_id
+        self.status = PENDING
+        self.message = ''
+        self.created = time.monotonic()
+        self.completed = None
+        self._event = threading.Event()
+
+    def resolve(self, status, message=''):
+        if self._event.is_set():
+            return
+        self.status = status
+        self.message = message
+        self.completed = time.monotonic()
+        self._event.set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self.status
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def to_dict(self):
+        result = {"status": self.status, "box_id": self.box_id, "led_id": self.led_id}
+        if self.message:
+            result["message"] = self.message
+        if self.completed is not None:
+            result["latency_ms"] = round((self.completed - self.created) * 1e3, 2)
+        return result
+
+
+# --- 串口 ---
+class _PosixPort:
+    """
+    没有 pyserial 时使用的最小串口实现 (也适用于 pty)。
+    只提供 SerialBridge 需要的接口: write / readline / reset_input_buffer / close。
+    """
+
+    def __init__(self, path, baudrate=DEFAULT_BAUDRATE, timeout=ACK_TIMEOUT):
+        import termios
+        import tty
+        self.timeout = timeout
+        self._buffer = b''
+        self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(self._fd)
+            attrs = termios.tcgetattr(self._fd)
+            speed = getattr(termios, f'B{baudrate}', None)
+            if speed is not None:
+                attrs[4] = attrs[5] = speed
+            termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        except termios.error:
+            pass  # 某些伪终端不支持设置波特率
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def write(self, data):
+        import select
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except BlockingIOError:
+                select.select([], [self._fd], [], self.timeout)
+                continue
+            view = view[written:]
+        return len(data)
+
+    def readline(self):
+        """读取一行 (含 \\n)；超时返回已读到的部分 (可能为 b'')"""
+        import select
+        deadline = time.monotonic() + self.timeout
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                line, self._buffer = self._buffer, b''
+                return line
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self._fd, 4096)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                raise OSError("串口已关闭")
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line + b'\n'
+
+    def reset_input_buffer(self):
+        self._buffer = b''
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    return
+            except (BlockingIOError, OSError):
+                return
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def open_port(path, baudrate=DEFAULT_BAUDRATE, timeout=ACK_TIMEOUT):
+    """打开串口：优先使用 pyserial"""
+    if serial is not None:
+        return serial.Serial(path, baudrate, timeout=timeout)
+    return _PosixPort(path, baudrate, timeout)
+
+
+# --- 串口桥 ---
+class SerialBridge:
+    """
+    用法:
+        bridge = SerialBridge('/dev/ttyUSB0')
+        delivery = bridge.send(box_id, led_id)   # 入队后立即返回 (第一次调用时启动后台线程)
+        delivery.wait(0.5)                       # 可选：等待主控回显
+        bridge.close()
+    """
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, queue_size=QUEUE_SIZE, ack_timeout=ACK_TIMEOUT,
+                 retries=RETRIES, opener=open_port):
+        self.port_name = port
+        self.baudrate = baudrate
+        self.queue_size = queue_size
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self._opener = opener
+        self._port = None
+        self._pending = OrderedDict()  # box_id -> Delivery (待发送，按入队顺序)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # 后台线程和请求线程都会更新，读写都在 self._cond 的锁内 (读取用 stats())
+        self._counters = {status: 0 for status in (DELIVERED, FAILED, REJECTED, TIMEOUT,
+                                                   SUPERSEDED, DROPPED, PORT_ERROR)}
+        self._counters['sent'] = 0
+        self._counters['reconnects'] = 0
+
+    # --- 入队 ---
+    def send(self, box_id, led_id):
+        delivery = Delivery(box_id, led_id)
+        with self._cond:
+            if self._closed:
+                self._finish(delivery, DROPPED, "串口桥已关闭")
+                return delivery
+            self._ensure_thread()
+            previous = self._pending.pop(box_id, None)
+            if previous is not None:
+                self._finish(previous, SUPERSEDED, f"被新命令 LED {led_id} 覆盖")
+            elif len(self._pending) >= self.queue_size:
+                _, oldest = self._pending.popitem(last=False)
+                self._finish(oldest, DROPPED, "队列已满")
+            self._pending[box_id] = delivery
+            self._cond.notify()
+        return delivery
+
+    def _ensure_thread(self):
+        # 延迟到第一次发送时才打开串口：debug 模式下 reloader 的父进程不会占用串口
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='serial-bridge', daemon=True)
+            self._thread.start()
+
+    def _finish(self, delivery, status, message=''):
+        self._count(status)
+        delivery.resolve(status, message)
+
+    def _count(self, name):
+        with self._cond:  # 可重入: send() 持有锁时也会调用
+            self._counters[name] += 1
+
+    @property
+    def connected(self):
+        return self._port is not None
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._counters, queued=len(self._pending), connected=self.connected)
+
+    # --- 后台线程 ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                _, delivery = self._pending.popitem(last=False)
+            self._deliver(delivery)
+        self._close_port()
+
+    def _deliver(self, delivery):
+        command = format_command(delivery.box_id, delivery.led_id)
+        for attempt in range(self.retries + 1):
+            if self._closed:
+                break
+            if not self._connect(attempt):
+                continue
+            try:
+                self._port.reset_input_buffer()  # 丢掉上一条命令之后的迟到回显 / 启动信息
+                self._port.write(command)
+                self._count('sent')
+                status, message = self._read_ack()
+            except (OSError, ValueError) as e:
+                # pyserial 的 SerialException 是 OSError 的子类
+                self._close_port()
+                if attempt == self.retries:
+                    self._finish(delivery, PORT_ERROR, f"串口写入失败: {e}")
+                    return
+                continue
+            self._finish(delivery, status, message)
+            return
+        if self._closed:
+            self._finish(delivery, DROPPED, "串口桥已关闭")
+        else:
+            self._finish(delivery, PORT_ERROR, f"无法打开串口 {self.port_name}")
+
+    def _connect(self, attempt):
+        if self._port is not None:
+            return True
+        if attempt:
+            time.sleep(RECONNECT_DELAYS[min(attempt - 1, len(RECONNECT_DELAYS) - 1)])
+        try:
+            self._port = self._opener(self.port_name, self.baudrate, self.ack_timeout)
+        except (OSError, ValueError):
+            return False
+        self._count('reconnects')
+        return True
+
+    def _read_ack(self):
+        """读取主控回显，直到得到本条命令的结果"""
+        deadline = time.monotonic() + self.ack_timeout
+        while time.monotonic() < deadline:
+            line = self._port.readline().decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            if line.startswith(ACK_PREFIX):
+                result = line[len(ACK_PREFIX):].strip()
+                return (DELIVERED if result == ACK_SUCCESS else FAILED), line
+            if line.startswith(SEND_ERROR):
+                return FAILED, line
+            if line.startswith(ERROR_PREFIX):
+                return REJECTED, line
+        return TIMEOUT, f"{self.ack_timeout:g} 秒内没有收到主控回显"
+
+    def _close_port(self):
+        if self._port is not None:
+            try:
+                self._port.close()
+            except OSError:
+                pass
+            self._port = None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for delivery in self._pending.values():
+                self._finish(delivery, DROPPED, "串口桥已关闭")
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.ack_timeout * 2)
+        self._close_port()
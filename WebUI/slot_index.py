@@ -0,0 +1,113 @@
+'''
+Description: 料盒位置 (box_id, led_id) 的占用索引。
+    反向索引 (box_id, led_id) -> 元件 key，加上每个料盒一个 81 位的占用位图 (Python int)。
+    添加 / 删除时增量维护；"下一个空位" 用位运算取最低的 0 位，不需要扫描元件列表。
+'''
+import threading
+
+from component_io import LEDS_PER_BOX
+
+FULL_MASK = (1 << LEDS_PER_BOX) - 1
+
+
+def slot_of(details):
+    """details -> (box_id, led_id)；不是有效位置 (非整数 / 超出范围) 时返回 None"""
+    box_id = details.get('box_id') if isinstance(details, dict) else None
+    led_id = details.get('led_id') if isinstance(details, dict) else None
+    if type(box_id) is not int or type(led_id) is not int:
+        return None
+    if box_id < 1 or not 1 <= led_id <= LEDS_PER_BOX:
+        return None
+    return box_id, led_id
+
+
+class SlotIndex:
+    """
+    用法:
+        slots = SlotIndex(store.all())
+        slots.owner(1, 5)          # -> 'C29DF' 或 None
+        slots.next_free(1)         # -> 1 号料盒中编号最小的空位，料盒已满时为 None
+        slots.add(key, details) / slots.remove(key, details)
+
+    历史数据中同一位置可能有多个元件，locate() 返回全部 key，owner() 返回最早的一个。
+    """
+
+    def __init__(self, components=None):
+        self._lock = threading.Lock()
+        self.rebuild(components or {})
+
+    def rebuild(self, components):
+        with self._lock:
+            self._owners = {}   # (box_id, led_id) -> [key, ...]
+            self._bitmaps = {}  # box_id -> 占用位图，第 led_id - 1 位
+            for key, details in components.items():
+                self._add(key, details)
+
+    def _add(self, key, details):
+        slot = slot_of(details)
+        if slot is None:
+            return
+        owners = self._owners.setdefault(slot, [])
+        if key not in owners:
+            owners.append(key)
+        box_id, led_id = slot
+        self._bitmaps[box_id] = self._bitmaps.get(box_id, 0) | (1 << (led_id - 1))
+
+    def add(self, key, details):
+        with self._lock:
+            self._add(key, details)
+
+    def remove(self, key, details):
+        slot = slot_of(details)
+        if slot is None:
+            return
+        with self._lock:
+            owners = self._owners.get(slot)
+            if not owners or key not in owners:
+                return
+            owners.remove(key)
+            if owners:
+                return
+            del self._owners[slot]
+            box_id, led_id = slot
+            bitmap = self._bitmaps[box_id] & ~(1 << (led_id - 1))
+            if bitmap:
+                self._bitmaps[box_id] = bitmap
+            else:
+                del self._bitmaps[box_id]
+
+    # --- 查询 ---
+    def locate(self, box_id, led_id):
+        """该位置上的全部元件 key"""
+        return list(self._owners.get((box_id, led_id), ()))
+
+    def owner(self, box_id, led_id):
+        owners = self._owners.get((box_id, led_id))
+        return owners[0] if owners else None
+
+    def occupied(self, box_id):
+        """料盒中已占用的位置数"""
+        return bin(self._bitmaps.get(box_id, 0)).count('1')
+
+    def next_free(self, box_id):
+        """料盒中编号最小的空位 (1..81)；料盒已满时返回 None"""
+        free = ~self._bitmaps.get(box_id, 0) & FULL_MASK
+        if not free:
+            return None
+        return (free & -free).bit_length()
+
+    def first_free(self, start_box=1):
+        """从 start_box 开始第一个有空位的 (box_id, led_id)"""
+        box_id = max(start_box, 1)
+        while True:
+            led_id = self.next_free(box_id)
+            if led_id is not None:
+                return box_id, led_id
+            box_id += 1
+
+    def boxes(self):
+        """{box_id: 已占用数}"""
+        return {box_id: bin(bitmap).count('1') for box_id, bitmap in sorted(self._bitmaps.items())}
+
+    def __len__(self):
+        return len(self._owners)
@@ -0,0 +1,318 @@
+'''
+Description: SQLite 存储后端 (WAL 模式)。
+    表 components(key, box_id, led_id, parameter, voltage, footprint, ...)，
+    并对 归一化参数、归一化封装、(box_id, led_id) 建立索引 (供直接用 SQL 查看数据时使用)。
+    WAL 模式下元件管理器写入的同时，查询服务器可以并发读取。
+    搜索不在 SQL 中进行: 与 JSON 后端一样，library.Library 把整张表读入内存中的 ComponentIndex，
+    打分规则 (含容错信号) 只有这一份实现。
+
+    导入/导出 components.json:
+        python sqlite_store.py import components.json components.db
+        python sqlite_store.py export components.db components.json
+'''
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from value_parser import parse_value
+from component_io import export_chunks
+from component_store import (CHANGE_LOG_SIZE, JSON_FILE, SQLITE_FILE, ComponentStore, load_components_file,
+                             parse_revision_token, versioned, without_initial_version)
+
+# details 中有独立列的字段 (按 components.json 中的顺序)；其余字段存到 extra (JSON)
+COLUMNS = ('box_id', 'led_id', 'parameter', 'voltage', 'footprint', 'note', 'version')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS components (
+    key            TEXT PRIMARY KEY,
+    box_id         INTEGER,
+    led_id         INTEGER,
+    parameter      TEXT,
+    voltage        TEXT,
+    footprint      TEXT,
+    note           TEXT,
+    version        INTEGER,
+    extra          TEXT,
+    parameter_norm TEXT,
+    footprint_norm TEXT,
+    value_unit     TEXT,
+    value_magnitude REAL
+);
+CREATE INDEX IF NOT EXISTS idx_components_parameter_norm ON components(parameter_norm);
+CREATE INDEX IF NOT EXISTS idx_components_footprint_norm ON components(footprint_norm);
+CREATE INDEX IF NOT EXISTS idx_components_location ON components(box_id, led_id);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(name, value) VALUES ('revision', 0);
+INSERT OR IGNORE INTO meta(name, value) VALUES ('epoch', abs(random()) % 4294967296);
+CREATE TABLE IF NOT EXISTS changes (
+    revision INTEGER PRIMARY KEY,
+    key      TEXT NOT NULL
+);
+'''
+# 数值列可能由 _migrate 补上，所以这个索引在迁移之后再建
+VALUE_INDEX = 'CREATE INDEX IF NOT EXISTS idx_components_value ON components(value_unit, value_magnitude)'
+
+_SELECT = 'SELECT key, ' + ', '.join(COLUMNS) + ', extra FROM components'
+
+
+def _select_existing(conn):
+    """只读打开旧版本的数据库时不能迁移: 缺少的列读作 NULL"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(components)')}
+    return ('SELECT key, ' + ', '.join(name if name in existing else 'NULL' for name in COLUMNS) +
+            ', extra FROM components')
+
+
+def _norm(value):
+    """与 ComponentIndex 相同的归一化: 非空字段取大写，空字段为 NULL (不参与匹配)"""
+    return value.upper() if value else None
+
+
+def _row_to_details(row):
+    details = {}
+    for name, value in zip(COLUMNS, row[1:1 + len(COLUMNS)]):
+        if value is not None:
+            details[name] = value
+    extra = row[1 + len(COLUMNS)]
+    if extra:
+        details.update(json.loads(extra))
+    return row[0], details
+
+
+def _details_to_row(key, details):
+    extra = {name: value for name, value in details.items() if name not in COLUMNS}
+    value = parse_value(details.get('parameter'))
+    return (key,
+            *(details.get(name) for name in COLUMNS),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+            _norm(details.get('parameter')),
+            _norm(details.get('footprint')),
+            value.unit if value else None,
+            value.magnitude if value else None)
+
+
+# 写入时额外维护的列
+DERIVED_COLUMNS = ('extra', 'parameter_norm', 'footprint_norm', 'value_unit', 'value_magnitude')
+
+
+def _migrate(conn):
+    """旧版本创建的数据库没有版本列 / 数值列: 补上并回填"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(components)')}
+    if 'version' not in existing:
+        conn.execute('ALTER TABLE components ADD COLUMN version INTEGER')
+    if 'value_unit' in existing:
+        return
+    conn.execute('ALTER TABLE components ADD COLUMN value_unit TEXT')
+    conn.execute('ALTER TABLE components ADD COLUMN value_magnitude REAL')
+    rows = conn.execute('SELECT key, parameter FROM components').fetchall()
+    for key, parameter in rows:
+        value = parse_value(parameter)
+        if value is not None:
+            conn.execute('UPDATE components SET value_unit = ?, value_magnitude = ? WHERE key = ?',
+                         (value.unit, value.magnitude, key))
+
+
+class SqliteStore(ComponentStore):
+    """
+    每个线程一个连接；batch() 内的写入在同一个事务中提交。
+    readonly=True 时以 mode=ro 打开，不建表、不迁移、不切换日志模式，数据库文件保持原样。
+    """
+
+    def __init__(self, path=SQLITE_FILE, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        if readonly:
+            self._select = _select_existing(conn)
+        else:
+            self._select = _SELECT
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            conn.execute(VALUE_INDEX)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.readonly:
+                # 文件不存在时报错，而不是创建一个空数据库
+                conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True,
+                                       isolation_level=None, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    # --- 读取 ---
+    def __contains__(self, key):
+        return self._conn().execute('SELECT 1 FROM components WHERE key = ?', (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM components').fetchone()[0]
+
+    def get(self, key, default=None):
+        row = self._conn().execute(self._select + ' WHERE key = ?', (key,)).fetchone()
+        return _row_to_details(row)[1] if row else default
+
+    def all(self):
+        return dict(_row_to_details(row) for row in self._conn().execute(self._select + ' ORDER BY rowid'))
+
+    def signature(self):
+        return self._conn().execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()[0]
+
+    def _epoch_and_revision(self, conn):
+        meta = dict(conn.execute("SELECT name, value FROM meta WHERE name IN ('epoch', 'revision')"))
+        return meta['epoch'], meta['revision']
+
+    def revision_token(self):
+        epoch, revision = self._epoch_and_revision(self._conn())
+        return f"{epoch:x}-{revision}"
+
+    def changes_since(self, token):
+        conn = self._conn()
+        # 在一个读事务中取 revision 和变更，避免读到一半被写入
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            epoch, current = self._epoch_and_revision(conn)
+            revision = parse_revision_token(token, f"{epoch:x}")
+            if revision is None or revision > current:
+                return None
+            oldest = conn.execute('SELECT MIN(revision) FROM changes').fetchone()[0]
+            if oldest is None:
+                oldest = current + 1
+            if revision < oldest - 1:
+                return None
+            keys = [row[0] for row in conn.execute(
+                'SELECT key FROM changes WHERE revision > ? ORDER BY revision', (revision,))]
+            changed = {}
+            for key in keys:
+                row = conn.execute(self._select + ' WHERE key = ?', (key,)).fetchone()
+                changed[key] = _row_to_details(row)[1] if row else None
+            return changed
+        finally:
+            if own_transaction:
+                conn.execute('COMMIT')
+
+    # --- 写入 ---
+    @contextmanager
+    def batch(self):
+        """批次内的所有写入在一个 IMMEDIATE 事务中完成"""
+        if self.readonly:
+            raise RuntimeError("只读存储不能写入")
+        conn = self._conn()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute('COMMIT')
+
+    def _bump_revision(self, conn, key):
+        """revision +1 并记录变更 (与写入在同一事务中)，只保留最近 CHANGE_LOG_SIZE 条"""
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'revision'")
+        revision = conn.execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()[0]
+        conn.execute('INSERT INTO changes(revision, key) VALUES (?, ?)', (revision, key))
+        conn.execute('DELETE FROM changes WHERE revision <= ?', (revision - CHANGE_LOG_SIZE,))
+
+    def add(self, key, details):
+        with self.batch():
+            conn = self._conn()
+            details = versioned(details, self.get(key))
+            conn.execute(
+                'INSERT INTO components(key, ' + ', '.join(COLUMNS + DERIVED_COLUMNS) + ') '
+                'VALUES (' + ', '.join('?' * (1 + len(COLUMNS) + len(DERIVED_COLUMNS))) + ') '
+                'ON CONFLICT(key) DO UPDATE SET ' +
+                ', '.join(f'{name} = excluded.{name}' for name in COLUMNS + DERIVED_COLUMNS),
+                _details_to_row(key, details))
+            self._bump_revision(conn, key)
+            return details
+
+    def add_many(self, items):
+        with self.batch():
+            return [(key, self.add(key, details)) for key, details in items]
+
+    def iter_items(self):
+        # 单独的游标逐行读取，不把整个表读进内存
+        for row in self._conn().execute(self._select + ' ORDER BY rowid'):
+            yield _row_to_details(row)
+
+    def delete(self, key):
+        with self.batch():
+            conn = self._conn()
+            if conn.execute('DELETE FROM components WHERE key = ?', (key,)).rowcount == 0:
+                return False
+            self._bump_revision(conn, key)
+            return True
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+# --- 导入 / 导出 ---
+def import_json(json_path=JSON_FILE, db_path=SQLITE_FILE):
+    """把 components.json (含未压缩的日志) 导入 SQLite，返回导入条数"""
+    data = load_components_file(json_path)
+    with SqliteStore(db_path) as store:
+        store.add_many(data.items())
+    return len(data)
+
+
+def export_json(db_path=SQLITE_FILE, json_path=JSON_FILE):
+    """
+    把 SQLite 中的元件导出为 components.json 格式 (临时文件 + 原子 rename)，返回导出条数。
+    与 JournalStore 压缩时写出的格式相同 (初始版本不写出，见 component_store.without_initial_version)。
+    """
+    tmp_path = json_path + '.tmp'
+    with SqliteStore(db_path, readonly=True) as store:
+        count = len(store)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for chunk in export_chunks(without_initial_version(store.iter_items()), 'json'):
+                f.write(chunk)
+    os.replace(tmp_path, json_path)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='components.json <-> SQLite 导入/导出')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_import = sub.add_parser('import', help='components.json -> SQLite')
+    p_import.add_argument('json_path', nargs='?', default=JSON_FILE)
+    p_import.add_argument('db_path', nargs='?', default=SQLITE_FILE)
+    p_export = sub.add_parser('export', help='SQLite -> components.json')
+    p_export.add_argument('db_path', nargs='?', default=SQLITE_FILE)
+    p_export.add_argument('json_path', nargs='?', default=JSON_FILE)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        count = import_json(args.json_path, args.db_path)
+        print(f"已导入 {count} 条元件: {args.json_path} -> {args.db_path}")
+    else:
+        count = export_json(args.db_path, args.json_path)
+        print(f"已导出 {count} 条元件: {args.db_path} -> {args.json_path}")
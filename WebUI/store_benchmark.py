@@ -0,0 +1,140 @@
+'''
+Description: 元件表内存占用与全表扫描耗时: "字典的字典" (components.json 原样加载) vs 列式 CompactComponents。
+    每个 (库规模, 表示方式) 在独立的子进程中运行:
+      - 内存: tracemalloc 统计的表本身占用 (不含生成数据和 JSON 文本)，以及 RSS 增量
+              (RSS 包含 json.loads 临时字典的峰值，Python 分配器不一定把释放的页还给系统)
+      - 扫描: 对全部元件逐个打分 (score_component / 按词表编码缓存的 score_parameter + score_footprint)，
+              每条查询的耗时 p50 / p99
+    输出 JSON。
+
+    用法:
+        python store_benchmark.py --sizes 100000 1000000
+'''
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmark import current_rss_kb, generate_library, generate_queries, percentile
+from compact_store import CompactComponents
+from component_index import (SCORE_THRESHOLD, normalize_query, score_component, score_footprint,
+                             score_parameter)
+from value_parser import parse_value
+
+REPRESENTATIONS = ('dict', 'compact')
+
+
+def scan_dict(db, parsed, query):
+    part_number_upper, input_parameter_upper, normalized_input_footprint, input_value = query
+    matches = 0
+    for key, data in db.items():
+        score, _ = score_component(data, input_parameter_upper, part_number_upper, normalized_input_footprint,
+                                   input_value, parsed.get(key))
+        if score > SCORE_THRESHOLD:
+            matches += 1
+    return matches
+
+
+def scan_compact(db, query):
+    part_number_upper, input_parameter_upper, normalized_input_footprint, input_value = query
+    param_codes, param_terms = db.param_codes, db.parameters.terms
+    footprint_codes, footprint_terms = db.footprint_codes, db.footprints.terms
+    # 词表很小: 先给每个词打分，再按行累加
+    param_scores = [0] + [score_parameter(term.text, term.upper, input_parameter_upper, part_number_upper,
+                                          input_value, term.value)[0] for term in param_terms[1:]]
+    footprint_scores = [0] + [score_footprint(term.text, term.upper, normalized_input_footprint)[0]
+                              for term in footprint_terms[1:]]
+    matches = 0
+    for _, row in db.rows():
+        if param_scores[param_codes[row]] + footprint_scores[footprint_codes[row]] > SCORE_THRESHOLD:
+            matches += 1
+    return matches
+
+
+def run(size, representation, queries, seed):
+    library = generate_library(size, seed)
+    query_list = [normalize_query(*query) for query in generate_queries(library, queries, seed + 1)]
+    text = json.dumps(library)
+    del library
+    gc.collect()
+
+    rss_before = current_rss_kb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if representation == 'dict':
+        db = json.loads(text)
+        # 与原 ComponentIndex 相同: 数值参数在加载时解析一次
+        parsed = {key: value for key, value in ((key, parse_value(data['parameter']))
+                                                 for key, data in db.items() if data.get('parameter'))
+                  if value is not None}
+    else:
+        db = CompactComponents(json.loads(text).items())
+        parsed = None
+    load_seconds = time.perf_counter() - start
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del text
+    gc.collect()
+    rss_after = current_rss_kb()
+
+    latencies = []
+    matches = 0
+    for query in query_list:
+        start = time.perf_counter()
+        if representation == 'dict':
+            matches += scan_dict(db, parsed, query)
+        else:
+            matches += scan_compact(db, query)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "size": size,
+        "representation": representation,
+        "load_seconds": load_seconds,
+        "table_bytes": traced,
+        "bytes_per_part": traced / size,
+        "rss_delta_kb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "scan_ms": {
+            "p50": percentile(latencies, 0.50) * 1e3,
+            "p99": percentile(latencies, 0.99) * 1e3,
+            "mean": sum(latencies) / len(latencies) * 1e3
+        },
+        "matches": matches
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='元件表内存 / 扫描耗时对比 (dict vs CompactComponents)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=20, help='每个规模的全表扫描查询数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    parser.add_argument('--worker', nargs=2, metavar=('SIZE', 'REPRESENTATION'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run(int(args.worker[0]), args.worker[1], args.queries, args.seed)))
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        for representation in REPRESENTATIONS:
+            print(f"  {size} 条 / {representation} ...", file=sys.stderr)
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                                        representation, '--queries', str(args.queries), '--seed', str(args.seed)],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                results.append({"size": size, "representation": representation,
+                                "error": completed.stderr.strip()[-2000:]})
+            else:
+                results.append(json.loads(completed.stdout))
+    text = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
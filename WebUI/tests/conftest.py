@@ -0,0 +1,27 @@
+import json
+import os
+import sys
+
+import pytest
+
+# WebUI 中的模块是平铺的脚本，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('BOM_EVENTS_PORT', '0')
+    monkeypatch.setenv('BOM_WARM_INTERVAL', '0')
+    (tmp_path / 'components.json').write_text(json.dumps({
+        "BASE": {"box_id": 1, "led_id": 1, "parameter": "10K", "voltage": "", "footprint": "0402"}}))
+    import bom_app
+    from library import shared_library
+
+    library = shared_library()
+    library.store = None  # 在临时目录中重新打开存储后端
+    app = bom_app.create_app()
+    library.ready.wait()
+    yield app
+    library.close()
+    library.store = None
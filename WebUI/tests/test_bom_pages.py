@@ -0,0 +1,75 @@
+import os
+import shutil
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'lceda_ibom_export.html')
+
+
+def test_library_writes_rebuild_only_the_lookup_table(app, tmp_path):
+    import DanymicBomServer as server
+
+    os.makedirs(tmp_path / 'boms')
+    shutil.copy(FIXTURE, tmp_path / 'boms' / 'board.html')
+    server.bom_page_cache.clear()
+    server.bom_lookup_cache.clear()
+    client = app.test_client()
+
+    page = client.get('/bom/board')
+    assert page.status_code == 200
+    assert b'<script id="bom-lookup" src="/bom/board/lookup.js">' in page.data
+    assert b'\\u5C01\\u88C5' in page.data  # console.log 已修改 (加上了封装)
+    table = client.get('/bom/board/lookup.js')
+    assert table.mimetype == 'text/javascript'
+    assert b'KT-0603R' not in table.data
+    resolved = client.get('/boms').get_json()['boms'][0]['resolved']
+
+    details = {"box_id": 3, "led_id": 4, "parameter": "红色", "voltage": "", "footprint": "LED0603-RD"}
+    assert client.post('/api/add', json={"component_name": "KT-0603R", "details": details}).status_code == 200
+    builds = server.bom_page_cache.builds
+
+    # 页面没有变化 (同一个 ETag)，只有查找表重新构建
+    assert client.get('/bom/board', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+    table = client.get('/bom/board/lookup.js')
+    assert '"KT-0603R|红色|LED0603-RD":[3,4,null,"KT-0603R"]' in table.get_data(as_text=True)
+    assert server.bom_page_cache.builds == builds
+    summary = client.get('/boms').get_json()['boms'][0]
+    assert summary['resolved'] == resolved + 1 and summary['stats_fresh'] and summary['fresh']
+
+
+def test_cached_page_etag_gzip_and_304(app, tmp_path):
+    import gzip
+
+    import DanymicBomServer as server
+    from library import shared_library
+
+    shutil.copy(FIXTURE, tmp_path / 'InteractiveBOM.html')
+    server.bom_page_cache.clear()
+    server.bom_lookup_cache.clear()
+    client = app.test_client()
+
+    plain = client.get('/')
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    zipped = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip' and zipped.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(zipped.data) == plain.data
+    etag = plain.headers['ETag']
+    assert zipped.headers['ETag'] == etag
+    not_modified = client.get('/', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    builds = server.bom_page_cache.builds
+
+    # 元件库写入: 页面不变，查找表得到新的 ETag
+    table_etag = client.get('/lookup.js').headers['ETag']
+    shared_library().add("KT-0603R", {"box_id": 3, "led_id": 4, "parameter": "红色", "voltage": "",
+                                      "footprint": "LED0603-RD"})
+    assert client.get('/lookup.js', headers={'If-None-Match': table_etag}).status_code == 200
+    assert client.get('/lookup.js').headers['ETag'] != table_etag
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+    assert server.bom_page_cache.builds == builds
+
+    # BOM 文件变化: 重新构建一次，旧的 ETag 不再返回 304
+    with open(tmp_path / 'InteractiveBOM.html', 'a', encoding='utf-8') as f:
+        f.write('\n<!-- 重新导出 -->\n')
+    changed = client.get('/', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert '重新导出' in changed.get_data(as_text=True)
+    assert server.bom_page_cache.builds == builds + 1
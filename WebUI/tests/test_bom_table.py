@@ -0,0 +1,63 @@
+import json
+import os
+
+from bom_table import CONSOLE_LOG_BLOCK, BomRow, build_lookup_table, extract_rows
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+EXPECTED = [
+    BomRow('C1,C2,C5', 'CL05A104KA5NNNC', '100nF', 'C0402'),
+    BomRow('R3,R4', '0402WGF1002TCE', '10kΩ', 'R0402'),
+    BomRow('U1', 'STM32F103C8T6', 'STM32F103C8T6', 'LQFP-48_L7.0-W7.0-P0.50-LS9.0-BL'),
+    BomRow('D1', 'KT-0603R', '红色', 'LED0603-RD'),
+    BomRow('J1', '', '', 'HDR-TH_4P-P2.54-V-M'),
+]
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_embedded_rows_from_export():
+    # 导出页面没有静态的 <tr><td> 行，行只存在于内嵌数据中 (F / B 列表中重复的行只保留一次)
+    assert extract_rows(_fixture('lceda_ibom_export.html')) == EXPECTED
+
+
+def test_embedded_rows_from_compressed_export():
+    assert extract_rows(_fixture('lceda_ibom_export_compressed.html')) == EXPECTED
+
+
+def test_embedded_rows_from_json_parse_string():
+    page = _fixture('lceda_ibom_export.html')
+    start = page.index('var pcbdata = ') + len('var pcbdata = ')
+    end = page.index(';\nfunction highlight')
+    data = page[start:end]
+    double_quoted = page[:start] + 'JSON.parse(' + json.dumps(data) + ')' + page[end:]
+    single_quoted = page[:start] + "JSON.parse('" + data.replace("'", "\\'") + "')" + page[end:]
+    assert extract_rows(double_quoted) == EXPECTED
+    assert extract_rows(single_quoted) == EXPECTED
+
+
+def test_static_table_fallback():
+    page = ('<table><tr><th>编号</th></tr>'
+            '<tr><td>R1</td><td>RC0402</td><td>10k</td><td>R0402</td></tr>'
+            '<tr><td>C1</td><td><b>CL05</b></td><td>1uF</td><td>C0402</td><td>x</td></tr></table>')
+    assert extract_rows(page) == [BomRow('R1', 'RC0402', '10k', 'R0402'), BomRow('C1', 'CL05', '1uF', 'C0402')]
+
+
+def test_lookup_table_from_export():
+    located = {'CL05A104KA5NNNC': {"box_id": 1, "led_id": 7}, 'KT-0603R': {"box_id": 2, "led_id": 3}}
+
+    def resolve(part_number, parameter, footprint):
+        return part_number, located.get(part_number), None, []
+
+    table, stats = build_lookup_table(extract_rows(_fixture('lceda_ibom_export.html')), resolve)
+    assert table == {"CL05A104KA5NNNC|100nF|C0402": [1, 7, None, 'CL05A104KA5NNNC'],
+                     "KT-0603R|红色|LED0603-RD": [2, 3, None, 'KT-0603R']}
+    assert stats == {"rows": 5, "resolved": 2, "not_found": 3}
+
+
+def test_export_contains_console_log_block():
+    # build_bom_page 按原样查找这个代码块 (中文是 \uXXXX 转义)
+    assert CONSOLE_LOG_BLOCK in _fixture('lceda_ibom_export.html')
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from compact_store import CompactComponents
+
+
+def _details(i):
+    # 各字段都由同一个 i 决定，读到的 details 只要混入了另一次写入就能发现
+    return {"box_id": i, "led_id": i, "version": i, "parameter": f"P{i}", "voltage": "", "footprint": f"F{i}",
+            "note": f"N{i}"}
+
+
+def _consistent(details):
+    i = details["box_id"]
+    return details == _details(i)
+
+
+def test_overwrite_gets_new_row_and_moves_to_end():
+    components = CompactComponents([("A", _details(1)), ("B", _details(2))])
+    components.add("A", _details(3))
+    assert components["A"] == _details(3)
+    assert list(components) == ["B", "A"]
+    assert [key for key, _ in components.rows()] == ["B", "A"]
+    keys, _, _, _, extras = components.export_state()
+    assert keys == [None, "B", "A"]
+    assert set(extras) == {1, 2}
+
+
+def test_reads_while_adding_and_overwriting():
+    components = CompactComponents()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            components.add(f"K{i % 500}", _details(i))  # 前 500 次新增，之后反复覆盖
+            if i % 7 == 0:
+                components.remove(f"K{(i * 3) % 500}")
+
+    def reader():
+        while not stop.is_set():
+            for n in range(500):
+                try:
+                    details = components.get(f"K{n}")
+                except Exception as e:
+                    errors.append(repr(e))
+                    return
+                if details is not None and not _consistent(details):
+                    errors.append(f"torn read: {details}")
+                    return
+            try:
+                for key in components:
+                    components.get(key)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:3]
@@ -0,0 +1,25 @@
+from component_index import SCORE_THRESHOLD, TYPO_KEY_SCORES, ComponentIndex
+
+
+def _index():
+    return ComponentIndex({
+        "D2A2A": {"box_id": 1, "led_id": 5, "parameter": "10K", "voltage": "", "footprint": "0402"},
+        "Q7B3C": {"box_id": 2, "led_id": 9, "parameter": "100nF", "voltage": "", "footprint": "0603"},
+    })
+
+
+def _matched(matches):
+    return [match['part_number'] for match in matches]
+
+
+def test_key_typo_alone_does_not_match():
+    # 手输的 key 错了一个字符: 没有参数 / 封装佐证时不能确定就是 D2A2A
+    assert all(score <= SCORE_THRESHOLD for score in TYPO_KEY_SCORES.values())
+    assert _index().fuzzy_matches("D2A2B") == []
+
+
+def test_key_typo_with_parameter_or_footprint_matches():
+    index = _index()
+    assert _matched(index.fuzzy_matches("D2A2B", footprint="R0402")) == ["D2A2A"]
+    assert _matched(index.fuzzy_matches("D2A2B", parameter="10K")) == ["D2A2A"]
+    assert _matched(index.fuzzy_matches("D2A2B", footprint="0603")) == []
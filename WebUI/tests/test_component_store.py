@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+
+from component_store import JournalStore
+
+
+def test_compaction_leaves_initial_versions_out_of_components_json(tmp_path):
+    path = str(tmp_path / 'components.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"A": {"box_id": 1, "led_id": 1, "parameter": "10K", "voltage": "", "footprint": "0402"},
+                   "B": {"box_id": 1, "led_id": 2, "parameter": "1K", "voltage": "", "footprint": "0402"}}, f)
+    store = JournalStore(path)
+    assert store.get('A')['version'] == 1  # 没有记录版本的条目按初始版本读取
+    store.add('B', dict(store.get('B'), parameter='2K'))
+    store.add('C', {"box_id": 1, "led_id": 3, "parameter": "3K", "voltage": "", "footprint": "0402"})
+    store.compact()
+    store.close()
+
+    with open(path, encoding='utf-8') as f:
+        written = json.load(f)
+    assert 'version' not in written['A'] and 'version' not in written['C']
+    assert written['B']['version'] == 2
+
+    store = JournalStore(path)
+    assert [store.get(key)['version'] for key in 'ABC'] == [1, 2, 1]
+    store.close()
+
+
+WORKER = '''
+import sys
+from component_store import JournalStore
+
+store = JournalStore(sys.argv[1], compact_every=50)
+for _ in range(int(sys.argv[2])):
+    # 读取 + 写回在同一个批次 (文件锁) 内，其他进程的写入在批次开始时读入
+    with store.batch():
+        details = store.get('COUNTER')
+        store.add('COUNTER', dict(details, note=str(int(details['note']) + 1)))
+store.close()
+'''
+
+
+def test_two_processes_increment_under_the_file_lock(tmp_path):
+    path = str(tmp_path / 'components.json')
+    store = JournalStore(path)
+    store.add('COUNTER', {"box_id": 1, "led_id": 1, "parameter": "", "voltage": "", "footprint": "", "note": "0"})
+    store.close()
+
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, path, '200'], env=env) for _ in range(2)]
+    assert [worker.wait(60) for worker in workers] == [0, 0]
+
+    store = JournalStore(path)
+    details = store.get('COUNTER')
+    store.close()
+    assert details['note'] == '400'  # 没有丢失的更新
+    assert details['version'] == 401
@@ -0,0 +1,87 @@
+import pytest
+
+from frame_sim import DEFAULT_COLOR, check, make_system
+from led_frame import (ESPNOW_MAX_PAYLOAD, FLAG_CLEAR, HEADER, LEGACY_MESSAGE_SIZE, FrameDecoder, FrameError,
+                       LedCommand, decode_espnow, decode_frame, encode_espnow, encode_frame, encode_legacy_message,
+                       encode_text, frame_commands, group_commands)
+
+COMMANDS = [LedCommand(1, 66, 255, 255, 255), LedCommand(3, 0, 1, 2, 3), LedCommand(1, 5, 9, 8, 7),
+            LedCommand(1, 66, 0, 0, 255)]  # 同一颗灯以最后一次为准
+
+
+def test_frame_round_trip():
+    frame = decode_frame(encode_frame(COMMANDS))
+    assert frame.flags == FLAG_CLEAR
+    assert frame.groups == group_commands(COMMANDS)
+    assert frame_commands(frame) == [LedCommand(1, 66, 0, 0, 255), LedCommand(1, 5, 9, 8, 7),
+                                     LedCommand(3, 0, 1, 2, 3)]
+    assert decode_frame(encode_frame(COMMANDS, clear=False)).flags == 0
+
+
+def test_random_round_trips_and_corruption():
+    # 与 frame_sim.py --check 相同的随机测试
+    assert check(200, seed=1) == []
+
+
+def test_espnow_packets_split_and_round_trip():
+    entries = [(led_id, led_id, 0, 255 - led_id) for led_id in range(81)]
+    packets = encode_espnow(entries)
+    assert len(packets) > 1 and all(len(packet) <= ESPNOW_MAX_PAYLOAD for packet in packets)
+    decoded = [decode_espnow(packet) for packet in packets]
+    assert [flags for flags, _ in decoded] == [FLAG_CLEAR] + [0] * (len(packets) - 1)
+    assert [entry for _, chunk in decoded for entry in chunk] == entries
+
+
+@pytest.mark.parametrize('mutate, message', [
+    (lambda data: data[:-1], "长度不符"),
+    (lambda data: data + b'\x00', "长度不符"),
+    (lambda data: data[:3], "帧太短"),
+    (lambda data: data[:-2] + bytes([data[-2] ^ 0xFF, data[-1]]), "CRC 校验失败"),
+    (lambda data: data[:HEADER.size] + bytes([data[HEADER.size] ^ 0x01]) + data[HEADER.size + 1:], "CRC 校验失败"),
+    (lambda data: b'\x5A\xA5' + data[2:], "同步字错误"),
+])
+def test_damaged_frames_raise(mutate, message):
+    with pytest.raises(FrameError, match=message):
+        decode_frame(mutate(encode_frame(COMMANDS)))
+
+
+def test_bad_values_raise():
+    with pytest.raises(FrameError):
+        encode_frame([LedCommand(256, 1, 0, 0, 0)])
+    with pytest.raises(FrameError):
+        encode_frame([LedCommand(1, 1, 0, 300, 0)])
+    with pytest.raises(FrameError, match="长度与条目数不符"):
+        decode_espnow(encode_espnow([(1, 2, 3, 4)])[0] + b'\x00')
+
+
+def test_decoder_resyncs_after_a_damaged_frame():
+    good = encode_frame(COMMANDS)
+    damaged = bytearray(good)
+    damaged[-1] ^= 0xFF
+    decoder = FrameDecoder()
+    frames = []
+    for byte in bytes(damaged) + good:  # 逐字节喂入
+        frames += decoder.feed(bytes([byte]))
+    frames += decoder.idle()
+    assert [frame.groups for frame in frames] == [group_commands(COMMANDS)]
+    assert decoder.errors >= 1
+
+
+def test_legacy_text_and_messages_still_work():
+    # 旧的文本命令与二进制帧混在同一串口字节流中，按顺序执行
+    master, slaves = make_system(3)
+    master.receive_serial(encode_text([LedCommand(2, 7, 0, 0, 0)]) +
+                          encode_frame([LedCommand(1, 4, 10, 20, 30)]) + b'box_id:9,led_id:1\n')
+    assert slaves[2].lit() == {7: DEFAULT_COLOR}
+    assert slaves[1].lit() == {4: (10, 20, 30)}
+    assert master.rejected == 1  # 盒子 9 不在路由表中
+    assert master.decoder.text == bytearray()  # 文本交给 on_text，不会累积
+
+    # 旧的 struct_message 固定 8 字节，批量包的长度 3 + 4n 永远不会与之相同
+    assert len(encode_legacy_message(7, 255, 255, 255)) == LEGACY_MESSAGE_SIZE
+    assert all(len(packet) != LEGACY_MESSAGE_SIZE
+               for count in range(20) for packet in encode_espnow([(1, 0, 0, 0)] * count))
+    slaves[2].receive(encode_legacy_message(3, 1, 1, 1))  # 先熄灭其他灯再点亮一颗
+    assert slaves[2].lit() == {3: (1, 1, 1)}
+    slaves[2].receive(encode_legacy_message(-1, 0, 0, 0))
+    assert slaves[2].lit() == {}
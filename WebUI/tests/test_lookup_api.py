@@ -0,0 +1,51 @@
+def test_batch_keeps_order_and_resolves_each_query_once(app, monkeypatch):
+    import DanymicBomServer as server
+
+    calls = []
+    resolve_part = server.resolve_part
+
+    def counting_resolve_part(*args, **kwargs):
+        calls.append(args[:3])
+        return resolve_part(*args, **kwargs)
+
+    monkeypatch.setattr(server, 'resolve_part', counting_resolve_part)
+    items = [
+        {"part_number": "BASE"},
+        {"part_number": "RC0402FR-0710KL", "parameter": "10K", "footprint": "R0402"},
+        "不是对象",
+        {"part_number": "BASE", "parameter": "1K"},
+        {"part_number": "rc0402fr-0710kl", "parameter": "10k", "footprint": "R0402"},  # 归一化后与第 2 行相同
+        {"part_number": "NOPE", "parameter": "AMS1117"},
+    ]
+    body = app.test_client().post('/lightup/batch', json={"items": items}).get_json()
+
+    assert (body['total'], body['found']) == (6, 4)
+    assert [result['index'] for result in body['results']] == list(range(6))
+    assert [result['status'] for result in body['results']] == \
+        ['success', 'success', 'error', 'success', 'success', 'not_found']
+    assert [result.get('matched_part_number') for result in body['results']] == \
+        ['BASE', 'BASE', None, 'BASE', 'BASE', None]
+    assert body['results'][0]['score'] is None and body['results'][1]['score'] > 0
+    assert body['results'][4]['searched']['part_number'] == "rc0402fr-0710kl"
+    # 精确匹配按 key 去重，模糊查询按归一化结果去重
+    assert calls == [("BASE", "", ""), ("RC0402FR-0710KL", "10K", "R0402"), ("NOPE", "AMS1117", "")]
+
+
+def test_library_write_invalidates_cached_lookups(app):
+    import DanymicBomServer as server
+    from library import shared_library
+
+    server.lookup_cache.clear()
+    client = app.test_client()
+    query = {"part_number": "0603WAF4701T5E", "parameter": "4K7", "footprint": "R0603"}
+    assert client.get('/lightup', query_string=query).get_json()['status'] == 'not_found'
+    hits = server.lookup_cache.stats()['hits']
+    assert client.get('/lightup', query_string=query).get_json()['status'] == 'not_found'
+    assert server.lookup_cache.stats()['hits'] == hits + 1  # 第二次命中缓存
+
+    shared_library().add("R4K7", {"box_id": 2, "led_id": 3, "parameter": "4.7K", "voltage": "", "footprint": "0603"})
+    body = client.get('/lightup', query_string=query).get_json()
+    assert body['status'] == 'success' and body['matched_part_number'] == "R4K7"
+    assert body['location'] == {"box_id": 2, "led_id": 3}
+    stats = server.lookup_cache.stats()
+    assert stats['revision'] == server.component_index.revision and stats['invalidations'] >= 1
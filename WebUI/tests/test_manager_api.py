@@ -0,0 +1,178 @@
+import json
+
+
+def _details(led_id, **fields):
+    return dict({"box_id": 2, "led_id": led_id, "parameter": "1K", "voltage": "", "footprint": "0603"}, **fields)
+
+
+# --- If-Match (乐观并发控制) ---
+def test_add_with_stale_if_match_returns_409(app):
+    client = app.test_client()
+    response = client.post('/api/add', json={"component_name": "R1", "details": _details(1)})
+    assert response.status_code == 200 and response.get_json()['version'] == 1
+    assert response.headers['ETag'] == '"1"'
+
+    updated = client.post('/api/add', json={"component_name": "R1", "details": _details(1, note="a")},
+                          headers={'If-Match': '"1"'})
+    assert updated.status_code == 200 and updated.get_json()['version'] == 2
+
+    # 另一个客户端仍然拿着版本 1
+    stale = client.post('/api/add', json={"component_name": "R1", "details": _details(1, note="b")},
+                        headers={'If-Match': '"1"'})
+    assert stale.status_code == 409
+    assert stale.get_json()['current_version'] == 2
+    assert client.get('/api/components').get_json()['R1']['note'] == "a"
+
+    # 已被删除的元件: current_version 为 null
+    missing = client.post('/api/add', json={"component_name": "R9", "details": _details(9)},
+                          headers={'If-Match': '"1"'})
+    assert missing.status_code == 409 and missing.get_json()['current_version'] is None
+
+
+def test_delete_with_stale_if_match_returns_409(app):
+    client = app.test_client()
+    client.post('/api/add', json={"component_name": "R1", "details": _details(1)})
+    client.post('/api/add', json={"component_name": "R1", "details": _details(1, note="a")},
+                headers={'If-Match': '"1"'})
+
+    stale = client.post('/api/delete', json={"component_name": "R1"}, headers={'If-Match': '"1"'})
+    assert stale.status_code == 409 and stale.get_json()['current_version'] == 2
+    assert 'R1' in client.get('/api/components').get_json()
+
+    deleted = client.post('/api/delete', json={"component_name": "R1"}, headers={'If-Match': '"2"'})
+    assert deleted.status_code == 200
+    assert 'R1' not in client.get('/api/components').get_json()
+
+
+# --- 列表: 增量 / ETag / 分页 ---
+def test_components_since_returns_only_changes(app):
+    client = app.test_client()
+    first = client.get('/api/components')
+    token = first.headers['ETag'].strip('"')
+    client.post('/api/add', json={"component_name": "R1", "details": _details(1)})
+    client.post('/api/delete', json={"component_name": "BASE"})
+
+    body = client.get('/api/components', query_string={"since": token}).get_json()
+    assert body['full'] is False
+    assert body['changes']['BASE'] is None
+    assert body['changes']['R1']['led_id'] == 1
+    assert client.get('/api/components', query_string={"since": body['revision']}).get_json()['changes'] == {}
+
+    # 无效 / 其他 epoch 的版本号: 返回完整字典
+    for since in ('garbage', '0-0'):
+        body = client.get('/api/components', query_string={"since": since}).get_json()
+        assert body['full'] is True and set(body['components']) == {"R1"}
+
+
+def test_components_etag_and_304(app):
+    client = app.test_client()
+    response = client.get('/api/components')
+    etag = response.headers['ETag']
+    assert client.get('/api/components', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/components', query_string={"limit": 5},
+                      headers={'If-None-Match': etag}).status_code == 304
+    client.post('/api/add', json={"component_name": "R1", "details": _details(1)})
+    response = client.get('/api/components', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+
+
+def test_components_cursor_pagination(app):
+    client = app.test_client()
+    for i in range(1, 13):
+        client.post('/api/add', json={"component_name": f"R{i}", "details": _details(i, parameter=f"{i}K")})
+    keys = []
+    cursor = None
+    while True:
+        args = {"limit": 5, "box_id": 2, "sort": "parameter"}
+        if cursor is not None:
+            args["cursor"] = cursor
+        body = client.get('/api/components', query_string=args).get_json()
+        assert body['total'] == 12 and len(body['items']) <= 5
+        keys += [item['key'] for item in body['items']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert keys == [f"R{i}" for i in range(1, 13)]  # 参数按自然顺序: 2K 在 10K 之前
+
+    body = client.get('/api/components', query_string={"sort": "led", "order": "desc", "limit": 2}).get_json()
+    assert [item['key'] for item in body['items']] == ["R12", "R11"]
+    assert client.get('/api/components', query_string={"sort": "nope"}).status_code == 400
+
+
+# --- 批量导入 / 导出 ---
+def test_import_is_atomic_with_a_per_row_report(app):
+    client = app.test_client()
+    csv_text = ("key,box_id,led_id,parameter,voltage,footprint,note\n"
+                "C1,3,1,100nF,16V,0402,\n"
+                "C2,3,x,1uF,,0402,\n"          # led_id 不是整数
+                "C3,3,1,10uF,,0603,\n"         # 与第 2 行占用同一位置
+                "BASE,3,4,1K,,0402,\n")        # 名称已存在
+    response = client.post('/api/import?format=csv', data=csv_text.encode('utf-8'),
+                           content_type='text/csv')
+    body = response.get_json()
+    assert response.status_code == 400
+    assert body['success'] is False and body['imported'] == 0 and body['errors'] == 3
+    rows = {row['row']: row for row in body['rows']}
+    assert rows[2]['status'] == 'ok'
+    assert "led_id 必须是整数" in rows[3]['errors']
+    assert any("已被 C1 占用" in error for error in rows[4]['errors'])
+    assert "该元件名称已存在" in rows[5]['errors']
+    assert set(client.get('/api/components').get_json()) == {"BASE"}  # 一条也没有写入
+
+    jsonl = ('{"key": "C1", "box_id": 3, "led_id": 1, "parameter": "100nF", "footprint": "0402"}\n'
+             '{"component_name": "C2", "details": {"box_id": 3, "led_id": 2, "parameter": "1uF"}}\n')
+    response = client.post('/api/import', data=jsonl.encode('utf-8'), content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.get_json()['imported'] == 2
+    assert set(client.get('/api/components').get_json()) == {"BASE", "C1", "C2"}
+
+
+def test_export_round_trip(app):
+    client = app.test_client()
+    client.post('/api/add', json={"component_name": "R1", "details": _details(1, note="备注, 带逗号")})
+    original = client.get('/api/components').get_json()
+
+    exported = {}
+    for fmt in ('jsonl', 'csv', 'json'):
+        response = client.get('/api/export', query_string={"format": fmt})
+        assert response.status_code == 200
+        assert response.headers['Content-Disposition'] == f"attachment; filename=components.{fmt}"
+        exported[fmt] = response.get_data()
+    assert json.loads(exported['json']) == original
+
+    # 导出的 jsonl / csv 可以原样导入到另一个空库
+    for fmt in ('jsonl', 'csv'):
+        for key in list(client.get('/api/components').get_json()):
+            client.post('/api/delete', json={"component_name": key})
+        response = client.post('/api/import', query_string={"format": fmt}, data=exported[fmt])
+        assert response.status_code == 200, response.get_json()
+        restored = client.get('/api/components').get_json()
+        assert {key: {name: value for name, value in details.items() if name != 'version'}
+                for key, details in restored.items()} == \
+            {key: {name: value for name, value in details.items() if name != 'version'}
+             for key, details in original.items()}
+
+
+# --- 位置占用 ---
+def test_add_to_an_occupied_slot_names_the_owner(app):
+    client = app.test_client()
+    assert client.post('/api/add', json={"component_name": "R1", "details": _details(5)}).status_code == 200
+    response = client.post('/api/add', json={"component_name": "R2", "details": _details(5, parameter="2K")})
+    assert response.status_code == 409
+    assert response.get_json()['occupied_by'] == "R1"
+    assert "R2" not in client.get('/api/components').get_json()
+
+
+def test_next_free_slot_when_the_box_is_full(app):
+    from library import shared_library
+    shared_library().add_many([(f"F{led_id}", _details(led_id)) for led_id in range(1, 82)]
+                              + [("NEXT", dict(_details(1), box_id=3))])
+    client = app.test_client()
+
+    body = client.get('/api/next_free_slot', query_string={"box_id": 2}).get_json()
+    assert body['led_id'] is None and body['box_full'] is True
+    assert body['occupied'] == body['capacity'] == 81
+    assert (body['next_box_id'], body['next_led_id']) == (3, 2)
+
+    client.post('/api/delete', json={"component_name": "F40"})
+    body = client.get('/api/next_free_slot', query_string={"box_id": 2}).get_json()
+    assert body['led_id'] == 40 and 'box_full' not in body
@@ -0,0 +1,58 @@
+import json
+import random
+
+from benchmark import generate_library, generate_queries
+from component_index import ComponentIndex, normalize_query
+
+
+def _queries(db, seed):
+    """benchmark 的合成查询，加上错一个字符的 key (容错信号) 和只有参数 / 封装的查询"""
+    rng = random.Random(seed)
+    queries = generate_queries(db, 150, seed=seed)
+    for key, data in rng.sample(list(db.items()), 30):
+        typo = key[:-1] + rng.choice('0123456789ABCDEF'.replace(key[-1], ''))
+        queries.append((typo, data['parameter'], data['footprint']))
+        queries.append(('', data['parameter'], data['footprint']))
+    return queries
+
+
+def _expected(index, query, k):
+    return [(match['part_number'], match['score']) for match in index.fuzzy_matches(*query)[:k]]
+
+
+def test_search_top_matches_full_sort_on_random_libraries():
+    early_stops = 0
+    for seed in range(3):
+        db = generate_library(1500, seed=seed)
+        index = ComponentIndex(db)
+        for query in _queries(db, seed + 100):
+            for k in (1, 3, 10):
+                matches, complete = index.search_top(*normalize_query(*query), k=k)
+                assert [(match['part_number'], match['score']) for match in matches] == \
+                    _expected(index, query, k), (query, k)
+                early_stops += not complete
+    assert early_stops  # 确实走到了提前结束的路径
+
+
+def test_search_endpoint_json_and_ndjson_match_full_sort(app):
+    import DanymicBomServer as server
+    from library import shared_library
+
+    db = generate_library(800, seed=7)
+    shared_library().add_many(db.items())
+    client = app.test_client()
+    index = server.component_index
+    for part_number, parameter, footprint in _queries(db, 8)[::4]:
+        args = {"part_number": part_number, "parameter": parameter, "footprint": footprint, "k": 5}
+        expected = _expected(index, (part_number, parameter, footprint), 5)
+        if not any(args[name] for name in ('part_number', 'parameter', 'footprint')):
+            continue
+
+        body = client.get('/search', query_string=args).get_json()
+        assert [(result['part_number'], result['score']) for result in body['results']] == expected
+
+        response = client.get('/search', query_string=dict(args, format='ndjson'))
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines[-1]['done'] and lines[-1]['returned'] == len(expected)
+        assert [(line['part_number'], line['score']) for line in lines[:-1]] == expected
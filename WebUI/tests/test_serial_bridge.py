@@ -0,0 +1,98 @@
+import os
+import threading
+
+import pytest
+
+from serial_bridge import (DELIVERED, DROPPED, FAILED, PENDING, PORT_ERROR, REJECTED, SUPERSEDED, TIMEOUT,
+                           SerialBridge, open_port)
+
+RESULTS = (DELIVERED, FAILED, REJECTED, TIMEOUT, SUPERSEDED, DROPPED, PORT_ERROR)
+
+
+class AckingPort:
+    """每条命令都回显 "发送状态: 成功" 的假串口"""
+
+    def __init__(self):
+        self._lines = []
+
+    def reset_input_buffer(self):
+        self._lines.clear()
+
+    def write(self, data):
+        self._lines.append('ESP-NOW 发送状态: 成功\n'.encode('utf-8'))
+
+    def readline(self):
+        return self._lines.pop(0) if self._lines else b''
+
+    def close(self):
+        pass
+
+
+def test_counters_account_for_every_command():
+    # 请求线程 (覆盖 / 丢弃) 和后台线程 (送达) 同时计数，每条命令恰好计入一个结果
+    bridge = SerialBridge('fake', queue_size=4, opener=lambda *args: AckingPort())
+    deliveries = []
+    lock = threading.Lock()
+
+    def sender(thread):
+        for i in range(300):
+            delivery = bridge.send(thread * 10 + i % 10, i)
+            with lock:
+                deliveries.append(delivery)
+
+    threads = [threading.Thread(target=sender, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for delivery in deliveries:
+        assert delivery.wait(5) != PENDING
+    bridge.close()
+
+    stats = bridge.stats()
+    assert sum(stats[status] for status in RESULTS) == len(deliveries)
+    assert stats['sent'] == stats[DELIVERED]
+    assert stats['reconnects'] == 1
+
+
+# --- 基于 pty 的主控模拟 (fake_master.FakeMaster) ---
+@pytest.mark.skipif(os.name != 'posix', reason="FakeMaster 基于 pty，仅 POSIX")
+def test_bridge_against_fake_master():
+    from fake_master import FakeMaster
+
+    attempts = []
+
+    def flaky_opener(*args):
+        # 第一次打开失败 (例如主控刚插上)，退避后重试
+        attempts.append(args[0])
+        if len(attempts) == 1:
+            raise OSError("设备忙")
+        return open_port(*args)
+
+    with FakeMaster(boxes=3, offline=(2,)) as master:
+        bridge = SerialBridge(master.port_name, ack_timeout=1.0, opener=flaky_opener)
+        try:
+            results = [(bridge.send(box_id, led_id).wait(5), box_id, led_id)
+                       for box_id, led_id in ((1, 66), (2, 5), (4, 1), (0, 3), (3, 81))]
+        finally:
+            bridge.close()
+
+    assert results == [(DELIVERED, 1, 66), (FAILED, 2, 5), (REJECTED, 4, 1), (REJECTED, 0, 3), (DELIVERED, 3, 81)]
+    assert master.commands == [(1, 66), (2, 5), (4, 1), (0, 3), (3, 81)]
+    assert len(attempts) == 2
+    stats = bridge.stats()
+    assert (stats[DELIVERED], stats[FAILED], stats[REJECTED], stats['sent'], stats['reconnects']) == (2, 1, 2, 5, 1)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="FakeMaster 基于 pty，仅 POSIX")
+def test_bridge_times_out_on_silent_fake_master():
+    from fake_master import FakeMaster
+
+    with FakeMaster(silent=True) as master:
+        bridge = SerialBridge(master.port_name, ack_timeout=0.2)
+        try:
+            delivery = bridge.send(1, 7)
+            assert delivery.wait(5) == TIMEOUT
+        finally:
+            bridge.close()
+    assert master.commands == [(1, 7)]
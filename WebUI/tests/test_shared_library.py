@@ -0,0 +1,49 @@
+import threading
+
+
+def test_exact_lookups_while_manager_writes(app):
+    import DanymicBomServer
+
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        client = app.test_client()
+        for i in range(300):
+            details = {"box_id": 2 + i // 64, "led_id": i % 64 + 1, "parameter": f"{i}K", "voltage": "",
+                       "footprint": "0603"}
+            response = client.post('/api/add', json={"component_name": f"W{i}", "details": details})
+            if response.status_code != 200:
+                errors.append(response.get_json())
+        stop.set()
+
+    def reader():
+        while not stop.is_set():
+            for i in range(300):
+                try:
+                    matched, details = DanymicBomServer.search_component(f"W{i}")
+                except Exception as e:
+                    errors.append(repr(e))
+                    return
+                if matched == f"W{i}" and details['parameter'] != f"{i}K":
+                    errors.append(details)
+                    return
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:3]
+    assert DanymicBomServer.search_component("W299")[0] == "W299"
+
+
+def test_manager_home_redirects_old_route(app):
+    import bom_app
+
+    client = bom_app.create_app(load=False, home='manager').test_client()
+    response = client.get('/')
+    assert response.status_code == 302 and response.headers['Location'] == '/manager'
+    assert client.get('/manager').status_code == 200
+    # 合并后的默认应用: / 是交互式 BOM，/bom 是同一个页面
+    assert app.test_client().get('/').status_code == app.test_client().get('/bom').status_code
@@ -0,0 +1,50 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from sqlite_store import SqliteStore, export_json, import_json
+
+BASE = {"A": {"box_id": 1, "led_id": 1, "parameter": "10K", "voltage": "", "footprint": "0402"},
+        "B": {"box_id": 1, "led_id": 2, "parameter": "1K", "voltage": "", "footprint": "0402"}}
+
+
+def test_export_leaves_initial_versions_out(tmp_path):
+    json_path, db_path = str(tmp_path / 'components.json'), str(tmp_path / 'components.db')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(BASE, f)
+    assert import_json(json_path, db_path) == 2
+    with SqliteStore(db_path) as store:
+        store.add('B', dict(store.get('B'), parameter='2K'))
+
+    exported = str(tmp_path / 'exported.json')
+    assert export_json(db_path, exported) == 2
+    with open(exported, encoding='utf-8') as f:
+        written = json.load(f)
+    assert written['A'] == BASE['A']
+    assert written['B'] == dict(BASE['B'], parameter='2K', version=2)
+
+
+def test_readonly_does_not_touch_the_database(tmp_path):
+    db_path = str(tmp_path / 'old.db')
+    # 旧版本的数据库: 没有版本列和数值列，也没有数值索引
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE components (key TEXT PRIMARY KEY, box_id INTEGER, led_id INTEGER, parameter TEXT,'
+                 ' voltage TEXT, footprint TEXT, note TEXT, extra TEXT, parameter_norm TEXT, footprint_norm TEXT)')
+    conn.execute("INSERT INTO components(key, box_id, led_id, parameter) VALUES ('A', 1, 1, '10K')")
+    conn.commit()
+    conn.close()
+    with open(db_path, 'rb') as f:
+        before = f.read()
+
+    export_json(db_path, str(tmp_path / 'exported.json'))
+    with open(db_path, 'rb') as f:
+        assert f.read() == before
+    assert sorted(os.listdir(tmp_path)) == ['exported.json', 'old.db']
+    with open(tmp_path / 'exported.json', encoding='utf-8') as f:
+        assert json.load(f) == {"A": {"box_id": 1, "led_id": 1, "parameter": "10K"}}
+
+    with pytest.raises(sqlite3.OperationalError):
+        SqliteStore(str(tmp_path / 'missing.db'), readonly=True)
+    assert not os.path.exists(tmp_path / 'missing.db')
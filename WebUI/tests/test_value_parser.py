@@ -0,0 +1,91 @@
+import pytest
+
+from component_index import ComponentIndex, score_parameter
+from value_parser import ParsedValue, ValueIndex, format_value, parse_value, values_equal
+
+
+@pytest.mark.parametrize('text, expected', [
+    # RKM 标记法: 字母代替小数点
+    ('4K7', (4700.0, 'Ω', None)),
+    ('2R2', (2.2, 'Ω', None)),
+    ('0R', (0.0, 'Ω', None)),
+    ('1M5', (1.5e6, 'Ω', None)),
+    ('4n7', (4.7e-9, 'F', None)),
+    # SI 前缀，大写 M 为兆、小写 m 为毫
+    ('5.1K', (5100.0, 'Ω', None)),
+    ('10MΩ', (1e7, 'Ω', None)),
+    ('10mΩ', (1e-2, 'Ω', None)),
+    ('100n', (1e-7, 'F', None)),
+    ('4700', (4700.0, 'Ω', None)),
+    # Ω / F / H 后缀
+    ('10kΩ', (1e4, 'Ω', None)),
+    ('10kohm', (1e4, 'Ω', None)),
+    ('100nF', (1e-7, 'F', None)),
+    ('100 nF', (1e-7, 'F', None)),
+    ('10uH', (1e-5, 'H', None)),
+    # 额定电压
+    ('10uF/25V', (1e-5, 'F', 25.0)),
+    ('10uF,25V', (1e-5, 'F', 25.0)),
+    ('10uF 25V', (1e-5, 'F', 25.0)),
+])
+def test_parse_value(text, expected):
+    value = parse_value(text)
+    assert value is not None
+    assert values_equal(value, ParsedValue(*expected))
+    assert value.rating == expected[2]
+
+
+@pytest.mark.parametrize('text', ['', 'AMS1117', '1N4148', 'STM32F103C8T6', '25V', '10uF/1K', '红色'])
+def test_non_values(text):
+    assert parse_value(text) is None
+
+
+def test_values_equal():
+    assert values_equal(parse_value('10K'), parse_value('10000'))
+    assert values_equal(parse_value('4K7'), parse_value('4.7kΩ'))
+    assert values_equal(parse_value('0.1uF'), parse_value('100nF/50V'))  # 忽略额定值
+    assert not values_equal(parse_value('10K'), parse_value('100K'))
+    assert not values_equal(parse_value('10u'), parse_value('10uH'))  # 单位不同
+    assert format_value(parse_value('4K7')) == '4.7kΩ'
+    assert format_value(parse_value('10uF/25V')) == '10uF/25V'
+
+
+def test_value_index():
+    index = ValueIndex()
+    index.load([('R1', parse_value('4K7'), '0402', 0), ('R2', parse_value('5.1K'), '0603', 1),
+                ('R3', parse_value('4700'), '0603', 2), ('C1', parse_value('4n7'), '0402', 3)])
+    assert index.exact(parse_value('4.7K')) == ['R1', 'R3']
+    assert index.exact(parse_value('4.7K'), footprint='0603') == ['R3']
+    nearest = index.nearest(parse_value('4.99K'), k=3)
+    assert nearest[0][0] == 'R2' and {key for key, _, _ in nearest[1:]} == {'R1', 'R3'}
+
+    index.remove('R1')
+    index.add('R4', parse_value('4R7'), '0402', 4)
+    assert index.exact(parse_value('4.7K')) == ['R3']
+    assert index.nearest(parse_value('4.7'), footprint='0402', k=5)[0][:2] == ('R4', 4.7)
+    assert len(index) == 4
+
+
+def _parameter_score(input_parameter, db_parameter):
+    return score_parameter(db_parameter, db_parameter.upper(), input_parameter.upper(), '',
+                           parse_value(input_parameter), parse_value(db_parameter))[0]
+
+
+def test_parameter_score_compares_values():
+    assert _parameter_score('10K', '10K') == 10
+    assert _parameter_score('10K', '10000') == 10
+    assert _parameter_score('10000', '10kΩ') == 10
+    # 以前按子串比较 '10K' in '100K' 会得到部分匹配
+    assert _parameter_score('10K', '100K') == 0
+    assert _parameter_score('100K', '10K') == 0
+    # 不是数值的参数仍按子串比较
+    assert _parameter_score('AMS1117', 'AMS1117-3.3') == 5
+
+
+def test_fuzzy_matches_by_value():
+    index = ComponentIndex({
+        "R10K": {"box_id": 1, "led_id": 1, "parameter": "10000", "voltage": "", "footprint": "0402"},
+        "R100K": {"box_id": 1, "led_id": 2, "parameter": "100K", "voltage": "", "footprint": "0402"},
+    })
+    matches = index.fuzzy_matches("RC0402FR-0710KL", parameter="10K", footprint="R0402")
+    assert [match['part_number'] for match in matches] == ["R10K"]
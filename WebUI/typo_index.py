@@ -0,0 +1,151 @@
+'''
+Description: 容错 (拼写错误) 匹配索引。
+    对元件 key 和型号类参数 (SPX3819, AMS1117 ...) 建立带填充的三元组 (trigram) 倒排索引，
+    查询时用 q-gram 计数过滤出候选，再用 OSA 编辑距离 (相邻字符交换算 1 次) 精确校验，
+    返回编辑距离在预算内的字符串，按距离排序。
+
+    q-gram 引理: 每次编辑 (插入 / 删除 / 替换 / 相邻交换) 最多破坏 4 个三元组，
+    所以编辑距离 <= k 的候选至少与查询共享 |G| - 4k 个三元组 (G 为查询的三元组集合)。
+    只需遍历倒排表最短的 |G| - T + 1 个三元组就能找到全部候选 (鸽巢原理)，
+    其余三元组只对候选做集合成员检查，不需要扫描整个元件库。
+    倒排表按字符串长度分开存放，长度相差超过 k 的字符串根本不会被访问。
+'''
+Q = 3
+_PAD_START = '\x02' * (Q - 1)
+_PAD_END = '\x03' * (Q - 1)
+
+
+def trigrams(text):
+    padded = _PAD_START + text + _PAD_END
+    return {padded[i:i + Q] for i in range(len(padded) - Q + 1)}
+
+
+def osa_distance(a, b, limit):
+    """
+    Optimal String Alignment 距离 (Damerau-Levenshtein 的受限版本)。
+    超过 limit 时提前返回 limit + 1。
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        ca = a[i - 1]
+        for j in range(1, len(b) + 1):
+            cb = b[j - 1]
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class TypoIndex:
+    """
+    字符串 -> 元件 key 的近似匹配索引。
+        index.add('D2A2A', key) / index.remove('D2A2A', key)
+        index.search('D2AA2', max_distance=1)  -> [('D2A2A', 1)]
+    """
+
+    def __init__(self):
+        self._keys = {}      # 字符串 -> 元件 key 集合
+        self._grams = {}     # 长度 -> {三元组 -> 字符串集合}
+        self._lengths = {}   # 长度 -> 字符串集合 (查询太短、q-gram 无法过滤时使用)
+
+    def add(self, text, key):
+        keys = self._keys.get(text)
+        if keys is None:
+            self._keys[text] = keys = set()
+            grams = self._grams.setdefault(len(text), {})
+            for gram in trigrams(text):
+                grams.setdefault(gram, set()).add(text)
+            self._lengths.setdefault(len(text), set()).add(text)
+        keys.add(key)
+
+    def remove(self, text, key):
+        keys = self._keys.get(text)
+        if keys is None:
+            return
+        keys.discard(key)
+        if keys:
+            return
+        del self._keys[text]
+        grams = self._grams[len(text)]
+        for gram in trigrams(text):
+            holders = grams.get(gram)
+            if holders is not None:
+                holders.discard(text)
+                if not holders:
+                    del grams[gram]
+        same_length = self._lengths[len(text)]
+        same_length.discard(text)
+        if not same_length:
+            del self._lengths[len(text)]
+            del self._grams[len(text)]
+
+    def keys(self, text):
+        return self._keys.get(text, set())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _candidates(self, query, max_distance):
+        grams = trigrams(query)
+        required = len(grams) - 4 * max_distance
+        found = set()
+        for length in range(max(len(query) - max_distance, 1), len(query) + max_distance + 1):
+            if length not in self._lengths:
+                continue
+            if required <= 0:
+                # 查询太短，三元组无法过滤：退化为枚举该长度的全部字符串
+                found |= self._lengths[length]
+                continue
+            found |= self._filter(self._grams[length], grams, required)
+        return found
+
+    @staticmethod
+    def _filter(index, grams, required):
+        """index 中至少包含 grams 里 required 个三元组的字符串"""
+        postings = sorted((index.get(gram, ()) for gram in grams), key=len)
+        probe = len(grams) - required + 1
+        counts = {}
+        for holders in postings[:probe]:
+            for text in holders:
+                counts[text] = counts.get(text, 0) + 1
+        rest = postings[probe:]
+        found = set()
+        for text, count in counts.items():
+            if count + len(rest) < required:
+                continue
+            for holders in rest:
+                if count >= required:
+                    break
+                if text in holders:
+                    count += 1
+            if count >= required:
+                found.add(text)
+        return found
+
+    def search(self, query, max_distance=1, limit=None):
+        """编辑距离 1..max_distance 的字符串 (不含完全相同的)，按 (距离, 字符串) 排序"""
+        if not query or max_distance <= 0:
+            return []
+        results = []
+        for text in self._candidates(query, max_distance):
+            if text == query:
+                continue
+            distance = osa_distance(query, text, max_distance)
+            if distance <= max_distance:
+                results.append((text, distance))
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results[:limit] if limit else results
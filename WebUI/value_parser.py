@@ -0,0 +1,200 @@
+'''
+Description: 元件参数的数值解析 与 按数值排序的索引。
+    parse_value('4K7')      -> ParsedValue(4700.0, 'Ω', None)
+    parse_value('100nF')    -> ParsedValue(1e-07, 'F', None)
+    parse_value('10uF/25V') -> ParsedValue(1e-05, 'F', 25.0)
+    ValueIndex 按 单位 (以及 单位+封装) 维护有序数组，精确查找和"最接近的值"都是 O(log n) 的二分查找。
+'''
+import math
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from functools import lru_cache
+
+# magnitude: SI 基本单位下的数值；unit: 'Ω' / 'F' / 'H' / 'V'；rating: 额定电压 (V) 或 None
+ParsedValue = namedtuple('ParsedValue', 'magnitude unit rating')
+
+# 数值相等的相对容差 (浮点误差)
+REL_TOL = 1e-9
+
+PREFIXES = {
+    'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'μ': 1e-6,
+    'm': 1e-3, '': 1.0, 'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9,
+}
+UNITS = {'Ω': 'Ω', 'Ω': 'Ω', 'R': 'Ω', 'r': 'Ω', 'OHM': 'Ω', 'F': 'F', 'H': 'H', 'V': 'V'}
+
+_PREFIX = '[pnuµμmkKMG]'
+_UNIT = '(?:Ω|Ω|[RrFfHhVv]|[Oo][Hh][Mm])'
+# 4K7 / 4R7 / 1M5 / 4n7 / 0R: 字母代替小数点 (RKM 标记法)
+_RKM_RE = re.compile(rf'^(\d+)([RrKkMG]|[pnuµμ])(\d*)({_UNIT})?$')
+# 5.1K / 100nF / 2.2uF / 10R / 4700 / 25V
+_DECIMAL_RE = re.compile(rf'^(\d+(?:\.\d+)?|\.\d+)\s*({_PREFIX})?\s*({_UNIT})?$')
+# 额定值分隔符: 10uF/25V, 10uF,25V, 10uF 25V (空格后必须是数字，'100 nF' 不会被拆开)
+_RATING_SPLIT_RE = re.compile(r'\s*[/,，]\s*|\s+(?=\d)')
+
+
+def _unit_of(unit_text, prefix):
+    if unit_text:
+        return 'Ω' if unit_text.upper() == 'OHM' else UNITS.get(unit_text, UNITS.get(unit_text.upper()))
+    # 没有写单位: p/n/u 默认是电容 (100n)，其余 (10K, 1M, 4700) 默认是电阻
+    if prefix in ('p', 'n', 'u', 'µ', 'μ'):
+        return 'F'
+    return 'Ω'
+
+
+def _parse_single(text):
+    match = _RKM_RE.match(text)
+    if match:
+        whole, letter, fraction, unit_text = match.groups()
+        number = float(f"{whole}.{fraction}" if fraction else whole)
+        if letter in 'Rr':
+            return number, _unit_of(unit_text, '')
+        return number * PREFIXES[letter], _unit_of(unit_text, letter)
+    match = _DECIMAL_RE.match(text)
+    if match:
+        number, prefix, unit_text = match.groups()
+        prefix = prefix or ''
+        return float(number) * PREFIXES[prefix], _unit_of(unit_text, prefix)
+    return None
+
+
+@lru_cache(maxsize=65536)
+def parse_value(text):
+    """
+    把参数字符串解析为 ParsedValue；不是数值参数 (例如 'AMS1117', '1N4148') 时返回 None。
+    规则: 大写 M 为兆 (1M, 10MΩ)，小写 m 为毫 (10mΩ)；K/R/M/n/u/p 可以代替小数点 (4K7, 4R7, 4n7)。
+    """
+    if not text:
+        return None
+    parts = [part for part in _RATING_SPLIT_RE.split(text.strip()) if part]
+    if not parts:
+        return None
+    main = _parse_single(parts[0])
+    if main is None or main[1] == 'V':
+        return None
+    rating = None
+    for part in parts[1:]:
+        extra = _parse_single(part)
+        if extra is None or extra[1] != 'V':
+            return None
+        rating = extra[0]
+    return ParsedValue(main[0], main[1], rating)
+
+
+def values_equal(a, b):
+    """单位相同且数值相等 (忽略额定值)"""
+    return a.unit == b.unit and math.isclose(a.magnitude, b.magnitude, rel_tol=REL_TOL, abs_tol=1e-15)
+
+
+def format_value(value):
+    """ParsedValue -> '4.7kΩ' 这样的可读字符串"""
+    magnitude = value.magnitude
+    text = f"{magnitude:.4g}{value.unit}"
+    if magnitude:
+        for prefix, factor in (('G', 1e9), ('M', 1e6), ('k', 1e3), ('', 1.0),
+                               ('m', 1e-3), ('u', 1e-6), ('n', 1e-9), ('p', 1e-12)):
+            if abs(magnitude) >= factor * (1 - REL_TOL):
+                text = f"{magnitude / factor:.4g}{prefix}{value.unit}"
+                break
+    if value.rating is not None:
+        text += f"/{value.rating:g}V"
+    return text
+
+
+class ValueIndex:
+    """
+    按数值排序的索引。每个分组 (单位 或 (单位, 封装)) 一个有序数组 [(magnitude, order, key)]，
+    order 是元件在数据库中的顺序，保证同值时结果稳定。
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._entries = {}
+
+    def add(self, key, value, footprint, order):
+        self.remove(key)
+        entry = (value.magnitude, order, key)
+        groups = [value.unit]
+        if footprint:
+            groups.append((value.unit, footprint))
+        for group in groups:
+            insort(self._groups.setdefault(group, []), entry)
+        self._entries[key] = (entry, groups)
+
+    def load(self, items):
+        """
+        清空并一次性建立索引 [(key, value, footprint, order)]。
+        每组先追加、最后排序一次，比逐条 insort 快 (insort 每次都要移动数组)。
+        """
+        self._groups = {}
+        self._entries = {}
+        for key, value, footprint, order in items:
+            entry = (value.magnitude, order, key)
+            groups = [value.unit]
+            if footprint:
+                groups.append((value.unit, footprint))
+            for group in groups:
+                self._groups.setdefault(group, []).append(entry)
+            self._entries[key] = (entry, groups)
+        for array in self._groups.values():
+            array.sort()
+
+    def remove(self, key):
+        stored = self._entries.pop(key, None)
+        if stored is None:
+            return
+        entry, groups = stored
+        for group in groups:
+            array = self._groups[group]
+            del array[bisect_left(array, entry)]
+            if not array:
+                del self._groups[group]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _array(self, unit, footprint):
+        return self._groups.get((unit, footprint) if footprint else unit, [])
+
+    def exact(self, value, footprint=None):
+        """数值相等的元件 key (按数据库顺序)"""
+        array = self._array(value.unit, footprint)
+        low = value.magnitude * (1 - REL_TOL) - 1e-15
+        high = value.magnitude * (1 + REL_TOL) + 1e-15
+        start = bisect_left(array, (low,))
+        end = bisect_right(array, (high, math.inf))
+        return [key for _, _, key in sorted(array[start:end], key=lambda entry: entry[1])]
+
+    def nearest(self, value, footprint=None, k=1):
+        """
+        数值最接近的 k 个元件，返回 [(key, magnitude, 相对误差)]。
+        从二分位置向两侧展开，按 |log(库存值 / 目标值)| 排序 (4.99K 更接近 5.1K 而不是 4.7K 时以比例衡量)。
+        """
+        array = self._array(value.unit, footprint)
+        if not array or k <= 0:
+            return []
+        target = value.magnitude
+        position = bisect_left(array, (target,))
+        left, right = position - 1, position
+        results = []
+        while len(results) < k and (left >= 0 or right < len(array)):
+            if right >= len(array) or (left >= 0 and
+                                       _distance(array[left][0], target) <= _distance(array[right][0], target)):
+                entry = array[left]
+                left -= 1
+            else:
+                entry = array[right]
+                right += 1
+            magnitude, _, key = entry
+            error = (magnitude - target) / target if target else (0.0 if magnitude == 0 else math.inf)
+            results.append((key, magnitude, error))
+        return results
+
+
+def _distance(magnitude, target):
+    """按比例衡量的距离；目标值为 0 (0R) 时退化为绝对差"""
+    if magnitude > 0 and target > 0:
+        return abs(math.log(magnitude / target))
+    if target == 0:
+        return abs(magnitude)
+    return math.inf
@@ -0,0 +1,239 @@
+'''
+Description: 元件管理器写入的并发压力测试。
+    多个进程 (模拟多 worker 部署 / 多个入库工位)，每个进程多个线程，同时对临时目录中的同一个元件库
+    (components.json + 日志，或 components.db) 调用 /api/add 和 /api/delete。每个线程:
+      - 独占写入: 在自己的料盒中逐个添加元件，每隔一个删除一个
+      - 竞争更新: 对几个共享的计数器元件做 "读取 -> note + 1 -> 带 If-Match 写回"，409 时重新读取再试
+    全部结束后在一个新进程中 (BOM_SNAPSHOT=off，只读 JSON + 日志 / SQLite) 重新加载并核对:
+      - 每个返回成功的添加都还在 (之后被成功删除的除外)，每个成功的删除都不在
+      - 每个计数器的值 = 成功的 +1 次数 (没有丢失的更新)，版本号 = 1 + 成功的 +1 次数
+    输出 JSON: 写入吞吐量、延迟 p50 / p99、409 冲突次数、核对结果。
+
+    用法:
+        python write_stress.py --processes 4 --threads 8 --ops 100
+        python write_stress.py --backend sqlite
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import WEBUI_DIR, percentile, quiet
+from component_io import LEDS_PER_BOX
+
+COUNTER_BOX = 1  # 计数器元件放在 1 号料盒，独占写入从 10 号料盒开始
+FIRST_BOX = 10
+
+
+def counter_key(index):
+    return f"COUNTER{index}"
+
+
+def _boxes_per_thread(ops):
+    return (ops + LEDS_PER_BOX - 1) // LEDS_PER_BOX
+
+
+# --- 子进程: 一个 "worker" ---
+def increment(client, index, stats):
+    """读取 -> +1 -> If-Match 写回，409 时重试；返回尝试次数"""
+    attempts = 0
+    while True:
+        attempts += 1
+        located = client.get(f'/api/locate?box_id={COUNTER_BOX}&led_id={index + 1}').get_json()
+        details = located['components'][0]['details']
+        details = dict(details, note=str(int(details['note']) + 1))
+        start = time.perf_counter()
+        response = client.post('/api/add', json={"component_name": counter_key(index), "details": details},
+                               headers={'If-Match': f'"{details["version"]}"'})
+        stats['latencies'].append(time.perf_counter() - start)
+        if response.status_code == 200:
+            return attempts
+        assert response.status_code == 409, (response.status_code, response.get_json())
+        stats['conflicts'] += 1
+
+
+def run_thread(app, process, thread, args, stats):
+    try:
+        _run_thread(app.test_client(), process, thread, args, stats)
+    except Exception as e:
+        stats['errors'].append(repr(e))
+
+
+def _run_thread(client, process, thread, args, stats):
+    first_box = FIRST_BOX + (process * args.threads + thread) * _boxes_per_thread(args.ops)
+    for i in range(args.ops):
+        key = f"P{process}T{thread}N{i}"
+        details = {"box_id": first_box + i // LEDS_PER_BOX, "led_id": i % LEDS_PER_BOX + 1,
+                   "parameter": "10K", "voltage": "", "footprint": "0402"}
+        start = time.perf_counter()
+        response = client.post('/api/add', json={"component_name": key, "details": details})
+        stats['latencies'].append(time.perf_counter() - start)
+        assert response.status_code == 200, (response.status_code, response.get_json())
+        stats['added'].append(key)
+        if i % 2:
+            start = time.perf_counter()
+            response = client.post('/api/delete', json={"component_name": key})
+            stats['latencies'].append(time.perf_counter() - start)
+            assert response.status_code == 200, (response.status_code, response.get_json())
+            stats['deleted'].append(key)
+        if i % args.contend_every == 0:
+            index = (process + thread + i) % args.counters
+            increment(client, index, stats)
+            stats['increments'][index] = stats['increments'].get(index, 0) + 1
+
+
+def worker(process, start_at, args):
+    import bom_app
+    from library import shared_library
+
+    with quiet():
+        app = bom_app.create_app()
+        shared_library().ready.wait()
+    time.sleep(max(0.0, start_at - time.time()))
+    per_thread = [{"latencies": [], "conflicts": 0, "added": [], "deleted": [], "increments": {}, "errors": []}
+                  for _ in range(args.threads)]
+    threads = [threading.Thread(target=run_thread, args=(app, process, thread, args, per_thread[thread]))
+               for thread in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = {"finished_at": time.time(), "conflicts": 0, "increments": {}}
+    for name in ('latencies', 'added', 'deleted', 'errors'):
+        stats[name] = [value for thread_stats in per_thread for value in thread_stats[name]]
+    for thread_stats in per_thread:
+        stats["conflicts"] += thread_stats["conflicts"]
+        for index, count in thread_stats["increments"].items():
+            stats["increments"][index] = stats["increments"].get(index, 0) + count
+    return stats
+
+
+def verify(args):
+    """在新进程中只读加载元件库，返回 {key: details}"""
+    from component_store import open_store
+
+    store = open_store(args.backend, readonly=True)
+    store.reload()
+    try:
+        return {key: details for key, details in store.iter_items()}
+    finally:
+        store.close()
+
+
+# --- 主进程 ---
+def seed_library(workdir, backend, counters):
+    """计数器元件 (note = '0', 版本 1)"""
+    env = dict(os.environ, COMPONENT_STORAGE=backend, PYTHONPATH=WEBUI_DIR)
+    code = ("from component_store import open_store\n"
+            "store = open_store()\n"
+            f"store.add_many([('COUNTER%d' % i, {{'box_id': {COUNTER_BOX}, 'led_id': i + 1, 'parameter': '1K',"
+            f" 'voltage': '', 'footprint': '0603', 'note': '0'}}) for i in range({counters})])\n"
+            "store.close()\n")
+    subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, check=True)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='write_stress_')
+    try:
+        seed_library(workdir, args.backend, args.counters)
+        env = dict(os.environ, COMPONENT_STORAGE=args.backend, BOM_EVENTS_PORT='0', BOM_LOG_LEVEL='WARNING',
+                   PYTHONPATH=WEBUI_DIR)
+        # 所有进程加载完元件库后在同一时刻开始
+        start_at = time.time() + 2.0 + 0.3 * args.processes
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', str(process),
+                                     str(start_at), '--threads', str(args.threads), '--ops', str(args.ops),
+                                     '--counters', str(args.counters), '--contend-every', str(args.contend_every)],
+                                    cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                   for process in range(args.processes)]
+        results = []
+        for process in workers:
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                return {"error": stderr.strip()[-2000:]}
+            results.append(json.loads(stdout.strip().splitlines()[-1]))
+        elapsed = max(result["finished_at"] for result in results) - start_at
+
+        env['BOM_SNAPSHOT'] = 'off'  # 只根据 components.json + 日志 (或 SQLite) 核对
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--verify', '--backend', args.backend],
+                                   cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip()[-2000:]}
+        final = json.loads(completed.stdout)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    added = {key for result in results for key in result["added"]}
+    deleted = {key for result in results for key in result["deleted"]}
+    increments = {}
+    for result in results:
+        for index, count in result["increments"].items():
+            increments[int(index)] = increments.get(int(index), 0) + count
+    missing = sorted(key for key in added - deleted if key not in final)
+    resurrected = sorted(key for key in deleted if key in final)
+    counters = {}
+    lost = 0
+    for index in range(args.counters):
+        details = final.get(counter_key(index)) or {}
+        expected = increments.get(index, 0)
+        value = int(details.get('note', -1))
+        lost += expected - value
+        counters[counter_key(index)] = {"expected": expected, "value": value, "version": details.get('version'),
+                                        "version_ok": details.get('version') == expected + 1}
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    errors = [error for result in results for error in result["errors"]]
+    writes = len(latencies)
+    return {
+        "backend": args.backend,
+        "processes": args.processes,
+        "threads": args.threads,
+        "writes": writes,
+        "conflicts_409": sum(result["conflicts"] for result in results),
+        "seconds": elapsed,
+        "writes_per_second": writes / elapsed if elapsed > 0 else None,
+        "write_ms": {"p50": percentile(latencies, 0.50) * 1e3 if latencies else None,
+                     "p99": percentile(latencies, 0.99) * 1e3 if latencies else None},
+        "errors": errors[:10],
+        "check": {
+            "ok": not missing and not resurrected and lost == 0 and not errors and
+                  all(counter["version_ok"] for counter in counters.values()),
+            "components": len(final),
+            "expected_components": len(added - deleted) + args.counters,
+            "missing_adds": missing[:10],
+            "resurrected_deletes": resurrected[:10],
+            "lost_increments": lost,
+            "counters": counters
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='元件管理器并发写入压力测试 (多进程 x 多线程, 核对丢失更新)')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='每个进程的线程数')
+    parser.add_argument('--ops', type=int, default=100, help='每个线程添加的元件数 (其中一半随后删除)')
+    parser.add_argument('--counters', type=int, default=4, help='共享计数器元件的个数 (竞争更新)')
+    parser.add_argument('--contend-every', type=int, default=2, help='每隔几次添加做一次计数器 +1')
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    parser.add_argument('--worker', nargs=2, metavar=('PROCESS', 'START_AT'), help=argparse.SUPPRESS)
+    parser.add_argument('--verify', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(int(args.worker[0]), float(args.worker[1]), args)))
+        sys.exit(0)
+    if args.verify:
+        print(json.dumps(verify(args), ensure_ascii=False))
+        sys.exit(0)
+
+    text = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    sys.exit(0 if '"ok": true' in text else 1)